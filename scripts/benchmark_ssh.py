@@ -0,0 +1,88 @@
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+base_dir = Path(__file__).parent
+root_dir = base_dir.parent
+sys.path.insert(0, str(root_dir))
+
+from src.analyzers.sshAnalyzer import SshAnalyzer  # noqa: E402
+from src.helpers.backGroundBuilder import BGBuilder  # noqa: E402
+from src.helpers.builder import Builder  # noqa: E402
+from src.helpers.configurator import Configurator  # noqa: E402
+from tests.sshStandIn import SshStandIn  # noqa: E402
+
+example_dir = root_dir.joinpath("tests-benchmark-example")
+
+description = """Measure the overhead of the ssh profiler by a local SSH server standing in for a board.
+Tests are built, uploaded and launched on this machine, the benchmark reports launches per second,
+bytes passed to and from the host and round trips (commands and sftp requests) per test.
+Settings of the ssh profiler may be given by a configuration file, e.g. to compare
+"agent": false or "bulk_upload": false with the defaults.
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--tests", type=int, default=10, help="number of tests of tests-benchmark-example")
+    parser.add_argument("--launches", type=int, default=5, help="launches of every test")
+    parser.add_argument("-c", "--config-file", default=None, help="configuration file with profiler settings")
+    parser.add_argument("-s", "--section", default=None, help="section of the configuration file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    work_dir = Path(tempfile.mkdtemp(prefix="chapy-benchmark-"))
+    test_dir = work_dir.joinpath("tests")
+    test_dir.mkdir()
+    for src_file in sorted(example_dir.glob("test_*.c"), key=lambda path: int(path.stem.split("_")[1]))[: args.tests]:
+        shutil.copy(src_file, test_dir)
+
+    stand_in = SshStandIn()
+    stand_in.start()
+    settings = {
+        "log_level": logging.WARNING,
+        "timeout": 10,
+        "max_test_launches": args.launches,
+        "compiler": "gcc",
+        "compiler_args": [],
+        "build_cache_dir": None,
+        "counters_cache": None,
+        "remote_cache": str(work_dir.joinpath("remote-cache")),
+        **Configurator().read_cfg_file(args.config_file, args.section),
+        **stand_in.settings(),
+    }
+    try:
+        # attachments of patchers are found next to the launched script
+        with patch.object(sys, "argv", [str(root_dir.joinpath("cha.py"))]):
+            analyzer = SshAnalyzer(BGBuilder(settings, Builder(settings)), settings)
+            try:
+                start = time.perf_counter()
+                results = analyzer.analyze(test_dir)
+                elapsed = time.perf_counter() - start
+                raw_samples = analyzer.raw_samples()
+            finally:
+                analyzer.fin()
+    finally:
+        stand_in.stop()
+        shutil.rmtree(work_dir)
+
+    tests = max(len(results), 1)
+    launches = 0 if raw_samples is None else len(raw_samples[1])
+    print(f"Tests measured:        {len(results)}")
+    print(f"Launches:              {launches} in {elapsed:.2f}s, {launches / elapsed:.1f} per second")
+    print(f"Bytes to the host:     {stand_in.bytes_received}, {stand_in.bytes_received / tests:.0f} per test")
+    print(f"Bytes from the host:   {stand_in.bytes_sent}, {stand_in.bytes_sent / tests:.0f} per test")
+    print(f"Commands:              {stand_in.exec_requests}, {stand_in.exec_requests / tests:.1f} per test")
+    print(f"SFTP requests:         {stand_in.sftp_requests}, {stand_in.sftp_requests / tests:.1f} per test")
+    print(f"Round trips per test:  {stand_in.round_trips / tests:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+from typing import Any, Awaitable, Dict, Iterable, List, TypeVar
+
+from src.helpers.supervisor import ESCALATION_SIGNALS, ProcessResult, Supervisor
+
+T = TypeVar("T")
+
+
+async def gather_limited(jobs: Iterable[Awaitable[T]], concurrency: int) -> List[T]:
+    """Await jobs with at most concurrency of them running at once, results are in the order of jobs"""
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def limited(job: Awaitable[T]) -> T:
+        async with semaphore:
+            return await job
+
+    return list(await asyncio.gather(*map(limited, jobs)))
+
+
+class AsyncRunner:
+    """Launches processes from an event loop, so that a lot of them are waited without a thread per process.
+    Timeouts are handled the same way as by Supervisor. If the waiting task is cancelled, the process is killed.
+    Output pipes and the pidfd of the process are watched by the loop, the process is reaped by os.wait4 to keep rusage
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.grace_period: float = settings.get("grace_period", 5)
+        # limits are set the same way as by Supervisor
+        self.supervisor = Supervisor(settings)
+
+    async def run(
+        self, execute_line: List[Any], timeout: float | None = None, env: Dict[str, str] | None = None
+    ) -> ProcessResult:
+        """Run the process till it exits or the timeout expires
+
+        :param env: Variables added to the environment of the process
+        """
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        proc_env = None if env is None else {**os.environ, **env}
+        proc = subprocess.Popen(
+            list(map(str, execute_line)), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=proc_env
+        )
+        if proc.stdout is None or proc.stderr is None:
+            raise Exception(f"Can't open pipes of {execute_line}")
+        self.supervisor.set_limits(proc.pid)
+
+        stdout_fd, stderr_fd = proc.stdout.fileno(), proc.stderr.fileno()
+        outputs: Dict[int, List[bytes]] = {stdout_fd: [], stderr_fd: []}
+        open_fds = set(outputs)
+        drained = loop.create_future()
+        exited = loop.create_future()
+
+        def read(fd: int) -> None:
+            try:
+                data = os.read(fd, 1 << 16)
+            except BlockingIOError:
+                return
+            if data:
+                outputs[fd].append(data)
+                return
+            loop.remove_reader(fd)
+            open_fds.discard(fd)
+            if len(open_fds) == 0 and not drained.done():
+                drained.set_result(None)
+
+        def on_exit() -> None:
+            loop.remove_reader(pidfd)
+            if not exited.done():
+                exited.set_result(None)
+
+        for fd in outputs:
+            os.set_blocking(fd, False)
+            loop.add_reader(fd, read, fd)
+        pidfd = os.pidfd_open(proc.pid)
+        loop.add_reader(pidfd, on_exit)
+
+        is_full = True
+        try:
+            escalation = ESCALATION_SIGNALS.copy()
+            wait_time = timeout
+            while True:
+                done, _ = await asyncio.wait([exited], timeout=wait_time)
+                if done or len(escalation) == 0:
+                    break
+                sig = escalation.pop(0)
+                self.logger.info(f"Process {proc.pid} is timed out, sending {sig.name}")
+                proc.send_signal(sig)
+                is_full = False
+                wait_time = self.grace_period
+            await exited
+            # descendants may hold the pipes, so they are drained only for a grace period
+            await asyncio.wait([drained], timeout=self.grace_period)
+        except asyncio.CancelledError:
+            if not exited.done():
+                proc.send_signal(signal.SIGKILL)
+                await exited
+            raise
+        finally:
+            for fd in open_fds | {pidfd}:
+                loop.remove_reader(fd)
+            os.close(pidfd)
+            # rusage of the process is lost if it is reaped by Popen, so it is waited here
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            proc.stdout.close()
+            proc.stderr.close()
+
+        res = ProcessResult(
+            stdout=b"".join(outputs[stdout_fd]),
+            stderr=b"".join(outputs[stderr_fd]),
+            returncode=proc.returncode,
+            is_full=is_full,
+            wall_time=time.monotonic() - start,
+            cpu_time=rusage.ru_utime + rusage.ru_stime,
+            max_rss=rusage.ru_maxrss,
+        )
+        self.logger.info(
+            f"{execute_line[0]}: {res.wall_time:.3f}s wall, {res.cpu_time:.3f}s cpu, {res.max_rss}KB max rss"
+        )
+        return res
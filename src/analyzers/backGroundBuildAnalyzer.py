@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import shutil
 from pathlib import Path
 from tempfile import mkdtemp
 from typing import Dict, Any
+from src.protocols.collector import RawSamples
 from src.protocols.queueCollector import QueueCollector
 from src.protocols.patcher import Patcher
 
@@ -26,12 +28,32 @@ class BGBuildAnalyzer:
     def fin(self):
         shutil.rmtree(self.temp_dir)
 
+    def raw_samples(self) -> RawSamples | None:
+        return self.collector.raw_samples
+
+    def build_harness(self) -> None:
+        harness_src = self.temp_dir.joinpath("harness/harness.c")
+        harness_obj = self.temp_dir.joinpath("harness/harness.o")
+
+        self.patcher.patch_harness(harness_src)
+        self.builder.build_object(harness_src, harness_obj)
+        self.builder.set_default_link_objects([harness_obj])
+
     def analyze(self, test_dir: Path) -> Dict[str, Dict]:
         src_dir = self.temp_dir.joinpath("src/")
         build_dir = self.temp_dir.joinpath("bins/")
 
         # TODO: may be need to make and background patcher
         self.patcher.patch(test_dir, src_dir)
+        self.build_harness()
         out_chan = self.builder.build_dir(src_dir, build_dir)
-        res = self.collector.collect(out_chan)
+        try:
+            res = self.collector.collect(out_chan)
+        finally:
+            # the channel is bounded, so the builder would wait for a reader after an error or Ctrl-C
+            self.builder.cancel()
         return res
+
+    async def analyze_async(self, test_dir: Path) -> Dict[str, Dict]:
+        # the collector blocks on the ssh session, so it is run in a thread
+        return await asyncio.to_thread(self.analyze, test_dir)
@@ -1,11 +1,13 @@
+import asyncio
 import logging
 import shutil
+import sys
 from pathlib import Path
 from tempfile import mkdtemp
 from typing import Dict, Any
 
 from src.helpers.builder import Builder
-from src.protocols.collector import Collector, DictSI
+from src.protocols.collector import Collector, DictSI, RawSamples
 from src.protocols.patcher import Patcher
 
 
@@ -30,11 +32,31 @@ class BaseAnalyzer:
     def fin(self) -> None:
         shutil.rmtree(self.temp_dir)
 
+    def raw_samples(self) -> RawSamples | None:
+        return self.collector.raw_samples
+
+    def build_harness(self) -> None:
+        harness_src = self.temp_dir.joinpath("harness/harness.c")
+        harness_obj = self.temp_dir.joinpath("harness/harness.o")
+
+        self.patcher.patch_harness(harness_src)
+        self.builder.build_object(harness_src, harness_obj)
+        self.builder.set_default_link_objects([harness_obj])
+
+    def build(self, test_dir: Path, src_dir: Path, build_dir: Path) -> None:
+        self.patcher.patch(test_dir, src_dir)
+        self.build_harness()
+        report = self.builder.build_dir(src_dir, build_dir)
+        for failed in filter(lambda res: not res.is_built, report):
+            print(f"[-]: Can't build '{failed.src_file.name}', it will be skipped", file=sys.stderr)
+
     def analyze(self, test_dir: Path) -> Dict[str, DictSI]:
+        return asyncio.run(self.analyze_async(test_dir))
+
+    async def analyze_async(self, test_dir: Path) -> Dict[str, DictSI]:
         src_dir = self.temp_dir.joinpath("src/")
         build_dir = self.temp_dir.joinpath("bins/")
 
-        self.patcher.patch(test_dir, src_dir)
-        self.builder.build_dir(src_dir, build_dir)
-        res = self.collector.collect(build_dir)
-        return res
+        # the builder runs its own pool of compilers, so it is waited in a thread
+        await asyncio.to_thread(self.build, test_dir, src_dir, build_dir)
+        return await self.collector.collect_async(build_dir)
@@ -1,16 +1,19 @@
+import asyncio
 import logging
+import os
 import re
 import shlex
-import signal
-import subprocess
 from pathlib import Path
-from typing import Dict, Set, Any
+from typing import Dict, List, Set, Tuple, Any
 
-from src.protocols.collector import DictSI
+from src.analyzers.asyncRunner import AsyncRunner, gather_limited
+from src.protocols.collector import DictSI, RawSamples
 
 
 class GemCollector:
     BINARY_PLACEHOLDER = "{{GEM5_TARGET_BINARY}}"
+    STATS_BEGIN = "---------- Begin Simulation Statistics ----------"
+    TEST_MARKER = "chapy-test:"
 
     def __init__(self, settings: Dict[str, Any]):
         self.settings = settings
@@ -19,6 +22,8 @@ class GemCollector:
 
         self.gem5_home = Path(self.settings.get("gem5_home", ""))
         self.target_isa = self.settings.get("target_isa", "").lower()
+        # every test is simulated once, so there are no samples to keep
+        self.raw_samples: RawSamples | None = None
 
         self.gem5_bin_path = self.settings.get(
             "gem5_bin_path",
@@ -34,6 +39,9 @@ class GemCollector:
             "sim_script_args", f"--cpu-type=O3CPU --caches -c {self.BINARY_PLACEHOLDER}"
         )
         self.sim_script_args = shlex.split(self.sim_script_args)
+        self.batch_size = settings.get("batch_size", 1)
+        self.jobs: int = settings.get("sim_jobs") or os.cpu_count() or 1
+        self.async_runner = AsyncRunner(settings)
 
         if self.target_isa == "":
             raise Exception("No target isa provided")
@@ -57,41 +65,66 @@ class GemCollector:
 
         return stats_dict
 
+    def split_stats_file(self, stat_path: Path, test_names: List[str], dest_dir: Path) -> None:
+        """Write each stats dump of a binary to the file of its test, dumps are in the order tests were run.
+        The dump made at the exit of simulation after the last test is dropped
+        """
+        with open(stat_path, "r") as file:
+            dumps = file.read().split(self.STATS_BEGIN)[1:]
+        for test_name, dump in zip(test_names, dumps):
+            with open(dest_dir.joinpath(f"{test_name}.txt"), "w") as file:
+                file.write(self.STATS_BEGIN + dump)
+
+    async def run_bin(self, bin_path: Path, dest_dir: Path) -> Tuple[List[str], bool]:
+        """Simulate one binary, every simulation has its own outdir, so several of them may run at once
+
+        :return: Names of the tests that were started and whether the simulation is finished before the timeout
+        """
+        out_dir = bin_path.parent.joinpath("m5out", bin_path.name.split(".")[0])
+        stat_file = out_dir.joinpath("stats.txt")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        script_args = list(
+            map(
+                lambda x: x.replace(self.BINARY_PLACEHOLDER, str(bin_path)),
+                self.sim_script_args,
+            )
+        )
+        execute_line = [
+            self.gem5_bin_path,
+            f"--outdir={out_dir}",
+            f"--stats-file={stat_file}",
+            self.sim_script_path,
+        ] + script_args
+        self.logger.info(f"gemAnalyzer is running. Executed line: {execute_line}")
+
+        # timeout is given for one test, but binary may run a batch of them
+        proc = await self.async_runner.run(execute_line, self.settings["timeout"] * self.batch_size)
+        is_full_run = proc.is_full
+        output = proc.stdout
+
+        test_names = [
+            line.split(self.TEST_MARKER, 1)[1].strip()
+            for line in output.decode(errors="replace").splitlines()
+            if line.startswith(self.TEST_MARKER)
+        ]
+        if len(test_names) == 0:
+            test_names = [bin_path.name.split(".")[0]]
+        if stat_file.exists():
+            self.split_stats_file(stat_file, test_names, dest_dir)
+        return test_names, is_full_run
+
     def run_bins_in_dir(self, bin_dir: Path, dest_dir: Path) -> Set[str]:
+        return asyncio.run(self.run_bins_in_dir_async(bin_dir, dest_dir))
+
+    async def run_bins_in_dir_async(self, bin_dir: Path, dest_dir: Path) -> Set[str]:
         fully_runned: set[str] = set()
         dest_dir.mkdir(parents=True, exist_ok=True)
-        for binary in bin_dir.iterdir():
-            if binary.is_dir():
-                continue
+        binaries = [bin_dir.joinpath(binary) for binary in bin_dir.iterdir() if not binary.is_dir()]
 
-            is_full_run = True
-            bin_path = bin_dir.joinpath(binary)
-            stat_file = f"{dest_dir}/{bin_path.name.split('.')[0]}.txt"
-            script_args = list(
-                map(
-                    lambda x: x.replace(self.BINARY_PLACEHOLDER, str(bin_path)),
-                    self.sim_script_args,
-                )
-            )
-            execute_line = [
-                self.gem5_bin_path,
-                f"--outdir={bin_dir.joinpath('m5out')}",
-                f"--stats-file={stat_file}",
-                self.sim_script_path,
-            ] + script_args
-            self.logger.info(f"gemAnalyzer is running. Executed line: {execute_line}")
-
-            proc = subprocess.Popen(execute_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            try:
-                proc.wait(self.settings["timeout"])
-            except subprocess.TimeoutExpired:
-                proc.send_signal(signal.SIGINT)
-                is_full_run = False
-                while proc.poll() is None:
-                    pass
-
-            if is_full_run:
-                fully_runned.add(bin_path.name.split(".")[0])
+        runs = await gather_limited((self.run_bin(bin_path, dest_dir) for bin_path in binaries), self.jobs)
+        for test_names, is_full_run in runs:
+            # if the simulation is interrupted, only the last started test is incomplete
+            fully_runned.update(test_names if is_full_run else test_names[:-1])
 
         return fully_runned
 
@@ -107,9 +140,12 @@ class GemCollector:
         return analyzed
 
     def collect(self, bin_dir: Path) -> Dict[str, DictSI]:
+        return asyncio.run(self.collect_async(bin_dir))
+
+    async def collect_async(self, bin_dir: Path) -> Dict[str, DictSI]:
         stats_dir = bin_dir.joinpath("stats/")
 
-        full_runned = self.run_bins_in_dir(bin_dir, stats_dir)
+        full_runned = await self.run_bins_in_dir_async(bin_dir, stats_dir)
         analyzed = self.get_stats_from_dir(stats_dir)
 
         return self.correct(analyzed, full_runned)
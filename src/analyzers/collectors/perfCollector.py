@@ -1,16 +1,28 @@
+import asyncio
 import logging
+import random
 import signal
+import socket
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List, Any
+from pprint import pformat
+from typing import Dict, List, Any, Tuple
 
-if TYPE_CHECKING:
-    from _typeshed import StrOrBytesPath
+from src.analyzers.asyncRunner import AsyncRunner
+from src.analyzers.collectors.perfEvents import EVENTS_FILE_ENV, PerfEvent, encode_events, parse_events
+from src.analyzers.collectors.perfGroups import CounterBudget, split_groups
+from src.analyzers.collectors.perfParser import RESULT_FILE_ENV, TEXT_OUTPUT_ENV, PerfParser, TestRes
+from src.helpers.capabilities import CapabilitySetter
+from src.helpers.corePool import CorePool
+from src.helpers.launcher import Launcher, build_launcher, spawn_launcher
+from src.helpers.supervisor import ProcessResult
+from src.protocols.collector import DictSI, RawSamples
 
-from src.analyzers.collectors.perfParser import PerfParser, TestRes
-from src.protocols.collector import DictSI
+# exit code of the harness interrupted by SIGINT
+EXIT_SIGNAL = 2
 
 
 class PerfCollector:
@@ -20,94 +32,319 @@ class PerfCollector:
         self.logger.setLevel(self.settings["log_level"])
 
         self.max_test_launches = settings.get("max_test_launches", -1)
-        self.cpu = settings.get("cpu", 0)
+        self.core_pool = CorePool(settings)
+        self.batch_size = settings.get("batch_size", 1)
+        self.iterations = settings.get("iterations", 1)
+        self.warmup_iterations = settings.get("warmup_iterations", 0)
+        # launches stop early once the median is estimated precisely enough
+        self.ci_tolerance: float | None = settings.get("ci_tolerance")
+        self.ci_confidence = settings.get("ci_confidence", 0.95)
+        self.min_test_launches = settings.get("min_test_launches", 3)
+        self.statistic = settings.get("statistic", "median")
+        self.trim = settings.get("trim", 0.1)
+        self.outlier_threshold: float | None = settings.get("outlier_threshold")
+        self.raw_samples: RawSamples | None = None
+        self.text_output = settings.get("text_output", False)
+        self.result_file = settings.get("result_file", False)
+        # events given as a list are passed to the harness at runtime, instead of ones compiled into it
+        events = settings.get("events")
+        self.events: List[PerfEvent] | None = parse_events(events) if isinstance(events, list) else None
+        # events which don't fit into PMU counters are split into groups measured by separate launches
+        self.counter_budget = CounterBudget(settings)
+        self.reference_event = settings.get("reference_event", "instructions")
+        self.async_runner = AsyncRunner(settings)
+        # tests are launched by persistent launchers pinned to cores, which pass capabilities to them
+        self.use_launcher = settings.get("launcher", False)
+        self.launchers: Dict[int, Launcher] = {}
+        self.capability_setter = CapabilitySetter(settings, self.run_command)
+        # 'interleaved' launches tests in random order and re-measures the empty test every baseline_period launches
+        self.launch_order = settings.get("launch_order", "sequential")
+        self.baseline_period = max(settings.get("baseline_period", 10), 1)
+        self.random = random.Random(settings.get("launch_seed"))
 
     def tab_lines(self, lines: str) -> str:
         return "\t" + lines.replace("\n", "\n\t")[:-1]
 
-    def execute_test(self, execute_line: List[str], timeout: float) -> TestRes:
-        proc = subprocess.Popen(execute_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        is_full = True
-        try:
-            proc.wait(timeout)
-        except subprocess.TimeoutExpired:
-            proc.send_signal(signal.SIGINT)
-            is_full = False
-            if proc.poll() is None:
-                pass
-            if proc.returncode is not int:  # some bug: if send signal to proc, its ret code will be one
-                proc.returncode = 0
-            elif proc.returncode == 2:  # if it will be work corectly ret with signint should be 2
-                proc.returncode = 0
-
-        if proc.stderr is not None:
-            test_errors = proc.stderr.read().decode()
-            if len(test_errors) > 0:
-                execute_str = " ".join(execute_line)
-                print(f"[-]: Some error occurred during launching '{execute_str}':", file=sys.stderr)
-                print(self.tab_lines(test_errors), file=sys.stderr, end="")
-        if proc.returncode != 0:
+    async def run_process(
+        self, execute_line: List[str], timeout: float, env: Dict[str, str], cpu_core: int = -1
+    ) -> ProcessResult:
+        if cpu_core in self.launchers:
+            # a launcher serves one launch at a time, so there is a thread per core at most
+            return await asyncio.to_thread(self.launchers[cpu_core].run, execute_line, timeout, env)
+        return await self.async_runner.run(execute_line, timeout, env)
+
+    async def execute_test(
+        self, execute_line: List[str], timeout: float, env: Dict[str, str] | None = None, cpu_core: int = -1
+    ) -> TestRes:
+        env = env or {}
+        started = time.monotonic()
+        if self.text_output:
+            proc = await self.run_process(execute_line, timeout, {**env, TEXT_OUTPUT_ENV: "1"}, cpu_core)
+            output = proc.stdout
+        elif self.result_file:
+            with tempfile.NamedTemporaryFile(prefix="chapy-", suffix=".res") as result_file:
+                proc = await self.run_process(
+                    execute_line, timeout, {**env, RESULT_FILE_ENV: result_file.name}, cpu_core
+                )
+                output = result_file.read()
+        else:
+            proc = await self.run_process(execute_line, timeout, env, cpu_core)
+            output = proc.stdout
+
+        is_full = proc.is_full
+        returncode = proc.returncode
+        if not is_full and returncode in [EXIT_SIGNAL, -signal.SIGINT]:
+            returncode = 0
+
+        test_errors = proc.stderr.decode()
+        if len(test_errors) > 0:
+            execute_str = " ".join(execute_line)
+            print(f"[-]: Some error occurred during launching '{execute_str}':", file=sys.stderr)
+            print(self.tab_lines(test_errors), file=sys.stderr, end="")
+        if returncode != 0:
             print(
                 "[?]: Maybe perf don't have enough capabilities or your CPU don't have special debug counters\n",
                 file=sys.stderr,
             )
 
-        res = bytes()
-        if proc.stdout is not None:
-            res = proc.stdout.read()
-        return (res, is_full)
+        return TestRes(output, is_full, started=started)
 
     def get_stat(self, binary: Path, number_executes: int, cpu_core: int) -> List[TestRes]:
-        stats: List[TestRes] = []
-        execute_line = list(map(str, [binary, cpu_core]))
-        execute_string = " ".join(map(str, execute_line))
-        self.logger.info(f"[perfProfiler]: Executing: {execute_string}")
+        return asyncio.run(self.get_groups_stat(binary, number_executes, cpu_core, [{}]))[0]
+
+    async def get_groups_stat(
+        self, binary: Path, number_executes: int, cpu_core: int, groups_env: List[Dict[str, str]]
+    ) -> List[List[TestRes]]:
+        """Launch the binary once for every event group per step, so that groups are measured under the same
+        conditions. Convergence is checked by the first group
 
-        left_time = self.settings["timeout"]
-        timeout = time.time() + self.settings["timeout"]
+        :param groups_env: Variables added to the environment of launches of each group
+        """
+        groups_stats: List[List[TestRes]] = [[] for _ in groups_env]
+        stats = groups_stats[0]
+        left_time = self.time_budget()
+        timeout = time.time() + left_time
         while (left_time > 0) and (number_executes != 0):
-            stats.append(self.execute_test(execute_line, left_time))
+            groups_res = await self.launch_groups(binary, left_time, cpu_core, groups_env)
+            for group_stats, res in zip(groups_stats, groups_res):
+                group_stats.append(res)
             left_time = timeout - time.time()
             number_executes -= 1
-        return stats
+            if self.is_converged(stats, binary):
+                self.logger.info(f"Results of {binary.name} converged after {len(stats)} launches")
+                break
+        return groups_stats
+
+    def time_budget(self) -> float:
+        # timeout is given for one test, but binary may run a batch of them
+        return self.settings["timeout"] * self.batch_size
+
+    async def launch_groups(
+        self, binary: Path, left_time: float, cpu_core: int, groups_env: List[Dict[str, str]]
+    ) -> List[TestRes]:
+        """Launch the binary once for every event group
+
+        :param left_time: Seconds left for all the launches
+        :return: Result of each group
+        """
+        execute_line = list(map(str, [binary, cpu_core, self.iterations, self.warmup_iterations]))
+        self.logger.info(f"[perfProfiler]: Executing: {' '.join(execute_line)}")
+        timeout = time.time() + left_time
+        groups_res: List[TestRes] = []
+        for env in groups_env:
+            res = await self.execute_test(execute_line, left_time, env, cpu_core)
+            groups_res.append(res._replace(cpu=cpu_core))
+            left_time = timeout - time.time()
+        return groups_res
+
+    def correct(self, analyzed: Dict[str, List[TestRes]]) -> Dict[str, DictSI]:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Mispredict ratio of tests:\n{pformat(PerfParser.describe(analyzed, self.trim))}")
+        self.raw_samples = PerfParser.to_samples(analyzed)
+        return PerfParser.correct_samples(
+            *self.raw_samples, statistic=self.statistic, trim=self.trim, outlier_threshold=self.outlier_threshold
+        )
+
+    def is_converged(self, stats: List[TestRes], binary: Path) -> bool:
+        if self.ci_tolerance is None or len(stats) < self.min_test_launches:
+            return False
+        return PerfParser.is_converged(stats, binary.name.split(".")[0], self.ci_tolerance, self.ci_confidence)
+
+    async def get_stats_dir(self, target_dir: Path, events_files: List[Path] | None = None) -> Dict[str, List[TestRes]]:
+        """
+        :param events_files: Descriptors of event groups, results of the groups are merged.
+            By default, the harness measures events compiled into it
+        """
+        groups_env = [{}] if events_files is None else [{EVENTS_FILE_ENV: str(pth)} for pth in events_files]
+
+        # a launch per core at a time, so that concurrent launches don't disturb each other's predictors
+        free_cores: asyncio.Queue[int] = asyncio.Queue()
+        for core in self.core_pool.cores:
+            free_cores.put_nowait(core)
+
+        async def get_stat_on_free_core(binary: Path) -> List[List[TestRes]]:
+            cpu_core = await free_cores.get()
+            try:
+                return await self.get_groups_stat(binary, self.max_test_launches, cpu_core, groups_env)
+            finally:
+                free_cores.put_nowait(cpu_core)
+
+        binaries = list(target_dir.iterdir())
+        if self.launch_order == "interleaved":
+            stats = await self.get_stats_interleaved(binaries, groups_env, free_cores)
+        else:
+            baseline = PerfParser.find_baseline(binaries)
+            tests = [binary for binary in binaries if binary != baseline]
+            # every core is free before tests, so the baseline is measured on each of them
+            baseline_stats = None if baseline is None else await self.get_baseline_stat(baseline, groups_env)
+            tests_stats = await asyncio.gather(*map(get_stat_on_free_core, tests))
+            binaries = tests + ([] if baseline is None else [baseline])
+            stats = tests_stats + ([] if baseline_stats is None else [baseline_stats])
+        groups_dict: List[Dict[str, List[TestRes]]] = [{} for _ in groups_env]
+        for binary, groups_data in zip(binaries, stats):
+            for output_dict, data in zip(groups_dict, groups_data):
+                for test_name, test_data in PerfParser.split_by_tests(data, binary.name.split(".")[0]).items():
+                    output_dict.setdefault(test_name, []).extend(test_data)
+        return PerfParser.merge_groups(groups_dict, self.reference_event)
+
+    async def get_baseline_stat(self, baseline: Path, groups_env: List[Dict[str, str]]) -> List[List[TestRes]]:
+        """Measure the empty test on every core at once, so that results of a core are corrected by the baseline
+        of the same core. All cores should be free
+
+        :return: Results of each group joined over the cores
+        """
+        cores_stats = await asyncio.gather(
+            *(self.get_groups_stat(baseline, self.max_test_launches, core, groups_env) for core in self.core_pool.cores)
+        )
+        return [[res for core_stats in cores_stats for res in core_stats[group]] for group in range(len(groups_env))]
 
-    def get_stats_dir(self, target_dir: Path) -> Dict[str, List[TestRes]]:
-        output_dict: Dict[str, List[TestRes]] = {}
-        for binary in target_dir.iterdir():
-            data = self.get_stat(target_dir.joinpath(binary), self.max_test_launches, self.cpu)
-            output_dict[binary.name.split(".")[0]] = data
-        return output_dict
+    async def get_stats_interleaved(
+        self, binaries: List[Path], groups_env: List[Dict[str, str]], free_cores: asyncio.Queue[int]
+    ) -> List[List[List[TestRes]]]:
+        """Launch binaries by rounds, every round launches each unfinished binary once in random order,
+        so that drift of the machine during the run affects all tests alike. The empty test is launched
+        on every core before each round and after the last one, and on a free core before every baseline_period
+        launches of a round, so that results are corrected by its nearest launch on the same core.
+        Limits of launches are the same as in get_groups_stat, but the timeout of a binary is spent
+        by its launches only
+
+        :param free_cores: Cores which aren't running a launch
+        :return: Results of each group for every binary
+        """
+        stats: Dict[Path, List[List[TestRes]]] = {binary: [[] for _ in groups_env] for binary in binaries}
+        baseline = PerfParser.find_baseline(binaries)
+        tests = [binary for binary in binaries if binary != baseline]
+        left_time = {binary: self.time_budget() for binary in tests}
+        left_launches = {binary: self.max_test_launches for binary in tests}
+        finished: set[Path] = set(tests) if self.max_test_launches == 0 else set()
+
+        async def launch_on_free_core(binary: Path) -> None:
+            cpu_core = await free_cores.get()
+            try:
+                await launch(binary, cpu_core)
+            finally:
+                free_cores.put_nowait(cpu_core)
+
+        async def launch_baseline_on_every_core() -> None:
+            if baseline is None:
+                return
+            # rounds are awaited as a whole, so every core is free between them
+            await asyncio.gather(*(launch(baseline, core) for core in self.core_pool.cores))
+
+        async def launch(binary: Path, cpu_core: int) -> None:
+            start = time.time()
+            budget = left_time.get(binary, self.time_budget())
+            groups_res = await self.launch_groups(binary, budget, cpu_core, groups_env)
+            for group_stats, res in zip(stats[binary], groups_res):
+                group_stats.append(res)
+            if binary == baseline:
+                return
+            left_time[binary] -= time.time() - start
+            left_launches[binary] -= 1
+            if left_time[binary] <= 0 or left_launches[binary] == 0:
+                finished.add(binary)
+            elif self.is_converged(stats[binary][0], binary):
+                self.logger.info(f"Results of {binary.name} converged after {len(stats[binary][0])} launches")
+                finished.add(binary)
+
+        while len(finished) < len(tests):
+            active = [binary for binary in tests if binary not in finished]
+            self.random.shuffle(active)
+            await launch_baseline_on_every_core()
+            schedule: List[Path] = []
+            for i, binary in enumerate(active):
+                if baseline is not None and i > 0 and i % self.baseline_period == 0:
+                    schedule.append(baseline)
+                schedule.append(binary)
+            await asyncio.gather(*map(launch_on_free_core, schedule))
+        await launch_baseline_on_every_core()
+        return [stats[binary] for binary in binaries]
+
+    def write_events_groups(self, bin_dir: Path, events_dir: Path, loop: asyncio.AbstractEventLoop) -> List[Path]:
+        """Split events into groups fitting into counters of this host and write a descriptor for each group
+
+        :param loop: Event loop running launches, the method itself is run in another thread
+        """
+        events = self.events or []
+        probe_file = events_dir.joinpath("probe.events")
+
+        def probe(descriptor: bytes) -> bytes:
+            probe_file.write_bytes(descriptor)
+            binary = next(bin_dir.iterdir())
+            cpu_core = self.core_pool.cores[0]
+            execute_line = list(map(str, [binary, cpu_core, 1, 0]))
+            env = {EVENTS_FILE_ENV: str(probe_file)}
+            launch = self.run_process(execute_line, self.settings["timeout"], env, cpu_core)
+            return asyncio.run_coroutine_threadsafe(launch, loop).result().stdout
+
+        groups = split_groups(events, self.counter_budget.get(socket.gethostname(), probe), self.reference_event)
+        if len(groups) > 1:
+            self.logger.info(f"Events are split into groups: {[[event.name for event in group] for group in groups]}")
+        events_files: List[Path] = []
+        for i, group in enumerate(groups):
+            events_files.append(events_dir.joinpath(f"group_{i}.events"))
+            events_files[-1].write_bytes(encode_events(group))
+        return events_files
+
+    def run_command(self, execute_line: List[str]) -> Tuple[int, bytes, bytes]:
+        proc = subprocess.run(execute_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return proc.returncode, proc.stdout, proc.stderr
 
     def update_capabilities_dir(self, target_dir: Path) -> None:
-        sudo_hint = True
-        use_sudo = False
-        for binary in target_dir.iterdir():
-            suc_launch = False
-            used_max_perm = False
-
-            pth = target_dir.joinpath(binary)
-            execute_line: List[StrOrBytesPath] = ["setcap", "cap_sys_admin,cap_sys_nice=ep", pth]
-            while (not suc_launch) and (not used_max_perm):
-                if use_sudo:
-                    if sudo_hint:
-                        print("[+]: Try using sudo to set capabilities for tests executables")
-                        sudo_hint = False
-                    execute_line = ["sudo"] + execute_line
-                    used_max_perm = True
-
-                proc = subprocess.run(execute_line, stderr=subprocess.PIPE)
-
-                if proc.returncode == 0:
-                    suc_launch = True
-                else:
-                    if used_max_perm:
-                        proc_err = proc.stderr.decode()
-                        print(f"[-]: Error during seting capability:\n {self.tab_lines(proc_err)}", file=sys.stderr)
-                    use_sudo = True
+        files = [str(target_dir.joinpath(binary)) for binary in target_dir.iterdir()]
+        self.capability_setter.setcap(files)
+
+    def start_launchers(self, work_dir: Path) -> None:
+        launcher_dir = work_dir.joinpath("launcher")
+        launcher_dir.mkdir()
+        launcher_path = build_launcher(self.settings, launcher_dir)
+        # only the launcher needs capabilities, tests get them from it
+        self.update_capabilities_dir(launcher_dir)
+        self.launchers = {core: spawn_launcher(self.settings, launcher_path, core) for core in self.core_pool.cores}
+
+    def stop_launchers(self) -> None:
+        for launcher in self.launchers.values():
+            launcher.close()
+        self.launchers = {}
 
     def collect(self, bin_dir: Path) -> Dict[str, DictSI]:
-        self.update_capabilities_dir(bin_dir)
-        analyzed = self.get_stats_dir(bin_dir)
+        return asyncio.run(self.collect_async(bin_dir))
+
+    async def collect_async(self, bin_dir: Path) -> Dict[str, DictSI]:
+        with tempfile.TemporaryDirectory(prefix="chapy-") as work_dir:
+            # setup runs other tools, so it doesn't block the event loop
+            if self.use_launcher:
+                await asyncio.to_thread(self.start_launchers, Path(work_dir))
+            else:
+                await asyncio.to_thread(self.update_capabilities_dir, bin_dir)
+            try:
+                if self.events is None:
+                    analyzed = await self.get_stats_dir(bin_dir)
+                else:
+                    loop = asyncio.get_running_loop()
+                    events_files = await asyncio.to_thread(self.write_events_groups, bin_dir, Path(work_dir), loop)
+                    analyzed = await self.get_stats_dir(bin_dir, events_files)
+            finally:
+                self.stop_launchers()
 
-        return PerfParser.correct(analyzed)
+        return self.correct(analyzed)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from src.analyzers.collectors.perfParser import RESULTS_BYTE_ORDER
+
+# descriptor of events read by the harness at runtime, see attachments/events.h
+EVENTS_MAGIC = b"CHPE"
+EVENTS_VERSION = 1
+# magic, version, reserved, byte order and number of events
+EVENTS_HEADER = "4sBBHI"
+# type, config, exclude_kernel, exclude_hv and length of the name
+EVENT_ENTRY = "IQBBH"
+# environment variable of the harness with the path to the descriptor
+EVENTS_FILE_ENV = "CHAPY_EVENTS_FILE"
+
+# names of linux/perf_event.h constants without the PERF_TYPE_ and PERF_COUNT_ prefixes
+EVENT_TYPES = {"hardware": 0, "software": 1, "tracepoint": 2, "hw_cache": 3, "raw": 4, "breakpoint": 5}
+EVENT_CONFIGS = {
+    "hardware": {
+        "cpu_cycles": 0,
+        "instructions": 1,
+        "cache_references": 2,
+        "cache_misses": 3,
+        "branch_instructions": 4,
+        "branch_misses": 5,
+        "bus_cycles": 6,
+        "stalled_cycles_frontend": 7,
+        "stalled_cycles_backend": 8,
+        "ref_cpu_cycles": 9,
+    },
+    "software": {
+        "cpu_clock": 0,
+        "task_clock": 1,
+        "page_faults": 2,
+        "context_switches": 3,
+        "cpu_migrations": 4,
+        "page_faults_min": 5,
+        "page_faults_maj": 6,
+        "alignment_faults": 7,
+        "emulation_faults": 8,
+        "dummy": 9,
+    },
+}
+# hw_cache configs are written as "cache:op:result", e.g. "bpu:read:miss"
+HW_CACHE_IDS = {"l1d": 0, "l1i": 1, "ll": 2, "dtlb": 3, "itlb": 4, "bpu": 5, "node": 6}
+HW_CACHE_OPS = {"read": 0, "write": 1, "prefetch": 2}
+HW_CACHE_RESULTS = {"access": 0, "miss": 1}
+
+
+@dataclass
+class PerfEvent:
+    name: str
+    type: int
+    config: int
+    exclude_kernel: bool = True
+    exclude_hv: bool = True
+
+
+def parse_number(value: Any) -> int:
+    """Parse a number given as an int or as a string with a base prefix, e.g. '0x12'"""
+    return value if isinstance(value, int) else int(str(value), 0)
+
+
+def parse_config(event_type: str | int, config: Any) -> int:
+    if isinstance(config, str) and event_type == "hw_cache" and ":" in config:
+        cache, op, result = config.lower().split(":")
+        return HW_CACHE_IDS[cache] | (HW_CACHE_OPS[op] << 8) | (HW_CACHE_RESULTS[result] << 16)
+    if isinstance(config, str) and config.lower() in EVENT_CONFIGS.get(str(event_type), {}):
+        return EVENT_CONFIGS[str(event_type)][config.lower()]
+    return parse_number(config)
+
+
+def parse_events(events: List[Dict[str, Any]]) -> List[PerfEvent]:
+    """Parse events of the configuration file. A type and a config are names of linux/perf_event.h constants
+    in lower case without prefixes, e.g. "hardware" and "branch_misses", or numbers
+
+    :param events: Dicts with name, type, config and optional exclude_kernel and exclude_hv keys
+    """
+    parsed: List[PerfEvent] = []
+    for event in events:
+        event_type = event["type"]
+        if isinstance(event_type, str) and event_type.lower() in EVENT_TYPES:
+            event_type = event_type.lower()
+            type_id = EVENT_TYPES[event_type]
+        else:
+            type_id = parse_number(event_type)
+        parsed.append(
+            PerfEvent(
+                name=event["name"],
+                type=type_id,
+                config=parse_config(event_type, event["config"]),
+                exclude_kernel=bool(event.get("exclude_kernel", True)),
+                exclude_hv=bool(event.get("exclude_hv", True)),
+            )
+        )
+    return parsed
+
+
+def encode_events(events: List[PerfEvent], byteorder: str = sys.byteorder) -> bytes:
+    """Encode events to the descriptor read by the harness
+
+    :param byteorder: Byte order of the target, "little" or "big"
+    """
+    order = "<" if byteorder == "little" else ">"
+    parts = [struct.pack(order + EVENTS_HEADER, EVENTS_MAGIC, EVENTS_VERSION, 0, RESULTS_BYTE_ORDER, len(events))]
+    for event in events:
+        name = event.name.encode()
+        parts.append(
+            struct.pack(
+                order + EVENT_ENTRY, event.type, event.config, event.exclude_kernel, event.exclude_hv, len(name)
+            )
+        )
+        parts.append(name)
+    return b"".join(parts)
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from src.analyzers.collectors import perfStats
+from src.analyzers.collectors.perfEvents import EVENT_TYPES, PerfEvent, encode_events
+from src.analyzers.collectors.perfParser import PerfParser
+
+DEFAULT_COUNTERS_CACHE = Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser().joinpath("chapy/counters.json")
+# events of these types occupy PMU counters, software events are counted by the kernel
+COUNTER_TYPES = {EVENT_TYPES["hardware"], EVENT_TYPES["hw_cache"], EVENT_TYPES["raw"]}
+# the probe stops here even if every group fits
+MAX_PROBED_COUNTERS = 32
+
+
+def split_groups(events: List[PerfEvent], budget: int, reference: str) -> List[List[PerfEvent]]:
+    """Split events into groups which fit into budget counters. The reference event leads every group,
+    so that groups measured by different launches can be normalized to each other
+
+    :param budget: Number of PMU counters, 0 if it is unknown and events aren't split
+    :param reference: Name of the reference event
+    """
+    hardware = [event for event in events if event.type in COUNTER_TYPES]
+    if budget <= 0 or len(hardware) <= budget:
+        return [events]
+    # groups are merged by the reference event, without it their counters would describe different runs
+    if reference not in [event.name for event in events]:
+        raise Exception(
+            f"Events don't fit into {budget} counters, but the reference event '{reference}' isn't measured"
+        )
+    if reference not in perfStats.COUNTERS.values():
+        raise Exception(
+            f"Events don't fit into {budget} counters, but the reference event '{reference}' isn't reported, "
+            f"it should be one of {list(perfStats.COUNTERS.values())}"
+        )
+
+    pinned = [event for event in events if event.name == reference]
+    free = [event for event in events if event.type not in COUNTER_TYPES and event.name != reference]
+    rest = [event for event in hardware if event.name != reference]
+    size = budget - sum(event.type in COUNTER_TYPES for event in pinned)
+    if size <= 0:
+        size = budget
+        pinned = []
+    groups: List[List[PerfEvent]] = []
+    for begin in range(0, len(rest), size):
+        end = begin + size
+        groups.append(pinned + rest[begin:end])
+    groups[0] = groups[0] + free
+    return groups
+
+
+def probe_counters(run: Callable[[bytes], bytes]) -> int:
+    """Find the number of events of one group the PMU counts at once. A group which doesn't fit never runs
+
+    :param run: Launches a test with the event descriptor and returns its binary results
+    """
+    budget = 0
+    while budget < MAX_PROBED_COUNTERS:
+        group = [PerfEvent("branches", EVENT_TYPES["hardware"], 4) for _ in range(budget + 1)]
+        _, samples = PerfParser.decode_samples(run(encode_events(group)))
+        if len(samples) == 0 or (samples["branches"] == -1).any() or (samples["time_running"] == 0).any():
+            break
+        budget += 1
+    return budget
+
+
+class CounterBudget:
+    """Number of PMU counters of hosts, set in the settings or probed once per host and cached"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.budget: int | None = settings.get("counters_budget")
+        cache_file = settings.get("counters_cache", DEFAULT_COUNTERS_CACHE)
+        self.cache_file = Path(cache_file).expanduser() if cache_file else None
+
+    def load(self) -> Dict[str, int]:
+        if self.cache_file is None:
+            return {}
+        try:
+            return json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, host: str, run: Callable[[bytes], bytes]) -> int:
+        """
+        :param host: Name of the host in the cache
+        :param run: Launches a test on the host, see probe_counters
+        """
+        if self.budget is not None:
+            return int(self.budget)
+        cached = self.load()
+        if host in cached:
+            return cached[host]
+
+        budget = probe_counters(run)
+        if budget == 0:
+            # e.g. perf lacks permissions or the test lacks capabilities, so it is probed again next time
+            print(f"[-]: Can't count events on {host}, events aren't split into groups", file=sys.stderr)
+            return budget
+        self.logger.info(f"Host {host} counts {budget} events at once")
+        if self.cache_file is not None:
+            cached[host] = budget
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_file.write_text(json.dumps(cached, indent=4))
+        return budget
@@ -1,15 +1,52 @@
 from __future__ import annotations
 
+import struct
 import sys
-from typing import Any, Dict, List, Tuple, TypeAlias
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
 
-from src.protocols.collector import DictSI
+import numpy as np
 
-TestRes: TypeAlias = Tuple[bytes, bool]
+from src.analyzers.collectors import perfStats
+from src.protocols.collector import DictSI, RawSamples
+
+# binary results of the harness, see attachments/results.h
+RESULTS_MAGIC = b"CHPY"
+RESULTS_VERSION = 1
+RESULTS_BYTE_ORDER = 0x0102
+RECORD_SCHEMA = 0
+RECORD_DATA = 1
+# magic, version, kind, byte order and payload length
+RECORD_HEADER = "4sBBHI"
+SCHEMA_HEADER = "II"
+# environment variables of the harness switching to the text output and to the memory-mapped result file
+TEXT_OUTPUT_ENV = "CHAPY_TEXT_OUTPUT"
+RESULT_FILE_ENV = "CHAPY_RESULT_FILE"
+# test measuring the harness overhead, which is subtracted from other tests
+EMPTY_TEST = "empty"
+
+# measured events which aren't kept in samples, they are reported once per run
+UNREPORTED_EVENTS: set[str] = set()
+
+
+class TestRes(NamedTuple):
+    output: bytes
+    is_full: bool
+    # core which the launch was pinned to, -1 if unknown
+    cpu: int = -1
+    # samples of one test decoded from binary results of a launch, output is empty then
+    samples: np.ndarray | None = None
+    # monotonic time in seconds when the launch started, -1 if unknown
+    started: float = -1
+    # index of the host in the 'hosts' setting of ssh, -1 if unknown
+    host: int = -1
+
+    # not a test class for pytest
+    __test__ = False
 
 
 class PerfData:
-    def __init__(self, data_dict: Dict[str, str] | None = None, is_full: bool = True):
+    def __init__(self, data_dict: Dict[str, Any] | None = None, is_full: bool = True, cpu: int = -1, host: int = -1):
         if data_dict is None:
             data_dict = {}
 
@@ -19,6 +56,10 @@ class PerfData:
         self.ticks = int(data_dict.get("cpu_clock", -1))
         self.instructions = int(data_dict.get("instructions", -1))
         self.predicted_branches = int(data_dict.get("predicted_branches", -1))
+        # counters of a group are scheduled together, so they share the enabled and running time
+        self.time_enabled = int(data_dict.get("time_enabled", -1))
+        self.time_running = int(data_dict.get("time_running", -1))
+        self.scale()
 
         if (self.branches == -1) and (self.missed_branches != -1) and (self.predicted_branches != -1):
             self.branches = self.missed_branches + self.predicted_branches
@@ -28,6 +69,25 @@ class PerfData:
             self.missed_branches = self.branches - self.predicted_branches
 
         self.is_full = is_full
+        self.cpu = cpu
+        self.host = host
+
+    def counters(self) -> List[str]:
+        return ["branches", "missed_branches", "cache_bpu", "ticks", "instructions", "predicted_branches"]
+
+    def scale(self) -> None:
+        """Extrapolate counters to the whole enabled time if the group was multiplexed with other events.
+        Counters of a group which has never run are unknown"""
+        if self.time_enabled <= 0 or self.time_running == -1 or self.time_running == self.time_enabled:
+            return
+        for counter in self.counters():
+            value = getattr(self, counter)
+            if value == -1:
+                continue
+            if self.time_running == 0:
+                setattr(self, counter, -1)
+            else:
+                setattr(self, counter, round(value * self.time_enabled / self.time_running))
 
     def to_dict(self) -> DictSI:
         data_dict: DictSI = {}
@@ -38,6 +98,10 @@ class PerfData:
         data_dict["simTicks"] = self.ticks
         data_dict["instructions"] = self.instructions
         data_dict["isFull"] = self.is_full
+        if self.cpu != -1:
+            data_dict["cpu"] = self.cpu
+        if self.host != -1:
+            data_dict["host"] = self.host
         return data_dict
 
     def __sub__(self, other: Any) -> PerfData:
@@ -50,6 +114,10 @@ class PerfData:
             res.ticks = self.ticks - other.ticks
             res.instructions = self.instructions - other.instructions
             res.is_full = self.is_full
+            res.cpu = self.cpu
+            res.host = self.host
+            res.time_enabled = self.time_enabled
+            res.time_running = self.time_running
             return res
         else:
             raise TypeError
@@ -58,12 +126,8 @@ class PerfData:
         return str(self.to_dict())
 
     def max(self, const: int) -> None:
-        self.branches = max(self.branches, const)
-        self.predicted_branches = max(self.predicted_branches, const)
-        self.missed_branches = max(self.missed_branches, const)
-        self.cache_bpu = max(self.cache_bpu, const)
-        self.ticks = max(self.ticks, const)
-        self.instructions = max(self.instructions, const)
+        for counter in self.counters():
+            setattr(self, counter, max(getattr(self, counter), const))
 
 
 class PerfParser:
@@ -78,52 +142,448 @@ class PerfParser:
         return data_dict
 
     @staticmethod
-    def test_res_to_data(res: TestRes) -> PerfData:
-        res_bytes, is_full = res
-        dic: Dict[str, str] = PerfParser.output_to_dict(res_bytes.decode())
-        return PerfData(dic, is_full)
+    def split_records(output: bytes) -> List[Tuple[str, bytes]]:
+        """Split output of the harness into records of tests, each record starts with 'test: <name>' line"""
+        records: List[Tuple[str, bytes]] = []
+        for line in output.splitlines(keepends=True):
+            name, sep, value = line.decode().partition(":")
+            if sep and name.strip() == "test":
+                records.append((value.strip(), bytes()))
+            elif len(records) == 0:
+                records.append(("", line))
+            else:
+                records[-1] = (records[-1][0], records[-1][1] + line)
+        return records
 
     @staticmethod
-    def get_meddian(stats: List[PerfData]) -> PerfData | None:
-        def _get_meddian(stats: List[PerfData]) -> PerfData | None:
-            def missed_pct(dt: PerfData) -> float:
-                if dt.branches == 0:
-                    dt.branches = 1
-                return dt.missed_branches / dt.branches
+    def byte_order(output: bytes) -> str | None:
+        """Detect byte order of binary results by the header of the first record
 
-            stats.sort(key=missed_pct)
-            if len(stats) > 0:
-                return stats[(len(stats) // 2)]
+        :return: The struct byte order character or None if output isn't binary
+        """
+        if not output.startswith(RESULTS_MAGIC) or len(output) < struct.calcsize(RECORD_HEADER):
             return None
+        for order in "<>":
+            _, version, _, mark, _ = struct.unpack_from(order + RECORD_HEADER, output)
+            if mark == RESULTS_BYTE_ORDER:
+                if version != RESULTS_VERSION:
+                    print(f"[-]: Error: unsupported version {version} of harness results", file=sys.stderr)
+                    return None
+                return order
+        return None
+
+    @staticmethod
+    def decode_samples(output: bytes) -> Tuple[List[str], np.ndarray]:
+        """Decode binary results of a launch. Data records have the same size, so they are decoded at once
+
+        :return: Names of tests and samples of perfStats.SAMPLE_DTYPE, the 'test' field is an index in the names
+        """
+        samples = np.zeros(0, dtype=perfStats.SAMPLE_DTYPE)
+        order = PerfParser.byte_order(output)
+        if order is None:
+            return [], samples
+        _, _, kind, _, payload_len = struct.unpack_from(order + RECORD_HEADER, output)
+        offset = struct.calcsize(RECORD_HEADER)
+        if kind != RECORD_SCHEMA:
+            return [], samples
+        events_len, tests_len = struct.unpack_from(order + SCHEMA_HEADER, output, offset)
+        names_begin = offset + struct.calcsize(SCHEMA_HEADER)
+        names_end = offset + payload_len
+        names = output[names_begin:names_end].decode().split("\0")
+        events, tests = names[:events_len], names[events_len:][:tests_len]
+
+        record_dtype = np.dtype(
+            [
+                ("magic", "S4"),
+                ("version", "u1"),
+                ("kind", "u1"),
+                ("byte_order", order + "u2"),
+                ("payload_len", order + "u4"),
+                ("test_id", order + "u4"),
+                ("iteration", order + "u4"),
+                ("is_full", order + "u4"),
+                ("events_len", order + "u4"),
+                ("time_enabled", order + "u8"),
+                ("time_running", order + "u8"),
+                ("values", order + "i8", (events_len,)),
+            ]
+        )
+        data = output[names_end:]
+        # a result file of a killed launch may end with a partial record or zeroes
+        records_len = len(data) // record_dtype.itemsize
+        records = np.frombuffer(data, dtype=record_dtype, count=records_len)
+        is_valid = (records["magic"] == RESULTS_MAGIC) & (records["kind"] == RECORD_DATA)
+        records = records[is_valid & (records["test_id"] < len(tests))]
+
+        unreported = set(events) - set(perfStats.COUNTERS.values()) - UNREPORTED_EVENTS
+        if len(unreported) > 0:
+            UNREPORTED_EVENTS.update(unreported)
+            print(
+                f"[-]: Events {sorted(unreported)} are measured, but dropped from results, "
+                f"only {list(perfStats.COUNTERS.values())} are reported",
+                file=sys.stderr,
+            )
+
+        samples = np.zeros(len(records), dtype=perfStats.SAMPLE_DTYPE)
+        samples["test"] = records["test_id"]
+        for counter, event in perfStats.COUNTERS.items():
+            samples[counter] = records["values"][:, events.index(event)] if event in events else -1
+        samples["time_enabled"] = records["time_enabled"]
+        samples["time_running"] = records["time_running"]
+        samples["is_full"] = records["is_full"] != 0
+        samples["cpu"] = -1
+        samples["started"] = -1
+        samples["host"] = -1
+        return tests, samples
+
+    @staticmethod
+    def split_by_tests(stats: List[TestRes], default_name: str) -> Dict[str, List[TestRes]]:
+        """Group results of the launches of one binary by tests. A launch may give several records: a batch binary
+        runs several tests and each test may be run several iterations. If the launch was interrupted,
+        only its last record is partial
+
+        :param stats: Results of the launches
+        :param default_name: Test name for results without records
+        """
+        tests_stats: Dict[str, List[TestRes]] = {}
+        for res in stats:
+            if PerfParser.byte_order(res.output) is not None:
+                tests, samples = PerfParser.decode_samples(res.output)
+                samples["cpu"] = res.cpu
+                samples["started"] = res.started
+                samples["host"] = res.host
+                if len(samples) == 0:
+                    tests_stats.setdefault(default_name, []).append(
+                        TestRes(bytes(), res.is_full, res.cpu, started=res.started, host=res.host)
+                    )
+                for test_id in np.unique(samples["test"]).tolist():
+                    test_samples = samples[samples["test"] == test_id]
+                    is_full = bool(test_samples["is_full"].all())
+                    tests_stats.setdefault(tests[test_id], []).append(
+                        TestRes(bytes(), is_full, res.cpu, test_samples, res.started, res.host)
+                    )
+                continue
+
+            records = PerfParser.split_records(res.output)
+            if len(records) == 0:
+                tests_stats.setdefault(default_name, []).append(res)
+            for i, (name, record) in enumerate(records):
+                record_is_full = res.is_full or (i < len(records) - 1)
+                tests_stats.setdefault(name or default_name, []).append(
+                    TestRes(record, record_is_full, res.cpu, started=res.started, host=res.host)
+                )
+        return tests_stats
+
+    @staticmethod
+    def find_baseline(binaries: Iterable[Path], key_empty_test: str = EMPTY_TEST) -> Path | None:
+        """Find the binary of the empty test. The empty test is never batched with other tests, so its binary
+        is named after it in any batch mode, see BasePatcher.patch
+        """
+        return next((binary for binary in binaries if binary.name.split(".")[0] == key_empty_test), None)
+
+    @staticmethod
+    def to_samples(out_res: Dict[str, List[TestRes]]) -> RawSamples:
+        """Collect samples of all tests into one array, counters are scaled and derived as in PerfData
+
+        :return: Names of tests and the samples, the 'test' field of a sample is an index in names
+        """
+        names = list(out_res)
+        events = list(perfStats.COUNTERS.values()) + ["time_enabled", "time_running"]
+        arrays: List[np.ndarray] = []
+        arrays_tests: List[int] = []
+        rows: List[Tuple[Any, ...]] = []
+        for test_id, name in enumerate(names):
+            for res in out_res[name]:
+                if res.samples is not None:
+                    arrays.append(res.samples)
+                    arrays_tests.append(test_id)
+                    continue
+                counters = PerfParser.output_to_dict(res.output.decode())
+                values = [int(counters.get(event, -1)) for event in events]
+                rows.append((test_id, *values, res.is_full, res.cpu, res.started, res.host))
+        arrays.append(np.array(rows, dtype=perfStats.SAMPLE_DTYPE))
+        # joining bytes is much faster than concatenating a lot of small structured arrays
+        samples = np.frombuffer(bytearray(b"".join(arr.tobytes() for arr in arrays)), dtype=perfStats.SAMPLE_DTYPE)
+        # decoded samples are numbered by tests of their launch, they are renumbered at once
+        decoded_len = len(samples) - len(rows)
+        samples["test"][:decoded_len] = np.repeat(arrays_tests, [len(arr) for arr in arrays[:-1]])
+        perfStats.scale(samples)
+        perfStats.derive(samples)
+        return names, samples
+
+    @staticmethod
+    def merge_groups(groups_res: List[Dict[str, List[TestRes]]], reference: str) -> Dict[str, List[TestRes]]:
+        """Merge results of event groups measured by separate launches. The n-th launches of a test in every group
+        are merged into one result. Counters of a group are scaled by the ratio of the reference event
+        in the first group to the reference event in the group, so that they describe the same run
 
-        stats = stats.copy()
-        average = _get_meddian(stats)
-        full_stats: List[PerfData] = []
-        for stat in stats:
-            if stat.is_full:
-                full_stats.append(stat)
-        full_average = _get_meddian(full_stats)
-        if full_average is not None:
-            average = full_average
+        :param groups_res: Results of tests split by tests for every group
+        :param reference: Name of the harness event which is measured in every group
+        """
+        if len(groups_res) == 1:
+            return groups_res[0]
+        counters = {event: counter for counter, event in perfStats.COUNTERS.items()}
+        ref_counter = counters.get(reference)
 
-        return average
+        merged: Dict[str, List[TestRes]] = {}
+        for name, base_res in groups_res[0].items():
+            for launch, res in enumerate(base_res):
+                _, samples = PerfParser.to_samples({name: [res]})
+                for group_res in groups_res[1:]:
+                    if launch >= len(group_res.get(name, [])):
+                        continue
+                    _, group_samples = PerfParser.to_samples({name: [group_res[name][launch]]})
+                    length = min(len(samples), len(group_samples))
+                    samples, group_samples = samples[:length], group_samples[:length]
+                    ratio = np.ones(length)
+                    if ref_counter is not None:
+                        base_ref, group_ref = samples[ref_counter], group_samples[ref_counter]
+                        known = (base_ref > 0) & (group_ref > 0)
+                        ratio[known] = base_ref[known] / group_ref[known]
+                    for counter in perfStats.COUNTERS:
+                        values = group_samples[counter]
+                        mask = (samples[counter] == -1) & (values != -1)
+                        samples[counter][mask] = np.round(values[mask] * ratio[mask])
+                    samples["is_full"] &= group_samples["is_full"]
+                # counters are already scaled, so they aren't scaled again
+                samples["time_running"] = samples["time_enabled"]
+                is_full = bool(samples["is_full"].all()) if len(samples) > 0 else res.is_full
+                merged.setdefault(name, []).append(TestRes(bytes(), is_full, res.cpu, samples, res.started, res.host))
+        return merged
 
     @staticmethod
-    def correct(out_res: Dict[str, List[TestRes]], key_empty_test: str = "empty") -> Dict[str, DictSI]:
-        analyzed_buf = {
-            key: PerfParser.get_meddian(list(map(PerfParser.test_res_to_data, lst))) for key, lst in out_res.items()
+    def select_samples(samples: np.ndarray, tests_len: int, outlier_threshold: float | None = None) -> np.ndarray:
+        """Select samples used for estimates: full samples of a test if it has any, otherwise all of them.
+        Samples whose mispredict ratio deviates from the median by more than outlier_threshold
+        standard deviations, estimated by MAD, are rejected
+
+        :return: Mask of the used samples
+        """
+        groups = samples["test"]
+        has_full = np.bincount(groups[samples["is_full"]], minlength=tests_len) > 0
+        used = samples["is_full"] | ~has_full[groups]
+        if outlier_threshold is None:
+            return used
+
+        ratio = perfStats.missed_ratio(samples)
+        median = perfStats.group_quantile(groups[used], ratio[used], tests_len, 0.5)
+        mad = perfStats.group_mad(groups[used], ratio[used], tests_len)
+        deviation = np.abs(ratio - median[groups])
+        # samples equal to the median are never rejected, so a test keeps at least one sample
+        return used & (deviation <= outlier_threshold * perfStats.MAD_TO_STD * mad[groups])
+
+    @staticmethod
+    def describe(out_res: Dict[str, List[TestRes]], trim: float = 0.1) -> Dict[str, Dict[str, float]]:
+        """Statistics of the mispredict ratio of every test in percents"""
+        names, samples = PerfParser.to_samples(out_res)
+        if len(samples) == 0:
+            return {}
+        groups = samples["test"]
+        ratio = perfStats.missed_ratio(samples) * 100
+        stats = {
+            "median": perfStats.group_quantile(groups, ratio, len(names), 0.5),
+            "trimmed_mean": perfStats.group_trimmed_mean(groups, ratio, len(names), trim),
+            "mad": perfStats.group_mad(groups, ratio, len(names)),
+            "p5": perfStats.group_quantile(groups, ratio, len(names), 0.05),
+            "p95": perfStats.group_quantile(groups, ratio, len(names), 0.95),
         }
-        analyzed_average: Dict[str, PerfData] = {}
-        for key, val in analyzed_buf.items():
-            if val is not None:
-                analyzed_average[key] = val
+        return {name: {key: float(val[i]) for key, val in stats.items()} for i, name in enumerate(names)}
+
+    @staticmethod
+    def is_converged(stats: List[TestRes], default_name: str, tolerance: float, confidence: float = 0.95) -> bool:
+        """Check that for every test of the launches the confidence interval of the median mispredict ratio
+        is narrower than tolerance. Only full samples are taken into account
+
+        :param stats: Results of the launches of one binary
+        :param default_name: Test name for results without records
+        :param tolerance: Width of the interval in percents of mispredicted branches
+        """
+        names, samples = PerfParser.to_samples(PerfParser.split_by_tests(stats, default_name))
+        full = samples[samples["is_full"]]
+        width = perfStats.group_median_ci_width(
+            full["test"], perfStats.missed_ratio(full) * 100, len(names), confidence
+        )
+        return bool(np.all(width <= tolerance))
+
+    @staticmethod
+    def estimate(
+        samples: np.ndarray, tests_len: int, used: np.ndarray, statistic: str = "median", trim: float = 0.1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Estimate counters of every test by the used samples
+
+        :param statistic: 'median' selects the sample with the median mispredict ratio,
+            'trimmed_mean' averages every counter without trim fraction of extreme values
+        :return: Counters of tests in the order of perfStats.COUNTERS and indexes of the median samples
+        """
+        groups = samples["test"]
+        median_idx = perfStats.median_samples(groups, perfStats.missed_ratio(samples), tests_len, used)
+        counters = np.full((tests_len, len(perfStats.COUNTERS)), -1, dtype=np.int64)
+        present = median_idx != -1
+        for i, counter in enumerate(perfStats.COUNTERS):
+            if statistic == "trimmed_mean":
+                known = used & (samples[counter] != -1)
+                mean = perfStats.group_trimmed_mean(groups[known], samples[counter][known], tests_len, trim)
+                counters[:, i] = np.where(np.isnan(mean), -1, np.round(mean))
             else:
-                print(f"[-]: Error: can't get average result of '{key}' test", file=sys.stderr)
+                counters[present, i] = samples[counter][median_idx[present]]
+        return counters, median_idx
+
+    @staticmethod
+    def baseline_epochs(samples: np.ndarray, empty_id: int, used: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Split samples of the empty test into its re-measurements. Samples of one launch have the same host,
+        core and start time, e.g. tests of a batch binary or iterations of a test. Launches running the empty test
+        belong to one re-measurement if no other launch was run on the same core of the same host between them.
+        Samples with unknown time and unused samples don't belong to any
+
+        :return: Re-measurement of every sample, -1 for samples out of them, and the mean start time of each one
+        """
+        epochs = np.full(len(samples), -1)
+        if empty_id == -1 or "started" not in (samples.dtype.names or ()):
+            return epochs, np.zeros(0)
+        timed = np.flatnonzero(samples["started"] >= 0)
+        host = samples["host"] if "host" in (samples.dtype.names or ()) else np.full(len(samples), -1)
+        order = timed[np.lexsort((samples["started"][timed], samples["cpu"][timed], host[timed]))]
+        is_baseline = samples["test"][order] == empty_id
+        cpu, host, started = samples["cpu"][order], host[order], samples["started"][order]
+        same_core = (cpu[1:] == cpu[:-1]) & (host[1:] == host[:-1])
+        is_first = np.concatenate([[True], ~same_core | (started[1:] != started[:-1])])[: len(order)]
+        launches = np.cumsum(is_first) - 1
+        has_baseline = np.bincount(launches[is_baseline], minlength=np.count_nonzero(is_first)) > 0
+        # the first sample of every launch tells its core
+        first = np.flatnonzero(is_first)
+        launch_same_core = (cpu[first][1:] == cpu[first][:-1]) & (host[first][1:] == host[first][:-1])
+        after_baseline = np.concatenate([[False], has_baseline[:-1] & launch_same_core])
+        launch_epochs = np.cumsum(has_baseline & ~after_baseline) - 1
+        sorted_epochs = launch_epochs[launches]
+        epochs[order[is_baseline]] = sorted_epochs[is_baseline]
+        epochs[~used] = -1
+
+        # re-measurements without used samples are dropped
+        counts = np.bincount(epochs[epochs != -1], minlength=launch_epochs[-1] + 1 if len(order) > 0 else 0)
+        kept = counts > 0
+        renumbered = np.cumsum(kept) - 1
+        epochs[epochs != -1] = renumbered[epochs[epochs != -1]]
+        in_epoch = epochs != -1
+        times = np.bincount(epochs[in_epoch], weights=samples["started"][in_epoch]) / counts[kept]
+        return epochs, times
+
+    @staticmethod
+    def subtract_nearest_baseline(
+        samples: np.ndarray,
+        empty_id: int,
+        used: np.ndarray,
+        statistic: str = "median",
+        trim: float = 0.1,
+    ) -> np.ndarray:
+        """Subtract from every sample the estimate of the re-measurement of the empty test nearest to it in time,
+        so that drift of the machine during a long run is corrected. The empty test should have at least
+        two re-measurements, see PerfParser.baseline_epochs. Samples are corrected by re-measurements on their
+        own core if there are any, otherwise by ones on their own host, so that bias of a core is corrected too.
+        Samples with unknown time or of a host without re-measurements are corrected by the estimate
+        of all used samples of the empty test
+
+        :return: Corrected copy of the samples
+        """
+        epochs, times = PerfParser.baseline_epochs(samples, empty_id, used)
+        in_epoch = epochs != -1
+        is_baseline = used & (samples["test"] == empty_id)
+        # samples of every re-measurement are estimated as a separate test, all of them as the last one
+        baseline = np.concatenate([samples[in_epoch], samples[is_baseline]])
+        baseline["test"] = np.concatenate([epochs[in_epoch], np.full(np.count_nonzero(is_baseline), len(times))])
+        estimates, _ = PerfParser.estimate(
+            baseline, len(times) + 1, np.ones(len(baseline), dtype=bool), statistic, trim
+        )
+
+        corrected = np.array(samples)
+        has_host = "host" in (samples.dtype.names or ())
+        hosts = corrected["host"] if has_host else np.full(len(samples), -1)
+        cpus = corrected["cpu"]
+        # samples of a re-measurement are launched on one core
+        epochs_host = np.zeros(len(times), dtype=hosts.dtype)
+        epochs_host[epochs[in_epoch]] = hosts[in_epoch]
+        epochs_cpu = np.zeros(len(times), dtype=cpus.dtype)
+        epochs_cpu[epochs[in_epoch]] = cpus[in_epoch]
+        started = corrected["started"]
+        nearest = np.full(len(samples), len(times))
+        for host, cpu in np.unique(np.stack([hosts, cpus], axis=1), axis=0).tolist():
+            selected = (hosts == host) & (cpus == cpu) & (started >= 0)
+            core_epochs = np.flatnonzero((epochs_host == host) & (epochs_cpu == cpu))
+            if len(core_epochs) == 0:
+                core_epochs = np.flatnonzero(epochs_host == host)
+            if len(core_epochs) == 0 or not np.any(selected):
+                continue
+            time_order = core_epochs[np.argsort(times[core_epochs])]
+            sorted_times = times[time_order]
+            host_started = started[selected]
+            after = np.searchsorted(sorted_times, host_started).clip(0, len(sorted_times) - 1)
+            before = (after - 1).clip(0)
+            is_before = host_started - sorted_times[before] <= sorted_times[after] - host_started
+            nearest[selected] = time_order[np.where(is_before, before, after)]
+        for i, counter in enumerate(perfStats.COUNTERS):
+            values = corrected[counter]
+            known = values != -1
+            values[known] -= np.maximum(estimates[nearest[known], i], 0)
+        return corrected
+
+    @staticmethod
+    def correct(
+        out_res: Dict[str, List[TestRes]],
+        key_empty_test: str = EMPTY_TEST,
+        statistic: str = "median",
+        trim: float = 0.1,
+        outlier_threshold: float | None = None,
+    ) -> Dict[str, DictSI]:
+        """Estimate counters of every test and subtract the estimate of the empty test from them. If the empty test
+        was re-measured during the run, every sample is corrected by the nearest re-measurement before estimating,
+        see PerfParser.subtract_nearest_baseline
+
+        :param out_res: Samples of tests
+        :param key_empty_test: Name of the test measuring the harness overhead
+        :param statistic: 'median' or 'trimmed_mean', see PerfParser.estimate
+        :param trim: Fraction of the lowest and of the highest values dropped by the trimmed mean
+        :param outlier_threshold: Samples further from the median are rejected, see PerfParser.select_samples
+        """
+        names, samples = PerfParser.to_samples(out_res)
+        return PerfParser.correct_samples(names, samples, key_empty_test, statistic, trim, outlier_threshold)
+
+    @staticmethod
+    def correct_samples(
+        names: List[str],
+        samples: np.ndarray,
+        key_empty_test: str = EMPTY_TEST,
+        statistic: str = "median",
+        trim: float = 0.1,
+        outlier_threshold: float | None = None,
+    ) -> Dict[str, DictSI]:
+        """The same as PerfParser.correct, but for samples already collected by PerfParser.to_samples,
+        e.g. loaded from the raw samples store. Samples are not modified, so they may be read-only
+        """
+        used = PerfParser.select_samples(samples, len(names), outlier_threshold)
+        empty_id = names.index(key_empty_test) if key_empty_test in names else -1
+        is_remeasured = len(PerfParser.baseline_epochs(samples, empty_id, used)[1]) > 1
+        if is_remeasured:
+            samples = PerfParser.subtract_nearest_baseline(samples, empty_id, used, statistic, trim)
+        counters, median_idx = PerfParser.estimate(samples, len(names), used, statistic, trim)
+
+        for name, idx in zip(names, median_idx):
+            if idx == -1:
+                print(f"[-]: Error: can't get average result of '{name}' test", file=sys.stderr)
+        has_empty = empty_id != -1 and median_idx[empty_id] != -1
+        if has_empty and not is_remeasured:
+            counters = counters - np.maximum(counters[empty_id], 0)
+        elif not has_empty:
+            print(
+                f"[-]: Error: there is no result of '{key_empty_test}' test, results aren't corrected", file=sys.stderr
+            )
 
-        analyzed_average[key_empty_test].max(0)
         corrected: Dict[str, DictSI] = {}
-        for key in analyzed_average:
-            if key != key_empty_test:
-                analyzed_average[key] = analyzed_average[key] - analyzed_average[key_empty_test]
-                corrected.update({key: analyzed_average[key].to_dict()})
+        for test_id, name in enumerate(names):
+            idx = median_idx[test_id]
+            if name == key_empty_test or idx == -1:
+                continue
+            host = int(samples["host"][idx]) if "host" in (samples.dtype.names or ()) else -1
+            data = PerfData(is_full=bool(samples["is_full"][idx]), cpu=int(samples["cpu"][idx]), host=host)
+            for counter, value in zip(perfStats.COUNTERS, counters[test_id].tolist()):
+                setattr(data, counter, value)
+            corrected[name] = data.to_dict()
         return corrected
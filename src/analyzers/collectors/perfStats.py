@@ -0,0 +1,126 @@
+import statistics
+from typing import Tuple
+
+import numpy as np
+
+# counters of a sample mapped to names of the harness events
+COUNTERS = {
+    "branches": "branches",
+    "missed_branches": "missed_branches",
+    "predicted_branches": "predicted_branches",
+    "cache_bpu": "cache_BPU",
+    "ticks": "cpu_clock",
+    "instructions": "instructions",
+}
+
+SAMPLE_DTYPE = np.dtype(
+    [("test", "i4")]
+    + [(counter, "i8") for counter in COUNTERS]
+    + [
+        ("time_enabled", "i8"),
+        ("time_running", "i8"),
+        ("is_full", "?"),
+        ("cpu", "i4"),
+        ("started", "f8"),
+        ("host", "i4"),
+    ]
+)
+
+# scale of MAD to estimate the standard deviation of normally distributed values
+MAD_TO_STD = 1.4826
+
+
+def scale(samples: np.ndarray) -> None:
+    """Extrapolate counters of multiplexed groups to the whole enabled time, the same way as PerfData.scale"""
+    enabled, running = samples["time_enabled"], samples["time_running"]
+    multiplexed = (enabled > 0) & (running != -1) & (running != enabled)
+    for counter in COUNTERS:
+        values = samples[counter]
+        known = multiplexed & (values != -1)
+        never_run = known & (running == 0)
+        scaled = known & (running > 0)
+        values[scaled] = np.round(values[scaled] * enabled[scaled] / running[scaled])
+        values[never_run] = -1
+
+
+def derive(samples: np.ndarray) -> None:
+    """Fill unknown branch counters from the other two, the same way as PerfData"""
+    branches, missed, predicted = samples["branches"], samples["missed_branches"], samples["predicted_branches"]
+    mask = (branches == -1) & (missed != -1) & (predicted != -1)
+    branches[mask] = missed[mask] + predicted[mask]
+    mask = (predicted == -1) & (branches != -1) & (missed != -1)
+    predicted[mask] = branches[mask] - missed[mask]
+    mask = (missed == -1) & (branches != -1) & (predicted != -1)
+    missed[mask] = branches[mask] - predicted[mask]
+
+
+def missed_ratio(samples: np.ndarray) -> np.ndarray:
+    branches = samples["branches"]
+    return samples["missed_branches"] / np.where(branches > 0, branches, 1)
+
+
+def group_order(groups: np.ndarray, values: np.ndarray, groups_len: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sort values by groups, then by value
+
+    :return: Indexes of the sorted values, start of each group in them and size of each group
+    """
+    order = np.lexsort((values, groups))
+    counts = np.bincount(groups, minlength=groups_len)
+    starts = np.cumsum(counts) - counts
+    return order, starts, counts
+
+
+def group_quantile(groups: np.ndarray, values: np.ndarray, groups_len: int, q: float) -> np.ndarray:
+    """Quantile of values of each group with linear interpolation, NaN for empty groups"""
+    order, starts, counts = group_order(groups, values, groups_len)
+    result = np.full(groups_len, np.nan)
+    present = counts > 0
+    sorted_values = values[order].astype(float)
+    pos = starts[present] + (counts[present] - 1) * q
+    lower, upper = np.floor(pos).astype(int), np.ceil(pos).astype(int)
+    result[present] = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+    return result
+
+
+def group_mad(groups: np.ndarray, values: np.ndarray, groups_len: int) -> np.ndarray:
+    """Median absolute deviation of values of each group"""
+    median = group_quantile(groups, values, groups_len, 0.5)
+    return group_quantile(groups, np.abs(values - median[groups]), groups_len, 0.5)
+
+
+def group_trimmed_mean(groups: np.ndarray, values: np.ndarray, groups_len: int, trim: float) -> np.ndarray:
+    """Mean of values of each group without trim fraction of the lowest and of the highest values"""
+    order, starts, counts = group_order(groups, values, groups_len)
+    sorted_groups = groups[order]
+    rank = np.arange(len(order)) - starts[sorted_groups]
+    cut = np.floor(counts * trim).astype(int)[sorted_groups]
+    kept = (rank >= cut) & (rank < counts[sorted_groups] - cut)
+    sums = np.bincount(sorted_groups[kept], weights=values[order][kept], minlength=groups_len)
+    kept_counts = np.bincount(sorted_groups[kept], minlength=groups_len)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(kept_counts > 0, sums / kept_counts, np.nan)
+
+
+def group_median_ci_width(groups: np.ndarray, values: np.ndarray, groups_len: int, confidence: float) -> np.ndarray:
+    """Width of the distribution-free confidence interval of the median of each group, bounded by order statistics.
+    NaN if a group has too few values for the confidence
+    """
+    order, starts, counts = group_order(groups, values, groups_len)
+    spread = statistics.NormalDist().inv_cdf((1 + confidence) / 2) * np.sqrt(counts)
+    lower = np.floor((counts - spread) / 2).astype(int)
+    upper = np.ceil((counts + spread) / 2).astype(int) - 1
+    result = np.full(groups_len, np.nan)
+    valid = (counts > 0) & (lower >= 0) & (upper < counts)
+    sorted_values = values[order]
+    result[valid] = sorted_values[starts[valid] + upper[valid]] - sorted_values[starts[valid] + lower[valid]]
+    return result
+
+
+def median_samples(groups: np.ndarray, values: np.ndarray, groups_len: int, used: np.ndarray) -> np.ndarray:
+    """Select the used sample of each group which has the median value, -1 for groups without used samples"""
+    used_idx = np.flatnonzero(used)
+    order, starts, counts = group_order(groups[used_idx], values[used_idx], groups_len)
+    result = np.full(groups_len, -1)
+    present = counts > 0
+    result[present] = used_idx[order[starts[present] + counts[present] // 2]]
+    return result
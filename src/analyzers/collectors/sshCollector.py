@@ -1,17 +1,50 @@
 from __future__ import annotations
-from queue import Queue
+from collections import deque
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Empty, Queue
 import logging
 import random
+import re
+import shlex
+import signal
 import stat
+import subprocess
+import tarfile
+import tempfile
 from pathlib import Path
+from pprint import pformat
 import sys
 import time
-from typing import Dict, List, Any
+from typing import Callable, Deque, Dict, Iterator, List, Any, Tuple
 
 import paramiko
 
-from src.analyzers.collectors.perfParser import PerfParser, TestRes
-from src.helpers.backGroundBuilder import CSignal
+from src.analyzers.collectors.perfEvents import EVENTS_FILE_ENV, PerfEvent, encode_events, parse_events
+from src.analyzers.collectors.perfGroups import CounterBudget, split_groups
+from src.analyzers.collectors.perfParser import TEXT_OUTPUT_ENV, PerfParser, TestRes
+from src.helpers.backGroundBuilder import CSignal, ChanSignal
+from src.helpers.capabilities import CapabilitySetter
+from src.helpers.corePool import parse_cpu_list
+from src.helpers.launcher import Launcher, build_launcher
+from src.helpers.supervisor import ProcessResult
+from src.protocols.collector import DictSI, RawSamples
+
+# exit code of the harness interrupted by SIGINT
+EXIT_SIGNAL = 2
+# binaries uploaded by previous sessions, it persists at the host between them and is private to the user
+DEFAULT_REMOTE_CACHE = "~/.cache/chapy/remote"
+DEFAULT_REMOTE_CACHE_SIZE_MB = 256
+# archive formats mapped to the tar flag unpacking them
+ARCHIVE_FLAGS = {"gz": "z", "xz": "J"}
+
+
+def executable(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    """Make an archived binary executable by everyone and owned by the unpacking user"""
+    info.mode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    return info
 
 
 class SshCollector:
@@ -23,11 +56,56 @@ class SshCollector:
 
         self.max_test_launches = settings.get("max_test_launches", -1)
         self.cpu = settings.get("cpu", 0)
+        self.batch_size = settings.get("batch_size", 1)
+        self.iterations = settings.get("iterations", 1)
+        self.warmup_iterations = settings.get("warmup_iterations", 0)
+        # launches stop early once the median is estimated precisely enough
+        self.ci_tolerance: float | None = settings.get("ci_tolerance")
+        self.ci_confidence = settings.get("ci_confidence", 0.95)
+        self.min_test_launches = settings.get("min_test_launches", 3)
+        self.statistic = settings.get("statistic", "median")
+        self.trim = settings.get("trim", 0.1)
+        self.outlier_threshold: float | None = settings.get("outlier_threshold")
+        self.raw_samples: RawSamples | None = None
+        self.text_output = settings.get("text_output", False)
+        # events given as a list are passed to the harness at runtime, the target is assumed to be little-endian
+        events = settings.get("events")
+        self.events: List[PerfEvent] | None = parse_events(events) if isinstance(events, list) else None
+        # events which don't fit into PMU counters are split into groups measured by separate launches
+        self.counter_budget = CounterBudget(settings)
+        self.reference_event = settings.get("reference_event", "instructions")
+        # variables added to the environment of launches of each event group
+        self.groups_env: List[Dict[str, str]] | None = None
+        # tests are launched by an agent uploaded once per session, which streams results over one channel
+        self.use_agent = settings.get("agent", True)
+        self.agent: Launcher | None = None
+        self.agent_channel: paramiko.Channel | None = None
+        # binaries uploaded over a separate channel while others are launched, 0 uploads them only between launches
+        self.upload_ahead = settings.get("upload_ahead", 8)
+        # cores of the host measured by its sessions, commands processing uploads are run on other cores
+        self.measured_cpus = parse_cpu_list(settings.get("cpus", self.cpu))
+        self.upload_affinity: List[str] | None = None
+        # binaries are sent by one archive per batch and kept at the host by their content hashes
+        self.bulk_upload = settings.get("bulk_upload", True)
+        self.remote_cache: str | None = settings.get("remote_cache", DEFAULT_REMOTE_CACHE)
+        self.remote_cache_size = int(settings.get("remote_cache_size", DEFAULT_REMOTE_CACHE_SIZE_MB)) * 1024 * 1024
+        self.archive_format = settings.get("archive_format", "gz")
+        if self.archive_format not in ARCHIVE_FLAGS:
+            raise Exception(f"Unknown archive format '{self.archive_format}', expected one of {list(ARCHIVE_FLAGS)}")
+        self.strip = settings.get("strip", False)
+        # strip of the same toolchain, e.g. aarch64-linux-gnu-gcc-9 -> aarch64-linux-gnu-strip
+        default_strip = re.sub(r"(gcc|cc|clang)(-[\d.]+)?$", "strip", str(settings.get("compiler", "gcc")))
+        self.strip_tool: str = settings.get("strip_tool", default_strip)
 
         self.host = settings.get("host", "127.0.0.1")
+        self.port = settings.get("port", 22)
+        # index of the host in the 'hosts' setting, it is recorded in results
+        self.host_id = settings.get("host_id", -1)
         self.user = settings.get("username", "root")
         self.path_to_key = settings.get("path_to_key", "~/.ssh/id_rsa")
         self.password = settings.get("password", "toor")
+        # sudo can't ask for a password over ssh, so it fails instead
+        self.capability_setter = CapabilitySetter(settings, self.run_upload_command, self.host, ["sudo", "-n"])
 
         self.open()
 
@@ -43,20 +121,57 @@ class SshCollector:
     def open(self):
         client = paramiko.SSHClient()
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(hostname=self.host, username=self.user, key_filename=self.path_to_key, password=self.password)
+        client.connect(
+            hostname=self.host,
+            port=self.port,
+            username=self.user,
+            key_filename=self.path_to_key,
+            password=self.password,
+        )
 
         transport = client.get_transport()
         if transport is None:
             raise Exception("Can't get transport for ssh")
 
         sftp = paramiko.SFTPClient.from_transport(transport)
-        if sftp is None:
+        upload_sftp = paramiko.SFTPClient.from_transport(transport)
+        if sftp is None or upload_sftp is None:
             raise Exception("Can't open sftp session")
 
         self.transport = transport
         self.sftp = sftp
+        # binaries are uploaded in the background, so they have their own sftp session
+        self.upload_sftp = upload_sftp
         self.client = client
 
+    def is_active(self) -> bool:
+        try:
+            return self.transport.is_active()
+        except AttributeError:
+            return False
+
+    def is_dropped(self, err: Exception) -> bool:
+        """Check whether the error is caused by the dropped connection. The transport notices the drop
+        in its own thread, so a write may fail while the session is still active
+        """
+        return not self.is_active() or isinstance(err, (EOFError, ConnectionError, paramiko.SSHException))
+
+    def reconnect(self) -> None:
+        """Open a new session after the host dropped, the temp directory, the agent and event groups
+        are set up again
+        """
+        self.stop_agent(is_dropped=True)
+        self.close(del_tmp_dir=False)
+        self.open()
+        try:
+            self.sftp.mkdir(str(self.bin_dir))
+        except IOError:
+            # the directory survived the drop
+            pass
+        self.groups_env = None
+        if self.use_agent:
+            self.start_agent()
+
     def delete_tmp_dir(self):
         try:
             if self.is_tmp_created:
@@ -81,6 +196,7 @@ class SshCollector:
 
         try:
             self.sftp.close()
+            self.upload_sftp.close()
         except AttributeError:
             pass
 
@@ -103,14 +219,19 @@ class SshCollector:
     def tab_lines(self, lines: str):
         return "\t" + lines.replace("\n", "\n\t")[:-1]
 
-    def execute_test(self, execute_line: List[str], timeout: float) -> TestRes:
+    def execute_test(self, execute_line: List[str], timeout: float, env: Dict[str, str] | None = None) -> TestRes:
         execute_str = " ".join(execute_line)
 
         # TODO: sometime timeout don't work and programm hangs. It often happens with a small timeout
         if timeout < 0.1:
-            return (bytes(), False)
-        chan = self.execute_command(f"timeout --preserve-status -s SIGINT {timeout}s {execute_str}")
-
+            return TestRes(bytes(), False, host=self.host_id)
+        env = {**(env or {}), TEXT_OUTPUT_ENV: "1"} if self.text_output else env or {}
+        env_prefix = "".join(f"{key}={value} " for key, value in env.items())
+        started = time.monotonic()
+        chan = self.execute_command(f"{env_prefix}timeout --preserve-status -s SIGINT {timeout}s {execute_str}")
+
+        # output is read before the exit status, otherwise a large output of a batch may block the test
+        output = chan.makefile("rb").read()
         is_full = True
         ret_code = chan.recv_exit_status()
         if ret_code == 2:
@@ -127,63 +248,489 @@ class SshCollector:
                 "[?]: Maybe perf don't have enough capabilities or your CPU don't have special debug counters\n",
                 file=sys.stderr,
             )
-        return (chan.recv(1024), is_full)
+        return TestRes(output, is_full, started=started, host=self.host_id)
+
+    def to_test_res(self, execute_line: List[str], proc: ProcessResult, started: float = -1) -> TestRes:
+        """Convert a launch of the agent the same way as execute_test converts a launch over ssh
+
+        :param started: Monotonic time of this machine when the launch started
+        """
+        returncode = proc.returncode
+        if not proc.is_full and returncode in [EXIT_SIGNAL, -signal.SIGINT]:
+            returncode = 0
+        test_errors = proc.stderr.decode()
+        if (len(test_errors) > 0) and (not test_errors.isspace()):
+            print(f"[-]: Some error occurred during launching '{' '.join(execute_line)}':", file=sys.stderr)
+            print(self.tab_lines(test_errors), file=sys.stderr, end="")
+        if returncode != 0:
+            print(
+                "[?]: Maybe perf don't have enough capabilities or your CPU don't have special debug counters\n",
+                file=sys.stderr,
+            )
+        return TestRes(proc.stdout, proc.is_full, self.cpu, started=started, host=self.host_id)
+
+    def start_agent(self) -> None:
+        """Build the agent by the compiler of tests and start it at the host. If it can't be built,
+        tests are launched over separate ssh channels
+        """
+        with tempfile.TemporaryDirectory(prefix="chapy-") as build_dir:
+            try:
+                agent_path = build_launcher(self.settings, Path(build_dir))
+            except subprocess.CalledProcessError as err:
+                print("[-]: Can't build the agent, tests are launched one by one:", file=sys.stderr)
+                print(self.tab_lines(err.stderr.decode()), file=sys.stderr, end="")
+                return
+            host_path = self.bin_dir.joinpath(agent_path.name)
+            self.send_binary(agent_path, host_path)
+
+        chan = self.execute_command(f"{host_path} {self.cpu}")
+        # the target is assumed to be little-endian
+        self.agent = Launcher(self.settings, chan.makefile_stdin("wb"), chan.makefile("rb"), f"at {self.host}", "<")
+        self.agent_channel = chan
+
+    def stop_agent(self, is_dropped: bool = False) -> None:
+        """
+        :param is_dropped: The session is dropped, so the agent is forgotten without waiting for it
+        """
+        if self.agent is None or self.agent_channel is None:
+            return
+        if is_dropped:
+            self.agent, self.agent_channel = None, None
+            return
+        self.agent.close()
+        self.agent_channel.recv_exit_status()
+        agent_errors = self.agent_channel.makefile_stderr().read().decode()
+        if len(agent_errors) > 0:
+            self.logger.info(f"Agent at {self.host} reported:\n{self.tab_lines(agent_errors)}")
+        self.agent_channel.close()
+        self.agent, self.agent_channel = None, None
+
+    def get_groups_stats_by_agent(
+        self, binaries: List[Path], groups_env: List[Dict[str, str]]
+    ) -> List[List[List[TestRes]]]:
+        """The same as get_groups_stat for every binary, but launches are requested from the agent at once,
+        so a binary needs a round trip instead of a channel per launch. With adaptive stopping, min_test_launches
+        steps are requested at first, then steps are requested one by one till convergence
+        """
+        agent = self.agent
+        if agent is None:
+            raise Exception("Agent isn't started")
+        if self.text_output:
+            groups_env = [{**env, TEXT_OUTPUT_ENV: "1"} for env in groups_env]
+        execute_lines = {
+            binary: list(map(str, [binary, self.cpu, self.iterations, self.warmup_iterations])) for binary in binaries
+        }
+        # timeout is given for one test, but binary may run a batch of them
+        left_time = dict.fromkeys(binaries, self.settings["timeout"] * self.batch_size)
+        left_launches = dict.fromkeys(binaries, self.max_test_launches)
+        groups_stats: Dict[Path, List[List[TestRes]]] = {binary: [[] for _ in groups_env] for binary in binaries}
+
+        first_launches = self.max_test_launches
+        if self.ci_tolerance is not None and self.max_test_launches != 0:
+            first_launches = max(self.min_test_launches, 1)
+            if self.max_test_launches > 0:
+                first_launches = min(first_launches, self.max_test_launches)
+        for binary in binaries:
+            self.logger.info(f"[sshProfiler]: Executing: {' '.join(execute_lines[binary])}")
+            agent.send(execute_lines[binary], left_time[binary], groups_env, first_launches)
+
+        # results come in the order of requests, a binary which needs more launches is requested again
+        requested = deque(binaries)
+        while len(requested) > 0:
+            binary = requested.popleft()
+            procs = agent.receive()
+            # launches of a request are received at once, so their start is restored from their durations
+            started = time.monotonic() - sum(proc.wall_time for proc in procs)
+            for i, proc in enumerate(procs):
+                groups_stats[binary][i % len(groups_env)].append(self.to_test_res(execute_lines[binary], proc, started))
+                started += proc.wall_time
+            left_time[binary] -= sum(proc.wall_time for proc in procs)
+            if left_launches[binary] != -1:
+                left_launches[binary] = max(left_launches[binary] - len(procs) // len(groups_env), 0)
+
+            stats = groups_stats[binary][0]
+            if self.ci_tolerance is None or len(procs) == 0 or left_time[binary] <= 0 or left_launches[binary] == 0:
+                continue
+            if self.is_converged(stats, binary):
+                self.logger.info(f"Results of {binary.name} converged after {len(stats)} launches")
+                continue
+            agent.send(execute_lines[binary], left_time[binary], groups_env, 1)
+            requested.append(binary)
+        return [groups_stats[binary] for binary in binaries]
 
     def get_stat(self, binary: Path, number_executes: int, cpu_core: int) -> List[TestRes]:
-        stats: List[TestRes] = []
-        execute_line = list(map(str, [binary, cpu_core]))
+        return self.get_groups_stat(binary, number_executes, cpu_core, [{}])[0]
+
+    def get_groups_stat(
+        self, binary: Path, number_executes: int, cpu_core: int, groups_env: List[Dict[str, str]]
+    ) -> List[List[TestRes]]:
+        """The same as PerfCollector.get_groups_stat"""
+        groups_stats: List[List[TestRes]] = [[] for _ in groups_env]
+        stats = groups_stats[0]
+        execute_line = list(map(str, [binary, cpu_core, self.iterations, self.warmup_iterations]))
         execute_string = " ".join(map(str, execute_line))
         self.logger.info(f"[sshProfiler]: Executing: {execute_string}")
 
-        left_time = self.settings["timeout"]
-        timeout = time.time() + self.settings["timeout"]
+        # timeout is given for one test, but binary may run a batch of them
+        left_time = self.settings["timeout"] * self.batch_size
+        timeout = time.time() + left_time
         while (left_time > 0) and (number_executes != 0):
-            stats.append(self.execute_test(execute_line, left_time))
-            left_time = timeout - time.time()
+            for group_stats, env in zip(groups_stats, groups_env):
+                group_stats.append(self.execute_test(execute_line, left_time, env)._replace(cpu=cpu_core))
+                left_time = timeout - time.time()
             number_executes -= 1
-        return stats
-
-    def update_capabilities(self, target_file: Path):
-        # use_sudo = False
-        suc_launch = False
-        used_max_perm = False
-
-        execute_line = ["setcap", "-q", "cap_sys_admin,cap_sys_nice=ep", str(target_file)]
-        while (not suc_launch) and (not used_max_perm):
-            # TODO: need think how to check that sudo on server is waiting for password or not.
-            # if use_sudo:
-            #     execute_line = ["sudo"] + execute_line
-            used_max_perm = True
-
-            chan = self.execute_command(" ".join(execute_line))
-            returncode = chan.recv_exit_status()
-            if returncode == 0:
-                suc_launch = True
+            if self.is_converged(stats, binary):
+                self.logger.info(f"Results of {binary.name} converged after {len(stats)} launches")
+                break
+        return groups_stats
+
+    def correct(self, analyzed: Dict[str, List[TestRes]]) -> Dict[str, DictSI]:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Mispredict ratio of tests:\n{pformat(PerfParser.describe(analyzed, self.trim))}")
+        self.raw_samples = PerfParser.to_samples(analyzed)
+        return PerfParser.correct_samples(
+            *self.raw_samples, statistic=self.statistic, trim=self.trim, outlier_threshold=self.outlier_threshold
+        )
+
+    def is_converged(self, stats: List[TestRes], binary: Path) -> bool:
+        if self.ci_tolerance is None or len(stats) < self.min_test_launches:
+            return False
+        return PerfParser.is_converged(stats, binary.name.split(".")[0], self.ci_tolerance, self.ci_confidence)
+
+    def run_command(self, execute_line: List[str]) -> Tuple[int, bytes, bytes]:
+        chan = self.execute_command(" ".join(map(shlex.quote, execute_line)))
+        stdout = chan.makefile("rb").read()
+        returncode = chan.recv_exit_status()
+        return returncode, stdout, chan.makefile_stderr().read()
+
+    def get_upload_affinity(self) -> List[str]:
+        """Find the taskset prefix running commands on the cores of the host which aren't measured. It is found
+        once, because the cores of the host don't change between sessions
+
+        :return: The prefix or nothing if every core is measured or taskset isn't available at the host
+        """
+        if self.upload_affinity is not None:
+            return self.upload_affinity
+        self.upload_affinity = []
+        returncode, stdout, _ = self.run_command(["cat", "/sys/devices/system/cpu/online"])
+        online = parse_cpu_list(stdout.decode().strip()) if returncode == 0 else []
+        free_cpus = [cpu for cpu in online if cpu not in self.measured_cpus]
+        if len(free_cpus) == 0:
+            print(f"[-]: There are no free cores at {self.host}, uploads may disturb measurements", file=sys.stderr)
+            return self.upload_affinity
+        affinity = ["taskset", "-c", ",".join(map(str, free_cpus))]
+        returncode, _, stderr = self.run_command(affinity + ["true"])
+        if returncode != 0:
+            print(
+                f"[-]: Can't run uploads on free cores of {self.host}, they may disturb measurements:", file=sys.stderr
+            )
+            print(self.tab_lines(stderr.decode()), file=sys.stderr, end="")
+            return self.upload_affinity
+        self.upload_affinity = affinity
+        return self.upload_affinity
+
+    def run_upload_command(self, execute_line: List[str]) -> Tuple[int, bytes, bytes]:
+        """Run a command processing uploads, e.g. unpacking or setcap, on the cores which aren't measured,
+        so that it doesn't disturb launches running at the same time
+        """
+        return self.run_command(self.get_upload_affinity() + execute_line)
+
+    def update_capabilities(self, target_files: List[Path]):
+        self.capability_setter.setcap(list(map(str, target_files)))
+
+    def send_binary(self, loc_path: Path, host_path: Path, sftp: paramiko.SFTPClient | None = None):
+        """
+        :param sftp: Session used for the upload, by default the main one
+        """
+        sftp = sftp or self.sftp
+        sftp.put(str(loc_path), str(host_path))
+        sftp.chmod(str(host_path), stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH | stat.S_IXOTH)
+
+    def send_events(self, events: List[PerfEvent], host_path: Path) -> None:
+        # the target is assumed to be little-endian
+        with self.sftp.open(str(host_path), "wb") as events_file:
+            events_file.write(encode_events(events, "little"))
+
+    def send_events_groups(self, host_binary: Path) -> List[Dict[str, str]]:
+        """Split events into groups fitting into counters of the host and upload a descriptor for each group
+
+        :param host_binary: Test used to probe counters of the host
+        """
+        if self.events is None:
+            return [{}]
+        probe_file = self.bin_dir.joinpath("probe.events")
+        env = {EVENTS_FILE_ENV: str(probe_file)}
+
+        def probe(descriptor: bytes) -> bytes:
+            with self.sftp.open(str(probe_file), "wb") as events_file:
+                events_file.write(descriptor)
+            if self.agent is not None:
+                return self.agent.run([host_binary, self.cpu, 1, 0], self.settings["timeout"], env).stdout
+            chan = self.execute_command(f"{EVENTS_FILE_ENV}={probe_file} {host_binary} {self.cpu} 1 0")
+            output = chan.makefile("rb").read()
+            chan.recv_exit_status()
+            return output
+
+        groups = split_groups(self.events, self.counter_budget.get(self.host, probe), self.reference_event)
+        if len(groups) > 1:
+            self.logger.info(f"Events are split into groups: {[[event.name for event in group] for group in groups]}")
+        groups_env: List[Dict[str, str]] = []
+        for i, group in enumerate(groups):
+            host_path = self.bin_dir.joinpath(f"group_{i}.events")
+            self.send_events(group, host_path)
+            groups_env.append({EVENTS_FILE_ENV: str(host_path)})
+        return groups_env
+
+    def collect(self, build_channel: Queue[ChanSignal]) -> Dict[str, Dict]:
+        if self.use_agent:
+            self.start_agent()
+        try:
+            analyzed = self.collect_built(build_channel)
+        finally:
+            self.stop_agent()
+        return self.correct(analyzed)
+
+    def collect_built(self, build_channel: Queue[ChanSignal]) -> Dict[str, List[TestRes]]:
+        """Measure binaries sent by the builder until it ends
+
+        :return: Results of tests with merged event groups
+        """
+        is_end = False
+
+        def take(block: bool, limit: int) -> List[Path] | None:
+            nonlocal is_end
+            if is_end:
+                return None
+            signs = [build_channel.get()] if block else []
+            # binaries built by now are handled together, so they get capabilities by one setcap call
+            try:
+                while len(signs) < limit:
+                    signs.append(build_channel.get_nowait())
+            except Empty:
+                pass
+
+            built: List[Path] = []
+            for sign in signs:
+                match sign:
+                    case CSignal.End():
+                        is_end = True
+                    case CSignal.BuiltFile(binary):
+                        built.append(binary)
+                    case CSignal.BuildFailed(src_file, error):
+                        print(f"[-]: Can't build '{src_file.name}', it will be skipped:", file=sys.stderr)
+                        print(self.tab_lines(error), file=sys.stderr, end="")
+                    case _:
+                        raise Exception(f"Get unexpected channel signal {sign}")
+            return None if is_end and len(built) == 0 else built
+
+        groups_analyzed: List[Dict[str, List[TestRes]]] = []
+        for _, batch_analyzed in self.measure_pipelined(take, deque()):
+            self.extend_groups(groups_analyzed, batch_analyzed)
+        return PerfParser.merge_groups(groups_analyzed, self.reference_event) if groups_analyzed else {}
+
+    def measure_pipelined(
+        self, take: Callable[[bool, int], List[Path] | None], unmeasured: Deque[List[Path]]
+    ) -> Iterator[Tuple[List[Path], List[Dict[str, List[TestRes]]]]]:
+        """Measure batches of binaries till there are no more of them. Up to upload_ahead binaries after
+        the current batch are taken without waiting and uploaded with their capabilities set in the background
+        while the current batch is launched, so the transfer time is hidden. A batch is launched only after
+        its upload, and launches are never overlapped
+
+        :param take: Takes the next batch of at most the given number of binaries, it waits for one if the flag
+            is set, otherwise it may return an empty batch. None means there are no more binaries
+        :param unmeasured: Taken batches which aren't measured yet, they are left there if measurement fails
+        :return: Measured batches with results of their tests of every event group in the order of take
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"upload-{self.host}") as uploader:
+            uploads: Deque[Future[List[Path]]] = deque()
+            is_taken = False
+            while True:
+                # binaries of batches after the one launched next
+                ahead = sum(len(batch) for batch in list(unmeasured)[1:])
+                while not is_taken and (len(unmeasured) == 0 or ahead < self.upload_ahead):
+                    batch = take(len(unmeasured) == 0, max(self.upload_ahead - ahead, 1))
+                    if batch is None:
+                        is_taken = True
+                    elif len(batch) > 0:
+                        if len(unmeasured) > 0:
+                            ahead += len(batch)
+                        unmeasured.append(batch)
+                        uploads.append(uploader.submit(self.prepare, batch))
+                    elif len(unmeasured) > 0:
+                        break
+                if len(unmeasured) == 0:
+                    return
+                host_binaries = uploads.popleft().result()
+                batch_analyzed = self.launch(unmeasured[0], host_binaries)
+                yield unmeasured.popleft(), batch_analyzed
+
+    def measure(self, built: List[Path]) -> List[Dict[str, List[TestRes]]]:
+        """Upload built binaries to the host, set their capabilities and launch them
+
+        :return: Results of tests of every event group
+        """
+        return self.launch(built, self.prepare(built))
+
+    def prepare(self, built: List[Path]) -> List[Path]:
+        """Upload built binaries over the upload session and set their capabilities
+
+        :return: Paths of binaries at the host
+        """
+        host_binaries = [self.bin_dir.joinpath(binary.name) for binary in built]
+        with tempfile.TemporaryDirectory(prefix="chapy-") as strip_dir:
+            if self.strip:
+                built = self.strip_binaries(built, Path(strip_dir))
+            if self.bulk_upload:
+                self.send_binaries(built, host_binaries)
             else:
-                if used_max_perm:
-                    proc_err = chan.makefile_stderr().read().decode()
-                    print(f"[-]: Error during seting capability:\n {self.tab_lines(proc_err)}", file=sys.stderr)
-                # use_sudo = True
-
-    def send_binary(self, loc_path: Path, host_path: Path):
-        self.sftp.put(str(loc_path), str(host_path))
-        self.sftp.chmod(str(host_path), stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH | stat.S_IXOTH)
-
-    def collect(self, build_channel: Queue[CSignal.End | CSignal.BuiltFile]) -> Dict[str, Dict]:
-        analyzed: Dict[str, List[TestRes]] = {}
-
-        while True:
-            sign = build_channel.get()
-            match sign:
-                case CSignal.End():
-                    break
-                case CSignal.BuiltFile(binary):
-                    host_binary = self.bin_dir.joinpath(binary.name)
-                    self.send_binary(binary, host_binary)
-                    self.update_capabilities(host_binary)
-                    data = self.get_stat(host_binary, self.max_test_launches, self.cpu)
-                    analyzed[host_binary.name.split(".")[0]] = data
-                case _:
-                    raise Exception(f"Get unexpected channel signal {sign}")
-
-        return PerfParser.correct(analyzed)
+                for binary, host_binary in zip(built, host_binaries):
+                    self.send_binary(binary, host_binary, self.upload_sftp)
+        self.update_capabilities(host_binaries)
+        return host_binaries
+
+    def strip_binaries(self, built: List[Path], dst_dir: Path) -> List[Path]:
+        """Strip copies of binaries, binaries which can't be stripped are sent as they are
+
+        :return: Paths of the stripped binaries
+        """
+        stripped: List[Path] = []
+        for binary in built:
+            dst_file = dst_dir.joinpath(binary.name)
+            proc = subprocess.run([self.strip_tool, "-o", dst_file, binary], stderr=subprocess.PIPE)
+            if proc.returncode != 0:
+                print(f"[-]: Can't strip '{binary.name}', it is sent as it is:", file=sys.stderr)
+                print(self.tab_lines(proc.stderr.decode()), file=sys.stderr, end="")
+                dst_file = binary
+            stripped.append(dst_file)
+        return stripped
+
+    def remote_cache_dir(self) -> str:
+        """Path of the remote cache quoted for the shell of the host, a leading '~' is expanded there"""
+        path = str(self.remote_cache)
+        if path == "~" or path.startswith("~/"):
+            return '"$HOME"' + shlex.quote(path[1:])
+        return shlex.quote(path)
+
+    def cached(self, hashes: List[str]) -> set[str] | None:
+        """Select hashes of binaries present in the remote cache by one command. Binaries there get capabilities,
+        so the cache should be private to the user, and entries whose content doesn't match their hash are ignored,
+        so they are sent again
+
+        :return: Hashes of the present binaries or None if the cache isn't private
+        """
+        script = "\n".join(
+            [
+                f"cache={self.remote_cache_dir()}",
+                'mkdir -p -m 700 "$cache" && [ -O "$cache" ] && [ "$(stat -c %a "$cache")" = 700 ] || exit 1',
+                'cd "$cache"',
+                f'for f in {" ".join(hashes)}; do [ -f "$f" ] && echo "$f  $f"; done | sha256sum -c 2>/dev/null',
+                "exit 0",
+            ]
+        )
+        returncode, stdout, _ = self.run_upload_command(["sh", "-c", script])
+        if returncode != 0:
+            return None
+        # sha256sum reports 'name: OK' for every matching entry
+        checked = (line.partition(": ") for line in stdout.decode().splitlines())
+        return {name for name, _, status in checked if status == "OK"}
+
+    def send_binaries(self, built: List[Path], host_binaries: List[Path]) -> None:
+        """Upload binaries by one archive unpacked at the host by one command. With the remote cache, binaries
+        are kept there by their content hashes and linked to the host paths, so binaries uploaded before,
+        even by previous sessions, and copies of one binary are sent once. Linked binaries are checked
+        by their hashes before they get capabilities
+        """
+        hashes: List[str] = []
+        present: set[str] | None = None
+        if self.remote_cache is not None:
+            hashes = [hashlib.sha256(binary.read_bytes()).hexdigest() for binary in built]
+            present = self.cached(hashes)
+            if present is None:
+                print(
+                    f"[-]: Remote cache '{self.remote_cache}' at {self.host} isn't a directory owned by the user "
+                    "with mode 700, it is disabled",
+                    file=sys.stderr,
+                )
+                self.remote_cache = None
+        if present is None:
+            members = {binary.name: binary for binary in built}
+            unpack_dir = shlex.quote(str(self.bin_dir))
+        else:
+            members = {name: binary for name, binary in zip(hashes, built) if name not in present}
+            unpack_dir = '"$cache"'
+
+        script = ["set -e"]
+        if self.remote_cache is not None:
+            script.append(f"cache={self.remote_cache_dir()}")
+        if len(members) > 0:
+            archive_path = str(self.bin_dir.joinpath(f"upload.tar.{self.archive_format}"))
+            # the default buffer of 8 KiB splits the archive by small write requests
+            with self.upload_sftp.open(archive_path, "wb", bufsize=paramiko.SFTPFile.MAX_REQUEST_SIZE) as file:
+                file.set_pipelined(True)
+                with tarfile.open(fileobj=file, mode=f"w:{self.archive_format}") as tar:
+                    for name, binary in members.items():
+                        tar.add(binary, arcname=name, filter=executable)
+            # binaries appear in the cache only once they are unpacked, so other sessions never link partial ones
+            archive = shlex.quote(archive_path)
+            script += [
+                f"tmp=$(mktemp -d {unpack_dir}/.upload.XXXXXX)",
+                f'tar -x{ARCHIVE_FLAGS[self.archive_format]}f {archive} -C "$tmp"',
+                f'mv -f "$tmp"/* {unpack_dir}/',
+                'rmdir "$tmp"',
+                f"rm -f {archive}",
+            ]
+        if self.remote_cache is not None:
+            # hard links share capabilities with the cached binary, otherwise it is copied
+            checksums = []
+            for name, host_binary in zip(hashes, host_binaries):
+                host_path = shlex.quote(str(host_binary))
+                script.append(f'ln -f "$cache"/{name} {host_path} 2>/dev/null || cp -f "$cache"/{name} {host_path}')
+                checksums.append(f"{name}  {host_binary}")
+            script += ["sha256sum -c <<'EOF'", *checksums, "EOF"]
+            # used binaries are the most recent ones, so the least recently used are evicted beyond the size limit
+            script.append("touch -c " + " ".join(f'"$cache"/{name}' for name in dict.fromkeys(hashes)))
+            if len(members) > 0:
+                script += [
+                    "total=0",
+                    'for f in $(cd "$cache" && ls -t); do',
+                    '    total=$((total + $(stat -c %s "$cache/$f")))',
+                    f'    [ "$total" -le {self.remote_cache_size} ] || rm -f "$cache/$f"',
+                    "done",
+                ]
+
+        returncode, stdout, stderr = self.run_upload_command(["sh", "-c", "\n".join(script)])
+        if returncode != 0:
+            raise Exception(f"Can't unpack binaries at {self.host}:\n{self.tab_lines((stdout + stderr).decode())}")
+
+    def launch(self, built: List[Path], host_binaries: List[Path]) -> List[Dict[str, List[TestRes]]]:
+        """Launch uploaded binaries
+
+        :return: Results of tests of every event group
+        """
+        if self.groups_env is None:
+            self.groups_env = self.send_events_groups(host_binaries[0])
+        if self.agent is not None:
+            binaries_data = self.get_groups_stats_by_agent(host_binaries, self.groups_env)
+        else:
+            binaries_data = [
+                self.get_groups_stat(host_binary, self.max_test_launches, self.cpu, self.groups_env)
+                for host_binary in host_binaries
+            ]
+
+        groups_analyzed: List[Dict[str, List[TestRes]]] = [{} for _ in self.groups_env]
+        for binary, groups_data in zip(built, binaries_data):
+            for analyzed, data in zip(groups_analyzed, groups_data):
+                for test_name, test_data in PerfParser.split_by_tests(data, binary.name.split(".")[0]).items():
+                    analyzed.setdefault(test_name, []).extend(test_data)
+        return groups_analyzed
+
+    @staticmethod
+    def extend_groups(
+        groups_analyzed: List[Dict[str, List[TestRes]]], batch_analyzed: List[Dict[str, List[TestRes]]]
+    ) -> None:
+        """Add results of a batch of binaries to results of every event group"""
+        if len(groups_analyzed) == 0:
+            groups_analyzed.extend({} for _ in batch_analyzed)
+        for analyzed, batch in zip(groups_analyzed, batch_analyzed):
+            for test_name, test_data in batch.items():
+                analyzed.setdefault(test_name, []).extend(test_data)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Any, Deque, Dict, List
+
+import paramiko
+
+from src.analyzers.collectors.perfParser import PerfParser, TestRes
+from src.analyzers.collectors.sshCollector import SshCollector
+from src.helpers.backGroundBuilder import CSignal, ChanSignal
+from src.helpers.capabilities import tab_lines
+from src.helpers.corePool import parse_cpu_list
+from src.protocols.collector import DictSI, RawSamples
+
+# settings of a host which may differ from the top-level ones
+HOST_SETTINGS = ["host", "port", "username", "password", "path_to_key", "cpus"]
+
+
+class SshFleetCollector:
+    """Measures binaries on several hosts at once. Every core listed for a host gets its own ssh session,
+    binaries sent by the builder are dispatched to whichever session is free. If a host drops, it is reconnected
+    and binaries it was measuring are requeued, so other sessions may measure them. Every session measures
+    the empty test, so results of a host are corrected by the baseline of the same host
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.reconnect_attempts = settings.get("reconnect_attempts", 3)
+        self.reconnect_delay = settings.get("reconnect_delay", 5)
+        self.reference_event = settings.get("reference_event", "instructions")
+        self.raw_samples: RawSamples | None = None
+
+        # without the list of hosts the top-level settings describe the only one, it isn't recorded in results
+        common = {key: val for key, val in settings.items() if key != "hosts"}
+        hosts: List[Dict[str, Any]] | None = settings.get("hosts")
+        self.workers: List[SshCollector] = []
+        for host_id, host in enumerate(hosts or [{}]):
+            unknown = set(host) - set(HOST_SETTINGS)
+            if unknown:
+                print(f"[-]: Unknown settings of host {host_id} are ignored: {sorted(unknown)}", file=sys.stderr)
+            host = {key: val for key, val in host.items() if key in HOST_SETTINGS}
+            host_settings = {**common, **host, "host_id": host_id if hosts else -1}
+            # every session knows the cores of its host measured by others
+            for cpu in parse_cpu_list(host_settings.get("cpus", host_settings.get("cpu", 0))):
+                self.workers.append(self.create_worker({**host_settings, "cpu": cpu}))
+
+        self.empty: Path | None = None
+        # guards the number of alive workers and the first error of them
+        self.lock = threading.Lock()
+        self.alive = 0
+        self.error: Exception | None = None
+
+    def create_worker(self, settings: Dict[str, Any]) -> SshCollector:
+        return SshCollector(settings)
+
+    def fin(self) -> None:
+        for worker in self.workers:
+            worker.fin()
+
+    def collect(self, build_channel: Queue[ChanSignal]) -> Dict[str, DictSI]:
+        work: Queue[Path | None] = Queue()
+        workers_analyzed: List[List[Dict[str, List[TestRes]]]] = [[] for _ in self.workers]
+        self.alive = len(self.workers)
+        self.error = None
+        threads = [
+            threading.Thread(target=self.work, args=(worker, work, analyzed), name=f"ssh-{worker.host}:{worker.cpu}")
+            for worker, analyzed in zip(self.workers, workers_analyzed)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self.dispatch(build_channel, work)
+            work.join()
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
+
+        # tests are measured by one worker, except the empty one, whose results are joined
+        analyzed: Dict[str, List[TestRes]] = {}
+        for groups_analyzed in workers_analyzed:
+            if len(groups_analyzed) == 0:
+                continue
+            for test_name, test_data in PerfParser.merge_groups(groups_analyzed, self.reference_event).items():
+                analyzed.setdefault(test_name, []).extend(test_data)
+        corrected = self.workers[0].correct(analyzed)
+        self.raw_samples = self.workers[0].raw_samples
+        return corrected
+
+    def dispatch(self, build_channel: Queue[ChanSignal], work: Queue[Path | None]) -> None:
+        """Queue binaries sent by the builder until it ends"""
+        while True:
+            sign = build_channel.get()
+            match sign:
+                case CSignal.End():
+                    return
+                case CSignal.BuiltFile(binary):
+                    if PerfParser.find_baseline([binary]) is not None:
+                        self.empty = binary
+                        continue
+                    work.put(binary)
+                    with self.lock:
+                        if self.alive == 0:
+                            self.drop_queued(work)
+                case CSignal.BuildFailed(src_file, error):
+                    print(f"[-]: Can't build '{src_file.name}', it will be skipped:", file=sys.stderr)
+                    print(tab_lines(error), file=sys.stderr, end="")
+                case _:
+                    raise Exception(f"Get unexpected channel signal {sign}")
+
+    def take(self, work: Queue[Path | None], block: bool, limit: int) -> List[Path] | None:
+        """Take a fair share of binaries queued by now, but at most limit of them, so they get capabilities
+        by one setcap call
+
+        :param block: Wait for a binary, otherwise the batch may be empty
+        :return: Taken binaries or None if the work is over
+        """
+        batch: List[Path] = []
+        share = min(work.qsize() // max(self.alive, 1), limit - 1) + 1
+        while len(batch) < share:
+            try:
+                binary = work.get() if block and len(batch) == 0 else work.get_nowait()
+            except Empty:
+                break
+            if binary is None:
+                work.task_done()
+                if len(batch) == 0 and block:
+                    return None
+                # sentinels are queued once all binaries are done, so it belongs to another worker
+                work.put(None)
+                break
+            batch.append(binary)
+        return batch
+
+    def work(
+        self, worker: SshCollector, work: Queue[Path | None], groups_analyzed: List[Dict[str, List[TestRes]]]
+    ) -> None:
+        """Measure binaries from the queue till the work is over, next binaries are uploaded while others
+        are launched. The empty test is measured with the first batch of the session and once more at the end
+        """
+        unmeasured: Deque[List[Path]] = deque()
+        has_empty = has_measured = False
+
+        def take(block: bool, limit: int) -> List[Path] | None:
+            nonlocal has_empty
+            batch = self.take(work, block, limit)
+            if batch and not has_empty and self.empty is not None:
+                has_empty = True
+                return [self.empty, *batch]
+            return batch
+
+        try:
+            if worker.use_agent:
+                worker.start_agent()
+            while True:
+                try:
+                    for batch, batch_analyzed in worker.measure_pipelined(take, unmeasured):
+                        SshCollector.extend_groups(groups_analyzed, batch_analyzed)
+                        has_measured = True
+                        self.mark_done(work, batch)
+                    break
+                except Exception as err:
+                    if not worker.is_dropped(err):
+                        raise
+                    print(f"[-]: Connection to {worker.host} is dropped: {err}", file=sys.stderr)
+                self.requeue(work, unmeasured)
+                if not self.reconnect(worker):
+                    self.retire(worker, work)
+                    return
+                # the host might be rebooted, so its baseline is measured again
+                has_empty = False
+
+            if has_measured and self.empty is not None:
+                batch_analyzed = self.measure(worker, [self.empty])
+                if batch_analyzed is not None:
+                    SshCollector.extend_groups(groups_analyzed, batch_analyzed)
+        except Exception as err:
+            with self.lock:
+                self.error = self.error or err
+            self.requeue(work, unmeasured)
+            self.retire(worker, work)
+        finally:
+            worker.stop_agent(is_dropped=not worker.is_active())
+
+    def measure(self, worker: SshCollector, built: List[Path]) -> List[Dict[str, List[TestRes]]] | None:
+        """
+        :return: Results of tests of every event group or None if the host is dropped
+        """
+        try:
+            return worker.measure(built)
+        except Exception as err:
+            if not worker.is_dropped(err):
+                raise
+            print(f"[-]: Connection to {worker.host} is dropped: {err}", file=sys.stderr)
+            return None
+
+    def reconnect(self, worker: SshCollector) -> bool:
+        for attempt in range(self.reconnect_attempts):
+            time.sleep(self.reconnect_delay)
+            try:
+                worker.reconnect()
+                self.logger.info(f"Reconnected to {worker.host} after {attempt + 1} attempts")
+                return True
+            except (paramiko.SSHException, OSError) as err:
+                self.logger.info(f"Attempt {attempt + 1} to reconnect to {worker.host} failed: {err}")
+        return False
+
+    def mark_done(self, work: Queue[Path | None], batch: List[Path]) -> None:
+        # the empty test isn't queued, it is added to batches by workers
+        for binary in batch:
+            if binary != self.empty:
+                work.task_done()
+
+    def requeue(self, work: Queue[Path | None], unmeasured: Deque[List[Path]]) -> None:
+        # binaries are put back before they are done, so the queue isn't joined in between
+        batches = list(unmeasured)
+        unmeasured.clear()
+        for batch in batches:
+            for binary in batch:
+                if binary != self.empty:
+                    work.put(binary)
+        for batch in batches:
+            self.mark_done(work, batch)
+
+    def retire(self, worker: SshCollector, work: Queue[Path | None]) -> None:
+        with self.lock:
+            self.alive -= 1
+            print(f"[-]: Core {worker.cpu} of {worker.host} is dropped, its binaries are requeued", file=sys.stderr)
+            if self.alive == 0:
+                self.drop_queued(work)
+
+    def drop_queued(self, work: Queue[Path | None]) -> None:
+        """Drop queued binaries once no worker is left, so the queue is joined. The lock should be held"""
+        while True:
+            try:
+                binary = work.get_nowait()
+            except Empty:
+                return
+            if binary is not None:
+                print(f"[-]: Can't measure '{binary.name}', all hosts are dropped", file=sys.stderr)
+            work.task_done()
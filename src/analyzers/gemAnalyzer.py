@@ -7,7 +7,7 @@ from src.analyzers.collectors.gemCollector import GemCollector
 from src.analyzers.patchers.gemPatcher import GemPatcher
 from src.helpers.builder import Builder
 from src.protocols.analyzer import Analyzer
-from src.protocols.collector import DictSI
+from src.protocols.collector import DictSI, RawSamples
 
 
 class GemAnalyzer:
@@ -39,5 +39,11 @@ class GemAnalyzer:
     def analyze(self, test_dir: Path) -> Dict[str, DictSI]:
         return self.base.analyze(test_dir)
 
+    async def analyze_async(self, test_dir: Path) -> Dict[str, DictSI]:
+        return await self.base.analyze_async(test_dir)
+
+    def raw_samples(self) -> RawSamples | None:
+        return self.base.raw_samples()
+
     def fin(self) -> None:
         return self.base.fin()
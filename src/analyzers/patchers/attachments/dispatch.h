@@ -0,0 +1,14 @@
+#ifndef DISPATCH_H
+#define DISPATCH_H
+
+#include <stddef.h>
+
+typedef struct _chapy_test_t {
+    const char* name;
+    void (*fun)();
+} chapy_test_t;
+
+extern chapy_test_t chapy_tests[];
+extern size_t chapy_tests_len;
+
+#endif
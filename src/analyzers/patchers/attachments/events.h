@@ -0,0 +1,38 @@
+#ifndef EVENTS_H
+#define EVENTS_H
+
+#include <stdint.h>
+
+// Descriptor of events measured by the harness, it replaces events compiled into the harness.
+// Numbers are in the byte order of the target
+
+#define CHAPY_EVENTS_MAGIC   "CHPE"
+#define CHAPY_EVENTS_VERSION 1
+
+typedef struct __attribute__((packed)) _chapy_events_header_t {
+    char magic[4];
+    uint8_t version;
+    uint8_t reserved;
+    // CHAPY_BYTE_ORDER written in the byte order of the target
+    uint16_t byte_order;
+    uint32_t events_len;
+} chapy_events_header_t;
+
+// header is followed by events_len entries, each entry is followed by name_len bytes of the event name
+typedef struct __attribute__((packed)) _chapy_event_entry_t {
+    uint32_t type;
+    uint64_t config;
+    uint8_t exclude_kernel;
+    uint8_t exclude_hv;
+    uint16_t name_len;
+} chapy_event_entry_t;
+
+typedef struct _chapy_event_t {
+    uint32_t type;
+    uint64_t config;
+    int exclude_kernel;
+    int exclude_hv;
+    char* name;
+} chapy_event_t;
+
+#endif
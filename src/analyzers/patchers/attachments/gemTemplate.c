@@ -1,12 +1,18 @@
 #include <gem5/m5ops.h>
 #include <stdio.h>
 
-void test_fun();
+#include "dispatch.h"
 
 int main() {
-    m5_reset_stats(0, 0);
+    for (size_t i = 0; i < chapy_tests_len; i++) {
+        // collector matches tests with stats dumps by these lines
+        printf("chapy-test: %s\n", chapy_tests[i].name);
+        fflush(stdout);
 
-    test_fun();
+        m5_reset_stats(0, 0);
+        chapy_tests[i].fun();
+        m5_dump_stats(0, 0);
+    }
 
     m5_exit(0);
 }
@@ -3,18 +3,49 @@
 #include <linux/perf_event.h>
 #include <sched.h>
 #include <signal.h>
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <fcntl.h>
 #include <sys/ioctl.h>
+#include <sys/mman.h>
 #include <unistd.h>
 
-void test_fun();
+#include "dispatch.h"
+#include "events.h"
+#include "results.h"
 
 #define EXIT_SIGNAL 2
 
+// results are printed as text lines instead of binary records if it is set
+#define TEXT_OUTPUT_ENV "CHAPY_TEXT_OUTPUT"
+// results are written to this memory-mapped file instead of stdout if it is set
+#define RESULT_FILE_ENV "CHAPY_RESULT_FILE"
+// events are loaded from this descriptor file if it is set
+#define EVENTS_FILE_ENV "CHAPY_EVENTS_FILE"
+
 int* perf_fd;
 size_t perf_fd_len = 0;
+int group_fd = -1;
+// position of the event's value in the group read, or -1 if the event isn't opened
+int* group_index;
+size_t group_len = 0;
+uint64_t* group_values;
+// PERF_EVENT_IOC_RESET doesn't reset enabled and running times, so they are read before the test
+uint64_t* group_start_values;
+chapy_test_t* running_test = NULL;
+size_t running_iteration = 0;
+
+int text_output = 0;
+int result_fd = -1;
+uint8_t* result_map = NULL;
+size_t result_size = 0;
+size_t result_offset = 0;
+uint8_t* record_buf = NULL;
+
+chapy_event_t* run_events = NULL;
+size_t run_events_len = 0;
 
 #ifndef EVENTS_INIT
     #define EVENTS_INIT
@@ -38,63 +69,279 @@ long perf_event_open(struct perf_event_attr* hw_event, pid_t pid, int cpu, int g
     return ret;
 }
 
-int set_up_perf_event(perf_event_config_t* event, int cpu) {
+static void* read_file(const char* path, size_t* size) {
+    FILE* file = fopen(path, "rb");
+    if (file == NULL)
+        return NULL;
+    fseek(file, 0, SEEK_END);
+    *size = ftell(file);
+    fseek(file, 0, SEEK_SET);
+    void* data = malloc(*size);
+    if (fread(data, 1, *size, file) != *size) {
+        free(data);
+        data = NULL;
+    }
+    fclose(file);
+    return data;
+}
+
+static void load_events_file(const char* path) {
+    size_t size;
+    uint8_t* data = read_file(path, &size);
+    chapy_events_header_t header;
+    if (data == NULL || size < sizeof(header)) {
+        fprintf(stderr, "Can't read events file '%s'\n", path);
+        exit(EXIT_FAILURE);
+    }
+    memcpy(&header, data, sizeof(header));
+    if (memcmp(header.magic, CHAPY_EVENTS_MAGIC, sizeof(header.magic)) != 0 || header.version != CHAPY_EVENTS_VERSION ||
+        header.byte_order != CHAPY_BYTE_ORDER) {
+        fprintf(stderr, "Events file '%s' has unsupported format\n", path);
+        exit(EXIT_FAILURE);
+    }
+
+    run_events_len = header.events_len;
+    run_events = calloc(run_events_len, sizeof(*run_events));
+    size_t offset = sizeof(header);
+    for (size_t i = 0; i < run_events_len; i++) {
+        chapy_event_entry_t entry;
+        if (offset + sizeof(entry) > size) {
+            fprintf(stderr, "Events file '%s' is truncated\n", path);
+            exit(EXIT_FAILURE);
+        }
+        memcpy(&entry, data + offset, sizeof(entry));
+        offset += sizeof(entry);
+        if (offset + entry.name_len > size) {
+            fprintf(stderr, "Events file '%s' is truncated\n", path);
+            exit(EXIT_FAILURE);
+        }
+        run_events[i] = (chapy_event_t){
+            .type = entry.type,
+            .config = entry.config,
+            .exclude_kernel = entry.exclude_kernel,
+            .exclude_hv = entry.exclude_hv,
+            .name = strndup((char*)data + offset, entry.name_len),
+        };
+        offset += entry.name_len;
+    }
+    free(data);
+}
+
+// events from the descriptor file replace events compiled into the harness
+static void load_events() {
+    if (getenv(EVENTS_FILE_ENV) != NULL) {
+        load_events_file(getenv(EVENTS_FILE_ENV));
+        return;
+    }
+    run_events_len = events_len;
+    run_events = calloc(run_events_len, sizeof(*run_events));
+    for (size_t i = 0; i < run_events_len; i++) {
+        run_events[i] = (chapy_event_t){
+            .type = events[i].type,
+            .config = events[i].config,
+            .exclude_kernel = EVENTS_EXCLUDE_KERNEL,
+            .exclude_hv = EVENTS_EXCLUDE_HV,
+            .name = events[i].name,
+        };
+    }
+}
+
+// the first opened event becomes the leader, the others are opened in its group
+int set_up_perf_event(chapy_event_t* event, int cpu, int leader_fd) {
     int fd;
-    struct perf_event_attr* pe = malloc(sizeof(struct perf_event_attr));
+    struct perf_event_attr* pe = calloc(1, sizeof(struct perf_event_attr));
     pe->type = event->type;
     pe->size = sizeof(struct perf_event_attr);
     pe->config = event->config;
-    pe->disabled = 1;
-    pe->exclude_kernel = EVENTS_EXCLUDE_KERNEL;
-    pe->exclude_hv = EVENTS_EXCLUDE_HV;
+    pe->disabled = (leader_fd == -1);
+    pe->exclude_kernel = event->exclude_kernel;
+    pe->exclude_hv = event->exclude_hv;
+    pe->read_format = PERF_FORMAT_GROUP | PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING;
 
-    fd = perf_event_open(pe, 0, cpu, -1, 0);
+    fd = perf_event_open(pe, 0, cpu, leader_fd, 0);
     if (fd == -1) {
-        fprintf(stderr, "Error opening leader %llx\n", pe->config);
+        fprintf(stderr, "Error opening %s %llx\n", (leader_fd == -1) ? "leader" : "group member", pe->config);
     }
     free(pe);
     return fd;
 }
 
 static void init(int cpu) {
-    perf_fd_len = events_len;
-    perf_fd = calloc(events_len, sizeof(*perf_fd));
-    for (size_t i = 0; i < events_len; i++) {
-        perf_fd[i] = set_up_perf_event(&events[i], cpu);
+    perf_fd_len = run_events_len;
+    perf_fd = calloc(run_events_len, sizeof(*perf_fd));
+    group_index = calloc(run_events_len, sizeof(*group_index));
+    for (size_t i = 0; i < run_events_len; i++) {
+        perf_fd[i] = set_up_perf_event(&run_events[i], cpu, group_fd);
+        group_index[i] = -1;
+        if (perf_fd[i] != -1) {
+            if (group_fd == -1)
+                group_fd = perf_fd[i];
+            group_index[i] = group_len++;
+        }
+    }
+    // read format of the group: nr, time_enabled, time_running, values
+    group_values = calloc(3 + group_len, sizeof(*group_values));
+    group_start_values = calloc(3 + group_len, sizeof(*group_start_values));
+}
+
+static void start(chapy_test_t* test, size_t iteration) {
+    running_test = test;
+    running_iteration = iteration;
+    if (group_fd != -1) {
+        ioctl(group_fd, PERF_EVENT_IOC_RESET, PERF_IOC_FLAG_GROUP);
+        if (read(group_fd, group_start_values, (3 + group_len) * sizeof(*group_start_values)) <= 0)
+            fprintf(stderr, "Can't read values of the events group\n");
+        ioctl(group_fd, PERF_EVENT_IOC_ENABLE, PERF_IOC_FLAG_GROUP);
+    }
+}
+
+static void emit(const void* data, size_t len) {
+    if (result_map == NULL) {
+        fwrite(data, 1, len, stdout);
+        return;
+    }
+    if (result_offset + len > result_size) {
+        fprintf(stderr, "Result file is full\n");
+        return;
+    }
+    memcpy(result_map + result_offset, data, len);
+    result_offset += len;
+}
+
+// the record is assembled in record_buf, so that it is emitted at once
+static void emit_record(uint8_t kind, size_t payload_len) {
+    chapy_record_header_t header = {
+        .version = CHAPY_VERSION,
+        .kind = kind,
+        .byte_order = CHAPY_BYTE_ORDER,
+        .payload_len = payload_len,
+    };
+    memcpy(header.magic, CHAPY_MAGIC, sizeof(header.magic));
+    memcpy(record_buf, &header, sizeof(header));
+    emit(record_buf, sizeof(header) + payload_len);
+}
+
+static size_t schema_payload_len() {
+    size_t len = sizeof(chapy_schema_t);
+    for (size_t i = 0; i < run_events_len; i++)
+        len += strlen(run_events[i].name) + 1;
+    for (size_t i = 0; i < chapy_tests_len; i++)
+        len += strlen(chapy_tests[i].name) + 1;
+    return len;
+}
+
+static size_t data_payload_len() { return sizeof(chapy_data_t) + run_events_len * sizeof(int64_t); }
+
+static void write_schema() {
+    size_t payload_len = schema_payload_len();
+    record_buf = realloc(record_buf, sizeof(chapy_record_header_t) + payload_len);
+    uint8_t* payload = record_buf + sizeof(chapy_record_header_t);
+    chapy_schema_t schema = {.events_len = run_events_len, .tests_len = chapy_tests_len};
+    memcpy(payload, &schema, sizeof(schema));
+    payload += sizeof(schema);
+    for (size_t i = 0; i < run_events_len; i++)
+        payload = (uint8_t*)stpcpy((char*)payload, run_events[i].name) + 1;
+    for (size_t i = 0; i < chapy_tests_len; i++)
+        payload = (uint8_t*)stpcpy((char*)payload, chapy_tests[i].name) + 1;
+    emit_record(CHAPY_RECORD_SCHEMA, payload_len);
+
+    record_buf = realloc(record_buf, sizeof(chapy_record_header_t) + data_payload_len());
+}
+
+static void open_result_file(const char* path, size_t iterations) {
+    result_size = sizeof(chapy_record_header_t) + schema_payload_len();
+    result_size += chapy_tests_len * iterations * (sizeof(chapy_record_header_t) + data_payload_len());
+    result_fd = open(path, O_RDWR | O_CREAT | O_TRUNC, 0644);
+    if (result_fd == -1 || ftruncate(result_fd, result_size) == -1) {
+        fprintf(stderr, "Can't create result file '%s', stdout is used\n", path);
+        return;
+    }
+    result_map = mmap(NULL, result_size, PROT_READ | PROT_WRITE, MAP_SHARED, result_fd, 0);
+    if (result_map == MAP_FAILED) {
+        fprintf(stderr, "Can't map result file '%s', stdout is used\n", path);
+        result_map = NULL;
+    }
+}
+
+static void close_result_file() {
+    if (result_map != NULL) {
+        munmap(result_map, result_size);
+        result_map = NULL;
+    }
+    if (result_fd != -1) {
+        if (ftruncate(result_fd, result_offset) == -1)
+            fprintf(stderr, "Can't truncate result file\n");
+        close(result_fd);
+    }
+}
+
+static void print_text(chapy_test_t* test, int is_read) {
+    printf("test: %s\n", test->name);
+    printf("iteration: %zu\n", running_iteration);
+    if (is_read) {
+        printf("time_enabled: %llu\n", (unsigned long long)(group_values[1] - group_start_values[1]));
+        printf("time_running: %llu\n", (unsigned long long)(group_values[2] - group_start_values[2]));
+    }
+    for (size_t i = 0; i < perf_fd_len; i++) {
+        long long value_result = -1;
+        if (is_read && group_index[i] != -1)
+            value_result = group_values[3 + group_index[i]];
+        printf("%s: %lld\n", run_events[i].name, value_result);
     }
+}
 
-    for (size_t i = 0; i < events_len; i++) {
-        if (perf_fd[i] != -1)
-            ioctl(perf_fd[i], PERF_EVENT_IOC_RESET, 0);
+static void write_data(chapy_test_t* test, int is_read, int is_full) {
+    chapy_data_t data = {
+        .test_id = test - chapy_tests,
+        .iteration = running_iteration,
+        .is_full = is_full,
+        .events_len = run_events_len,
+    };
+    if (is_read) {
+        data.time_enabled = group_values[1] - group_start_values[1];
+        data.time_running = group_values[2] - group_start_values[2];
     }
+    uint8_t* payload = record_buf + sizeof(chapy_record_header_t);
+    memcpy(payload, &data, sizeof(data));
+    for (size_t i = 0; i < run_events_len; i++) {
+        int64_t value_result = -1;
+        if (is_read && group_index[i] != -1)
+            value_result = group_values[3 + group_index[i]];
+        memcpy(payload + sizeof(data) + i * sizeof(value_result), &value_result, sizeof(value_result));
+    }
+    emit_record(CHAPY_RECORD_DATA, data_payload_len());
+}
 
-    for (size_t i = 0; i < events_len; i++) {
-        if (perf_fd[i] != -1)
-            ioctl(perf_fd[i], PERF_EVENT_IOC_ENABLE, 0);
+static void stop(int is_full) {
+    int is_read = 0;
+    if (group_fd != -1) {
+        ioctl(group_fd, PERF_EVENT_IOC_DISABLE, PERF_IOC_FLAG_GROUP);
+        is_read = read(group_fd, group_values, (3 + group_len) * sizeof(*group_values)) > 0;
+        if (!is_read)
+            fprintf(stderr, "Can't read values of the events group\n");
     }
+
+    chapy_test_t* test = running_test;
+    running_test = NULL;
+
+    if (text_output)
+        print_text(test, is_read);
+    else
+        write_data(test, is_read, is_full);
 }
 
 static void fin() {
     signal(SIGINT, SIG_IGN);
     if (perf_fd != NULL) {
-        for (size_t i = 0; i < perf_fd_len; i++) {
-            if (perf_fd[i] != -1)
-                ioctl(perf_fd[i], PERF_EVENT_IOC_DISABLE, 0);
-        }
+        if (running_test != NULL)
+            stop(0);
 
-        long long value_result = -1;
         for (size_t i = 0; i < perf_fd_len; i++) {
-            if (perf_fd[i] != -1) {
-                if (read(perf_fd[i], &value_result, sizeof(long long)) <= 0) {
-                    fprintf(stderr, "Can't read value of '%s'\n", events[i].name);
-                }
+            if (perf_fd[i] != -1)
                 close(perf_fd[i]);
-            } else {
-                value_result = -1;
-            }
-            printf("%s: %lld\n", events[i].name, value_result);
         }
     }
+    close_result_file();
 }
 
 static void sigint_handler() { exit(EXIT_SIGNAL); }
@@ -109,17 +356,36 @@ int main(int argc, char* argv[]) {
 
     cpu_set_t cpuset;
     if (argc < 2) {
-        fprintf(stderr, "Usage: %s <cpu>\n", argv[0]);
+        fprintf(stderr, "Usage: %s <cpu> [iterations] [warmup iterations]\n", argv[0]);
         exit(EXIT_FAILURE);
     }
     int cpu = atoi(argv[1]);
+    size_t iterations = (argc > 2) ? strtoul(argv[2], NULL, 10) : 1;
+    size_t warmup_iterations = (argc > 3) ? strtoul(argv[3], NULL, 10) : 0;
     CPU_ZERO(&cpuset);
     CPU_SET(cpu, &cpuset);
     if (sched_setaffinity(0, sizeof(cpuset), &cpuset) == -1) {
         fprintf(stderr, "Can't set test to %d CPU core\n", cpu);
     }
 
+    load_events();
+    text_output = getenv(TEXT_OUTPUT_ENV) != NULL && strcmp(getenv(TEXT_OUTPUT_ENV), "0") != 0;
+    if (!text_output) {
+        if (getenv(RESULT_FILE_ENV) != NULL)
+            open_result_file(getenv(RESULT_FILE_ENV), iterations);
+        write_schema();
+    }
+
     init(cpu);
-    test_fun();
+    for (size_t i = 0; i < chapy_tests_len; i++) {
+        for (size_t j = 0; j < warmup_iterations; j++) {
+            chapy_tests[i].fun();
+        }
+        for (size_t j = 0; j < iterations; j++) {
+            start(&chapy_tests[i], j);
+            chapy_tests[i].fun();
+            stop(1);
+        }
+    }
     return 0;
 }
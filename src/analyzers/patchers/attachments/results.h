@@ -0,0 +1,42 @@
+#ifndef RESULTS_H
+#define RESULTS_H
+
+#include <stdint.h>
+
+// Binary results of the harness. A launch writes one schema record with names of events and tests,
+// then a data record per measured iteration. Numbers are in the byte order of the target
+
+#define CHAPY_MAGIC      "CHPY"
+#define CHAPY_VERSION    1
+#define CHAPY_BYTE_ORDER 0x0102
+
+#define CHAPY_RECORD_SCHEMA 0
+#define CHAPY_RECORD_DATA   1
+
+typedef struct __attribute__((packed)) _chapy_record_header_t {
+    char magic[4];
+    uint8_t version;
+    uint8_t kind;
+    // CHAPY_BYTE_ORDER written in the byte order of the target
+    uint16_t byte_order;
+    // size of the record without the header
+    uint32_t payload_len;
+} chapy_record_header_t;
+
+// payload of the schema record is followed by events_len and tests_len null-terminated names
+typedef struct __attribute__((packed)) _chapy_schema_t {
+    uint32_t events_len;
+    uint32_t tests_len;
+} chapy_schema_t;
+
+// payload of the data record is followed by events_len values, the value of an event is -1 if it isn't opened
+typedef struct __attribute__((packed)) _chapy_data_t {
+    uint32_t test_id;
+    uint32_t iteration;
+    uint32_t is_full;
+    uint32_t events_len;
+    uint64_t time_enabled;
+    uint64_t time_running;
+} chapy_data_t;
+
+#endif
@@ -1,8 +1,9 @@
 import glob
+import json
 import logging
 import sys
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 ATTACH_DIR = "src/analyzers/patchers/attachments/"
 
@@ -14,28 +15,78 @@ class BasePatcher:
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(self.settings["log_level"])
 
+        self.batch_size: int = settings.get("batch_size", 1)
+
         launch_dir = Path(sys.argv[0]).parent
         self.empty_test_path = launch_dir.joinpath(ATTACH_DIR, "empty.c")
+        self.dispatch_path = launch_dir.joinpath(ATTACH_DIR, "dispatch.h")
         self.template_paths = [launch_dir.joinpath(ATTACH_DIR, name) for name in templates]
 
+    def write_dispatch_table(self, writter: Any, tests: Dict[str, str]) -> None:
+        """Write the table of tests run by the harness
+
+        :param writter: Opened patched file
+        :param tests: Test names mapped to names of their test functions
+        """
+        writter.write(f'#include "{self.dispatch_path.absolute()}"\n\n')
+        table = ", ".join(f"{{{json.dumps(name)}, {fun}}}" for name, fun in tests.items())
+        writter.write(f"chapy_test_t chapy_tests[] = {{{table}}};\n")
+        writter.write(f"size_t chapy_tests_len = {len(tests)};\n")
+
     def patch_test(self, src_test: Path, dest_test: Path) -> bool:
         dest_test.parent.mkdir(parents=True, exist_ok=True)
         if src_test.is_file():
             with open(dest_test, "wt") as writter:
-                for tmp_pth in self.template_paths:
-                    writter.write(f'#include "{tmp_pth.absolute()}"\n')
                 writter.write(f'#include "{src_test.absolute()}"\n')
+                self.write_dispatch_table(writter, {dest_test.name.split(".")[0]: "test_fun"})
                 return True
         return False
 
+    def patch_batch(self, src_tests: List[Path], dest_dir: Path) -> None:
+        """Patch tests to be linked into one binary. Every test is a separate source with renamed test_fun,
+        the harness runs them in sequence using the table from dispatch.c
+
+        :param src_tests: Tests of the batch
+        :param dest_dir: Directory for sources of the batch
+        """
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        tests: Dict[str, str] = {}
+        for i, src_test in enumerate(src_tests):
+            fun = f"chapy_test_fun_{i}"
+            with open(dest_dir.joinpath(src_test.name), "wt") as writter:
+                writter.write(f"#define test_fun {fun}\n")
+                writter.write(f'#include "{src_test.absolute()}"\n')
+            tests[src_test.name.split(".")[0]] = fun
+
+        with open(dest_dir.joinpath("dispatch.c"), "wt") as writter:
+            for fun in tests.values():
+                writter.write(f"void {fun}();\n")
+            self.write_dispatch_table(writter, tests)
+
+    def patch_harness(self, dest_harness: Path) -> None:
+        dest_harness.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest_harness, "wt") as writter:
+            for tmp_pth in self.template_paths:
+                writter.write(f'#include "{tmp_pth.absolute()}"\n')
+
     def add_empty_patched_test(self, destination_file: Path) -> None:
         destination_file.parent.mkdir(parents=True, exist_ok=True)
         self.patch_test(self.empty_test_path, destination_file)
 
     def patch_tests_in_dir(self, src_dir: Path, dst_dir: Path) -> None:
         dst_dir.mkdir(parents=True, exist_ok=True)
-        for src_test in glob.glob(str(src_dir) + "/*.c"):
-            src_test_path = Path(src_test)
+        src_tests = sorted(map(Path, glob.glob(str(src_dir) + "/*.c")))
+        # results of the empty test are the baseline, so it is added by patch and is never batched
+        for src_test in [test for test in src_tests if test.name == self.empty_test_path.name]:
+            print(f"[-]: Test '{src_test}' has the name of the empty test, it will be skipped", file=sys.stderr)
+            src_tests.remove(src_test)
+        if self.batch_size > 1:
+            for begin in range(0, len(src_tests), self.batch_size):
+                end = begin + self.batch_size
+                self.patch_batch(src_tests[begin:end], dst_dir.joinpath(f"batch_{begin // self.batch_size}"))
+            return
+
+        for src_test_path in src_tests:
             self.patch_test(src_test_path, dst_dir.joinpath(src_test_path.name))
 
     def patch(self, test_dir: Path, dst_dir: Path) -> None:
@@ -15,3 +15,6 @@ class GemPatcher:
 
     def patch(self, test_dir: Path, dst_dir: Path) -> None:
         return self.patcher.patch(test_dir, dst_dir)
+
+    def patch_harness(self, dst_file: Path) -> None:
+        return self.patcher.patch_harness(dst_file)
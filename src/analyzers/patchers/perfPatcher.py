@@ -12,9 +12,15 @@ class PerfPatcher:
         self.logger.setLevel(self.settings["log_level"])
 
         events_file: str = settings.get("events", "classic.c")
+        # a list of events is read by the harness at runtime, the compiled-in ones are only a fallback
+        if not isinstance(events_file, str):
+            events_file = "classic.c"
         events_file = "perf_events/" + events_file
 
         self.patcher = BasePatcher(settings, [events_file, "perfTemplate.c"])
 
     def patch(self, test_dir: Path, dst_dir: Path) -> None:
         return self.patcher.patch(test_dir, dst_dir)
+
+    def patch_harness(self, dst_file: Path) -> None:
+        return self.patcher.patch_harness(dst_file)
@@ -9,7 +9,7 @@ from src.analyzers.collectors.perfCollector import PerfCollector
 from src.analyzers.patchers.perfPatcher import PerfPatcher
 from src.helpers.builder import Builder
 from src.protocols.analyzer import Analyzer
-from src.protocols.collector import DictSI
+from src.protocols.collector import DictSI, RawSamples
 
 
 class PerfAnalyzer:
@@ -24,5 +24,11 @@ class PerfAnalyzer:
     def analyze(self, test_dir: Path) -> Dict[str, DictSI]:
         return self.base.analyze(test_dir)
 
+    async def analyze_async(self, test_dir: Path) -> Dict[str, DictSI]:
+        return await self.base.analyze_async(test_dir)
+
+    def raw_samples(self) -> RawSamples | None:
+        return self.base.raw_samples()
+
     def fin(self) -> None:
         return self.base.fin()
@@ -4,10 +4,11 @@ from pathlib import Path
 from typing import Dict, Any
 
 from src.analyzers.backGroundBuildAnalyzer import BGBuildAnalyzer
-from src.analyzers.collectors.sshCollector import SshCollector
+from src.analyzers.collectors.sshFleetCollector import SshFleetCollector
 from src.helpers.backGroundBuilder import BGBuilder
 from src.analyzers.patchers.perfPatcher import PerfPatcher
 from src.protocols.analyzer import Analyzer
+from src.protocols.collector import RawSamples
 
 
 class SshAnalyzer:
@@ -17,12 +18,18 @@ class SshAnalyzer:
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(self.settings["log_level"])
 
-        self.collector: SshCollector = SshCollector(settings)
+        self.collector: SshFleetCollector = SshFleetCollector(settings)
         self.base: Analyzer = BGBuildAnalyzer(PerfPatcher(settings), self.builder, self.collector, settings)
 
     def analyze(self, test_dir: Path) -> Dict[str, Dict]:
         return self.base.analyze(test_dir)
 
+    async def analyze_async(self, test_dir: Path) -> Dict[str, Dict]:
+        return await self.base.analyze_async(test_dir)
+
+    def raw_samples(self) -> RawSamples | None:
+        return self.base.raw_samples()
+
     def fin(self) -> None:
         self.collector.fin()
         return self.base.fin()
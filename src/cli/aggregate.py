@@ -1,14 +1,14 @@
+import asyncio
 import logging
 import os
 import shutil
-import threading
 from datetime import datetime
 from pathlib import Path
 from pprint import pformat
-from queue import Queue
 from typing import Final, List, Dict, Any
 
 from src.cli.analyze import Analyze
+from src.helpers.corePool import parse_cpu_list
 from src.protocols.utility import Utility
 from src.helpers.configurator import LogLevel
 
@@ -43,6 +43,7 @@ DEFAULT_SUMMARIZE_SETTINGS: Final[dict] = {
     "out_dir": "summarize",
     "no_show_graph": False,
     "no_save_graph": False,
+    "statistic": None,
     "log_level": LogLevel.WARNING,
 }
 
@@ -71,35 +72,66 @@ class Aggregate(Utility):
         self.default_analyze_settings = DEFAULT_ANALYZE_SETTINGS
         self.default_summarize_settings = DEFAULT_SUMMARIZE_SETTINGS
 
-    def _run_analyzer(self, analyze: Analyze, chan: Queue):
-        """Run the analyzer and put the output directory in the queue
+    async def _run_analyzer(self, analyze: Analyze) -> str:
+        """Run the analyzer in the running event loop
 
         :param analyze: The Analyze instance to run
-        :param chan: The queue to store the output directory
+        :return: The output directory of the analyzer
         """
-        analyze.run()
+        await analyze.run_async()
         if analyze.settings is None:
             raise LookupError("Didn't find settings for analyze")
-        chan.put(analyze.settings["out_dir"])
+        return analyze.settings["out_dir"]
+
+    async def run_analyzers_async(self) -> List[str]:
+        """Run all analyzers, either concurrently in one event loop or one by one, and collect their output
+        directories
+
+        :return: A list of output directories from the analyzers
+        """
+        if not self.settings["async_analyze"]:
+            return [await self._run_analyzer(analyze) for analyze in self.analyzes]
+
+        async def run_chain(chain: List[Analyze]) -> List[str]:
+            return [await self._run_analyzer(analyze) for analyze in chain]
+
+        chains = self.partition_analyzes(self.analyzes)
+        chains_dirs = await asyncio.gather(*map(run_chain, chains))
+        out_dirs = {
+            id(analyze): out_dir for chain, dirs in zip(chains, chains_dirs) for analyze, out_dir in zip(chain, dirs)
+        }
+        return [out_dirs[id(analyze)] for analyze in self.analyzes]
+
+    @staticmethod
+    def partition_analyzes(analyzes: List[Analyze]) -> List[List[Analyze]]:
+        """Split analyzers into chains, which are run concurrently, while analyzers of a chain are run one by one.
+        Perf analyzers sharing cores of this machine are put into one chain, so they never measure at once
+        and don't disturb predictors of each other
+
+        :return: Chains of analyzers in the order of analyzes
+        """
+        chains: List[List[Analyze]] = []
+        chains_cores: List[set[int]] = []
+        for analyze in analyzes:
+            settings = analyze.settings or {}
+            cores = set()
+            if settings.get("profiler") == "perf":
+                cores = set(parse_cpu_list(settings.get("cpus", settings.get("cpu", 0))))
+            shared = [i for i, chain_cores in enumerate(chains_cores) if chain_cores & cores]
+            chain, chain_cores = [analyze], cores
+            # an analyzer sharing cores with several chains joins them into one
+            for i in reversed(shared):
+                chain, chain_cores = chains.pop(i) + chain, chains_cores.pop(i) | chain_cores
+            chains.insert(shared[0] if shared else len(chains), chain)
+            chains_cores.insert(shared[0] if shared else len(chains_cores), chain_cores)
+        return chains
 
-    # TODO: this is a draft method and should be removed or rewritted with asincio
     def run_analyzers(self) -> List[str]:
         """Run all analyzers, either asynchronously or synchronously, and collect their output directories
 
         :return: A list of output directories from the analyzers
         """
-        output_analyze_dirs: List[str] = []
-        chan = Queue()
-        for analyze in self.analyzes:
-            if self.settings["async_analyze"]:
-                threading.Thread(target=self._run_analyzer, args=(analyze, chan)).start()
-            else:
-                self._run_analyzer(analyze, chan)
-
-        for _ in self.analyzes:
-            output_analyze_dirs.append(chan.get())
-
-        return output_analyze_dirs
+        return asyncio.run(self.run_analyzers_async())
 
     def create_analyzer(self, config_file: Path, settings_analyze: Dict[str, Any]) -> Analyze:
         """Create and configure an Analyze instance based on the provided configuration file
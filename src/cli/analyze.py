@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import shlex
 import shutil
@@ -58,13 +59,19 @@ class Analyze(Utility):
         and output directory's path also passed, create directories for analysis, start the analysis,
         and pack the results
         """
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        """The same as run, but launches of the analysis are driven by the running event loop, so several analyses
+        may run at once
+        """
         self.logger.info("Analyze running. Settings:")
         self.logger.info(pformat(self.settings))
         if self.analyze_dir is None or self.test_dir is None:
             self.logger.warn("analyze_dir or test_dir are partially unknown. Exiting...")
             return
         self.create_empty_dir(self.analyze_dir)
-        data = self.analyze(self.test_dir)
+        data = await self.analyze_async(self.test_dir)
         self.fin_analyzer()
         self.pack(self.analyze_dir, data)
 
@@ -89,6 +96,14 @@ class Analyze(Utility):
             return {}
         return self.analyzer.analyze(test_dir)
 
+    async def analyze_async(self, test_dir: Path) -> Dict[str, DictSI]:
+        """The same as analyze, but in the running event loop"""
+        print(f"[+]: Execute and analyze tests from {test_dir.absolute().as_posix()}")
+        if self.analyzer is None:
+            self.logger.warn("Analyzer is not provided.")
+            return {}
+        return await self.analyzer.analyze_async(test_dir)
+
     def fin_analyzer(self) -> None:
         """Finalize the analyzer, performing any necessary cleanup actions"""
         if self.analyzer is not None:
@@ -102,3 +117,7 @@ class Analyze(Utility):
         """
         print(f"[+]: Save analysis' results to {analyze_dir.absolute().as_posix()}")
         self.packer.pack(analyze_dir, analyzed_data)
+        if self.settings is not None and self.settings.get("save_samples", False) and self.analyzer is not None:
+            raw_samples = self.analyzer.raw_samples()
+            if raw_samples is not None:
+                self.packer.pack_samples(analyze_dir, raw_samples)
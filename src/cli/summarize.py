@@ -12,6 +12,8 @@ from matplotlib.backend_bases import Event
 from matplotlib.patches import Patch
 from pandas import DataFrame
 
+from src.analyzers.collectors.perfParser import PerfParser
+from src.helpers.packer import Packer
 from src.protocols.collector import DictSI
 from src.protocols.utility import Utility
 
@@ -41,15 +43,19 @@ class Summarize(Utility):
         self.logger.info(pformat(self.settings))
         src_dirs: List[Path] = [Path(s) for s in self.settings["src_dirs"]]
         data = self.get_data_from_sources(src_dirs)
+        if self.settings.get("statistic") is not None:
+            self.recompute_from_samples(data, self.settings["statistic"])
         if len(data) == 0:
             return
 
         data_df = self.convert_to_pandas(self.prepare_data(data))
         self.logger.debug(f"Collected data:\n{data_df.head()}")
         mean_of_dir = self.calculate_mean_of_dir(data_df)
+        mean_of_cpu = self.calculate_mean_of_cpu(data_df)
+        mean_of_host = self.calculate_mean_of_host(data_df)
         out_dir = Path(self.settings["out_dir"])
 
-        self.save_mean_data(mean_of_dir, src_dirs, out_dir)
+        self.save_mean_data(mean_of_dir, src_dirs, out_dir, mean_of_cpu, mean_of_host)
         self.save_data_for_each_source(data_df, mean_of_dir, src_dirs, out_dir)
 
         data_df = self.filter_summarize_data(data_df)
@@ -93,10 +99,24 @@ class Summarize(Utility):
 
         return data
 
+    def recompute_from_samples(self, data: DataType[int], statistic: str) -> None:
+        """Replace results of directories having raw samples with results estimated by the given statistic
+
+        :param data: The collected data, it is updated in place
+        :param statistic: Statistic used to reduce samples of a test
+        """
+        for src_dir in data:
+            raw_samples = Packer.load_samples(Path(src_dir))
+            if raw_samples is None:
+                self.logger.warning(f"[-]: Directory {src_dir} does not contain raw samples, .data files are used")
+                continue
+            recomputed = PerfParser.correct_samples(*raw_samples, statistic=statistic)
+            data[src_dir] = {test: {key: int(val) for key, val in res.items()} for test, res in recomputed.items()}
+
     def prepare_data(self, data: DataType[int]) -> DataType[int | float | bool]:
         """Prepare and transform the collected data by extracting and calculating specific metrics
 
-        Extracts simulation ticks, branch predictor lookups, incorrect predictions, and full launch flags,
+        Extracts simulation ticks, branch predictor lookups, incorrect predictions, full launch flags, cores and hosts,
         then calculates ticks per branch prediction and the percentage of incorrect predictions
 
         :param data: The collected data
@@ -130,6 +150,8 @@ class Summarize(Utility):
                         else np.nan
                     ),
                     "Full launch": is_full,
+                    "CPU": src_data.get("cpu", np.nan),
+                    "Host": src_data.get("host", np.nan),
                 }
         return result
 
@@ -153,6 +175,36 @@ class Summarize(Utility):
             )
         return DataFrame(mean_of_dir)
 
+    def calculate_mean_of_cpu(self, data: DataFrame) -> DataFrame:
+        """Calculate the mean percentage of BP incorrect for each core of each directory,
+        a difference between cores of one directory shows a per-core bias of measurements
+
+        :param data: The prepared data in a pandas DataFrame
+        :return: A DataFrame with directories as columns and cores as rows, empty if cores are unknown
+        """
+        return self.calculate_mean_by(data, "CPU").rename_axis("cpu")
+
+    def calculate_mean_of_host(self, data: DataFrame) -> DataFrame:
+        """Calculate the mean percentage of BP incorrect for each host of each directory measured by several hosts,
+        a difference between hosts of one directory shows a board-to-board variance
+
+        :param data: The prepared data in a pandas DataFrame
+        :return: A DataFrame with directories as columns and indexes of hosts as rows, empty if hosts are unknown
+        """
+        return self.calculate_mean_by(data, "Host").rename_axis("host")
+
+    def calculate_mean_by(self, data: DataFrame, column: str) -> DataFrame:
+        """Calculate the mean percentage of BP incorrect for each known value of the column in each directory"""
+        if column not in data.columns:
+            return DataFrame()
+        known = data[data[column].notna()]
+        mean_by: Dict[str, Dict[int, float]] = {}
+        for (src_dir, value), group in known.groupby([known.index.get_level_values("dir"), column]):
+            lookups = group["BP lookups"].sum()
+            incorrect = round(group["BP incorrect"].sum() / lookups * 100, 2) if lookups != 0 else 0
+            mean_by.setdefault(src_dir, {})[int(value)] = incorrect
+        return DataFrame(mean_by).sort_index()
+
     def convert_to_pandas(self, data: Dict[str, Dict[Any, Any]]) -> DataFrame:
         """Convert the prepared data to a pandas DataFrame
 
@@ -162,12 +214,21 @@ class Summarize(Utility):
         df = pd.concat({key: DataFrame(value).T for key, value in data.items()})
         return df.rename_axis(["dir", "test"])
 
-    def save_mean_data(self, mean_of_dir: DataFrame, src_dirs: List[Path], out_dir: Path) -> None:
+    def save_mean_data(
+        self,
+        mean_of_dir: DataFrame,
+        src_dirs: List[Path],
+        out_dir: Path,
+        mean_of_cpu: DataFrame | None = None,
+        mean_of_host: DataFrame | None = None,
+    ) -> None:
         """Save the mean percentage of BP incorrect for each directory to a file
 
         :param mean_of_dir: The DataFrame containing the mean percentage of BP incorrect for each directory
         :param src_dirs: A list of directories containing source analyze data files
         :param out_dir: The directory where the results will be saved
+        :param mean_of_cpu: The DataFrame containing the mean percentage of BP incorrect for each core
+        :param mean_of_host: The DataFrame containing the mean percentage of BP incorrect for each host
         """
         out_dir.mkdir(parents=True, exist_ok=True)
         with open(out_dir.joinpath(self.filename_out_data), "w") as f:
@@ -175,6 +236,14 @@ class Summarize(Utility):
             f.write("Summarized data:\n")
             f.write(mean_of_dir.to_string())
             f.write("\n\n")
+            if mean_of_cpu is not None and not mean_of_cpu.empty:
+                f.write("BP incorrect % per core:\n")
+                f.write(mean_of_cpu.to_string())
+                f.write("\n\n")
+            if mean_of_host is not None and not mean_of_host.empty:
+                f.write("BP incorrect % per host:\n")
+                f.write(mean_of_host.to_string())
+                f.write("\n\n")
             for src_dir in src_dirs:
                 f.write(f"dir: {src_dir}\n")
                 f.write(str(src_dir))
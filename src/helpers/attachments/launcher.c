@@ -0,0 +1,278 @@
+#define _GNU_SOURCE
+#include <errno.h>
+#include <linux/capability.h>
+#include <poll.h>
+#include <sched.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/syscall.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
+
+// Persistent launcher of tests. It is pinned to a core once and passes its capabilities to tests
+// as ambient ones, so tests don't need their own file capabilities.
+// Usage: launcher <cpu>. Requests are read from stdin, responses are written to stdout,
+// numbers are in the native byte order. A request launches a test several times, a response is written
+// after every launch and one more after the last of them, so a lot of launches need one round trip.
+// Requests are read after the previous one is done, so they may be sent at once
+
+// request is followed by strings_len bytes: argc null-terminated arguments,
+// then "NAME=value" variables of each group, every group ends by an empty string
+typedef struct __attribute__((packed)) _launcher_request_t {
+    uint32_t argc;
+    // every step launches the test once per group of variables
+    uint32_t groups;
+    // number of steps, -1 to launch till the timeout
+    int32_t launches;
+    // for all launches of the request, -1 if there is no timeout
+    int64_t timeout_ms;
+    uint32_t grace_ms;
+    uint32_t strings_len;
+} launcher_request_t;
+
+#define STATUS_NOT_LAUNCHED -1
+#define STATUS_END -2
+
+// response is followed by stdout_len bytes of stdout and stderr_len bytes of stderr of the test
+typedef struct __attribute__((packed)) _launcher_response_t {
+    // wait status of the test, STATUS_NOT_LAUNCHED if it can't be launched,
+    // STATUS_END after the last launch of the request
+    int32_t status;
+    uint32_t is_full;
+    uint64_t wall_ns;
+    uint64_t utime_us;
+    uint64_t stime_us;
+    int64_t max_rss;
+    uint32_t stdout_len;
+    uint32_t stderr_len;
+} launcher_response_t;
+
+typedef struct _buffer_t {
+    char* data;
+    size_t len;
+    size_t cap;
+} buffer_t;
+
+static const int escalation_signals[] = {SIGINT, SIGTERM, SIGKILL};
+static const unsigned long passed_caps[] = {CAP_SYS_ADMIN, CAP_SYS_NICE};
+
+static int read_full(int fd, void* data, size_t len) {
+    for (size_t done = 0; done < len;) {
+        ssize_t res = read(fd, (char*)data + done, len - done);
+        if (res <= 0)
+            return -1;
+        done += res;
+    }
+    return 0;
+}
+
+static int write_full(int fd, const void* data, size_t len) {
+    for (size_t done = 0; done < len;) {
+        ssize_t res = write(fd, (const char*)data + done, len - done);
+        if (res <= 0)
+            return -1;
+        done += res;
+    }
+    return 0;
+}
+
+static uint64_t now_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+static void raise_ambient_caps() {
+    struct __user_cap_header_struct header = {.version = _LINUX_CAPABILITY_VERSION_3, .pid = 0};
+    struct __user_cap_data_struct data[_LINUX_CAPABILITY_U32S_3];
+    if (syscall(SYS_capget, &header, data) != 0) {
+        fprintf(stderr, "Can't get capabilities of the launcher\n");
+        return;
+    }
+    for (size_t i = 0; i < sizeof(passed_caps) / sizeof(*passed_caps); i++) {
+        unsigned long cap = passed_caps[i];
+        data[CAP_TO_INDEX(cap)].inheritable |= data[CAP_TO_INDEX(cap)].permitted & CAP_TO_MASK(cap);
+    }
+    syscall(SYS_capset, &header, data);
+    for (size_t i = 0; i < sizeof(passed_caps) / sizeof(*passed_caps); i++) {
+        if (prctl(PR_CAP_AMBIENT, PR_CAP_AMBIENT_RAISE, passed_caps[i], 0, 0) != 0)
+            fprintf(stderr, "Can't pass capability %lu to tests\n", passed_caps[i]);
+    }
+}
+
+static void append(buffer_t* buf, int fd, int* is_open) {
+    if (buf->cap - buf->len < 65536) {
+        buf->cap = buf->cap * 2 + 65536;
+        buf->data = realloc(buf->data, buf->cap);
+    }
+    ssize_t res = read(fd, buf->data + buf->len, buf->cap - buf->len);
+    if (res > 0)
+        buf->len += res;
+    else if (res == 0 || errno != EINTR)
+        *is_open = 0;
+}
+
+// envs is a list of "NAME=value" variables which ends by an empty string
+static void launch(char** argv, char** envs, int64_t timeout_ms, uint32_t grace_ms, launcher_response_t* response,
+                   buffer_t* outputs) {
+    int out_pipe[2], err_pipe[2];
+    if (pipe(out_pipe) != 0 || pipe(err_pipe) != 0) {
+        response->status = STATUS_NOT_LAUNCHED;
+        return;
+    }
+    uint64_t start = now_ns();
+    pid_t pid = fork();
+    if (pid == 0) {
+        dup2(out_pipe[1], STDOUT_FILENO);
+        dup2(err_pipe[1], STDERR_FILENO);
+        close(out_pipe[0]);
+        close(out_pipe[1]);
+        close(err_pipe[0]);
+        close(err_pipe[1]);
+        close(STDIN_FILENO);
+        for (char** env = envs; **env != '\0'; env++)
+            putenv(*env);
+        execv(argv[0], argv);
+        fprintf(stderr, "Can't execute %s: %s\n", argv[0], strerror(errno));
+        _exit(127);
+    }
+    close(out_pipe[1]);
+    close(err_pipe[1]);
+    if (pid == -1) {
+        close(out_pipe[0]);
+        close(err_pipe[0]);
+        response->status = STATUS_NOT_LAUNCHED;
+        return;
+    }
+
+    int pidfd = syscall(SYS_pidfd_open, pid, 0);
+    int fd[3] = {out_pipe[0], err_pipe[0], pidfd};
+    int is_open[3] = {1, 1, pidfd != -1};
+    struct pollfd fds[3];
+    size_t escalation = 0;
+    int64_t deadline = timeout_ms < 0 ? -1 : (int64_t)(start + timeout_ms * 1000000);
+    response->is_full = 1;
+    int is_exited = 0;
+    while (is_open[0] || is_open[1] || is_open[2]) {
+        for (int i = 0; i < 3; i++)
+            fds[i] = (struct pollfd){.fd = is_open[i] ? fd[i] : -1, .events = POLLIN};
+        int wait_ms = deadline < 0 ? -1 : (int)(deadline > (int64_t)now_ns() ? (deadline - now_ns()) / 1000000 : 0);
+        int ready = poll(fds, 3, wait_ms);
+        if (ready > 0) {
+            for (int i = 0; i < 2; i++) {
+                if (is_open[i] && fds[i].revents)
+                    append(&outputs[i], fd[i], &is_open[i]);
+            }
+            if (is_open[2] && fds[2].revents) {
+                is_open[2] = 0;
+                is_exited = 1;
+                // descendants may hold the pipes, so they are drained only for a grace period
+                deadline = now_ns() + (uint64_t)grace_ms * 1000000;
+            }
+        } else if (ready == 0 && deadline >= 0 && (int64_t)now_ns() >= deadline) {
+            if (is_exited || escalation == sizeof(escalation_signals) / sizeof(*escalation_signals))
+                break;
+            kill(pid, escalation_signals[escalation++]);
+            response->is_full = 0;
+            deadline = now_ns() + (uint64_t)grace_ms * 1000000;
+        }
+    }
+    close(out_pipe[0]);
+    close(err_pipe[0]);
+    if (pidfd != -1)
+        close(pidfd);
+
+    int status;
+    struct rusage usage;
+    wait4(pid, &status, 0, &usage);
+    response->status = status;
+    response->wall_ns = now_ns() - start;
+    response->utime_us = (uint64_t)usage.ru_utime.tv_sec * 1000000 + usage.ru_utime.tv_usec;
+    response->stime_us = (uint64_t)usage.ru_stime.tv_sec * 1000000 + usage.ru_stime.tv_usec;
+    response->max_rss = usage.ru_maxrss;
+}
+
+static int respond(launcher_response_t* response, buffer_t* outputs) {
+    response->stdout_len = outputs[0].len;
+    response->stderr_len = outputs[1].len;
+    int failed = write_full(STDOUT_FILENO, response, sizeof(*response)) != 0 ||
+                 write_full(STDOUT_FILENO, outputs[0].data, outputs[0].len) != 0 ||
+                 write_full(STDOUT_FILENO, outputs[1].data, outputs[1].len) != 0;
+    free(outputs[0].data);
+    free(outputs[1].data);
+    return failed ? -1 : 0;
+}
+
+// launch steps of the request while the timeout isn't expired, launches of a started step get the rest of it
+static int serve(launcher_request_t* request, char* strings) {
+    char** argv = calloc(request->argc + 1, sizeof(*argv));
+    char*** groups = calloc(request->groups, sizeof(*groups));
+    char* str = strings;
+    for (uint32_t i = 0; i < request->argc; i++, str += strlen(str) + 1)
+        argv[i] = str;
+    for (uint32_t i = 0; i < request->groups; i++) {
+        size_t envc = 0;
+        for (char* env = str; *env != '\0'; env += strlen(env) + 1)
+            envc++;
+        groups[i] = calloc(envc + 1, sizeof(**groups));
+        for (size_t j = 0; j <= envc; j++, str += strlen(str) + 1)
+            groups[i][j] = str;
+    }
+
+    int failed = 0;
+    uint64_t deadline = now_ns() + (uint64_t)request->timeout_ms * 1000000;
+    for (int32_t step = 0; !failed && (request->launches < 0 || step < request->launches); step++) {
+        if (request->timeout_ms >= 0 && now_ns() >= deadline)
+            break;
+        for (uint32_t i = 0; !failed && i < request->groups; i++) {
+            launcher_response_t response = {0};
+            buffer_t outputs[2] = {{0}};
+            int64_t left_ms = request->timeout_ms < 0 ? -1 : ((int64_t)deadline - (int64_t)now_ns()) / 1000000;
+            // launches of the step which are out of time are reported as interrupted ones without output
+            if (request->timeout_ms < 0 || left_ms > 0)
+                launch(argv, groups[i], left_ms, request->grace_ms, &response, outputs);
+            failed = respond(&response, outputs) != 0;
+        }
+    }
+    launcher_response_t end = {.status = STATUS_END};
+    buffer_t no_outputs[2] = {{0}};
+    failed = failed || respond(&end, no_outputs) != 0;
+
+    for (uint32_t i = 0; i < request->groups; i++)
+        free(groups[i]);
+    free(groups);
+    free(argv);
+    return failed ? -1 : 0;
+}
+
+int main(int argc, char** argv) {
+    if (argc < 2) {
+        fprintf(stderr, "Usage: %s <cpu>\n", argv[0]);
+        return EXIT_FAILURE;
+    }
+    cpu_set_t cpu_set;
+    CPU_ZERO(&cpu_set);
+    CPU_SET(atoi(argv[1]), &cpu_set);
+    if (sched_setaffinity(0, sizeof(cpu_set), &cpu_set) != 0)
+        fprintf(stderr, "Can't pin the launcher to cpu %s\n", argv[1]);
+    raise_ambient_caps();
+    signal(SIGPIPE, SIG_IGN);
+
+    launcher_request_t request;
+    while (read_full(STDIN_FILENO, &request, sizeof(request)) == 0) {
+        char* strings = malloc(request.strings_len + 1);
+        if (read_full(STDIN_FILENO, strings, request.strings_len) != 0)
+            break;
+        strings[request.strings_len] = '\0';
+        if (serve(&request, strings) != 0)
+            break;
+        free(strings);
+    }
+    return EXIT_SUCCESS;
+}
@@ -2,8 +2,9 @@ from dataclasses import dataclass
 import logging
 import os
 from pathlib import Path
-from queue import Queue
+from queue import Full, Queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypeAlias, Dict, Any
 
 from src.helpers.builder import Builder
@@ -17,8 +18,16 @@ class CSignal:
     class BuiltFile:
         f: Path
 
+    @dataclass
+    class BuildFailed:
+        f: Path
+        error: str
+
 
-ChanSignal: TypeAlias = CSignal.BuiltFile | CSignal.End
+ChanSignal: TypeAlias = CSignal.BuiltFile | CSignal.BuildFailed | CSignal.End
+
+# seconds between checks of cancellation while the out channel is full
+PUT_TIMEOUT = 0.5
 
 
 class BGBuilder:
@@ -32,6 +41,13 @@ class BGBuilder:
             builder = Builder(settings)
         self.builder = builder
 
+        self.jobs: int = self.builder.jobs
+        # built, but not yet collected binaries are limited to keep temp dir small
+        self.queue_size: int = settings.get("build_queue_size", 2 * self.jobs)
+        # set once the consumer stops reading the out channel, e.g. on an error in the collector
+        self.stopped = threading.Event()
+        self.build_thread: threading.Thread | None = None
+
     def _build(self, src_file: Path, destination_file: Path, additional_flags: list[str] | None = None):
         self.builder.build(src_file, destination_file, additional_flags)
 
@@ -42,32 +58,70 @@ class BGBuilder:
         out_channel: Queue[ChanSignal],
         additional_flags: list[str] | None = None,
     ):
-        list_of_src_files = os.listdir(src_dir)
-        destination_dir.mkdir(parents=True, exist_ok=True)
+        def build_worker(test_file: str) -> None:
+            if self.stopped.is_set():
+                return
+            src_file = src_dir.joinpath(test_file)
+            try:
+                res = self.builder.try_build(src_file, destination_dir.joinpath(f"{test_file}.out"), additional_flags)
+            except Exception as err:
+                # the consumer waits for the end of the channel, so any error fails only this file
+                self.logger.warning(f"Can't build {src_file}: {err!r}")
+                self._put(out_channel, CSignal.BuildFailed(src_file, f"{err!r}\n"))
+                return
+            if res.is_built:
+                self._put(out_channel, CSignal.BuiltFile(res.destination_file))
+            else:
+                self._put(out_channel, CSignal.BuildFailed(res.src_file, res.error))
 
-        self.builder_mutex.acquire()
-        for test_file in list_of_src_files:
-            out_file = destination_dir.joinpath(f"{test_file}.out")
-            self._build(src_dir.joinpath(test_file), out_file, additional_flags)
-            out_channel.put(CSignal.BuiltFile(out_file))
-        self.builder_mutex.release()
+        try:
+            list_of_src_files = os.listdir(src_dir)
+            destination_dir.mkdir(parents=True, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                for _ in pool.map(build_worker, list_of_src_files):
+                    pass
+        finally:
+            # nothing is put once the build is cancelled
+            self._put(out_channel, CSignal.End())
 
-        out_channel.put(CSignal.End())
+    def _put(self, out_channel: Queue[ChanSignal], sign: ChanSignal) -> None:
+        """Put the signal to the bounded channel unless the build is cancelled while the channel is full"""
+        while not self.stopped.is_set():
+            try:
+                out_channel.put(sign, timeout=PUT_TIMEOUT)
+                return
+            except Full:
+                pass
 
     def build(self, src_file: Path, destination_file: Path, additional_flags: list[str] | None = None):
         self.builder_mutex.acquire()
         self._build(src_file, destination_file, additional_flags)
         self.builder_mutex.release()
 
+    def build_object(self, src_file: Path, destination_file: Path, additional_flags: list[str] | None = None):
+        self.builder_mutex.acquire()
+        self.builder.build_object(src_file, destination_file, additional_flags)
+        self.builder_mutex.release()
+
+    def set_default_link_objects(self, link_objects: list[Path]) -> None:
+        self.builder.set_default_link_objects(link_objects)
+
     def build_dir(
         self,
         src_dir: Path,
         destination_dir: Path,
         additional_flags: list[str] | None = None,
     ) -> Queue[ChanSignal]:
-        out_channel: Queue[ChanSignal] = Queue()
-        threading.Thread(
+        out_channel: Queue[ChanSignal] = Queue(maxsize=self.queue_size)
+        self.stopped.clear()
+        self.build_thread = threading.Thread(
             target=self._build_dir,
             args=(src_dir, destination_dir, out_channel, additional_flags),
-        ).start()
+            daemon=True,
+        )
+        self.build_thread.start()
         return out_channel
+
+    def cancel(self) -> None:
+        """Stop building once the out channel isn't read anymore, so workers don't block on it forever"""
+        self.stopped.set()
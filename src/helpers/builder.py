@@ -1,8 +1,86 @@
+import hashlib
 import logging
 import os
+import re
+import shutil
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any
+from tempfile import TemporaryDirectory
+from typing import Dict, Any, List, Tuple
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser().joinpath("chapy/build")
+DEFAULT_CACHE_SIZE_MB = 1024
+
+
+@dataclass
+class BuildResult:
+    src_file: Path
+    destination_file: Path
+    is_built: bool
+    error: str = ""
+
+
+class BuildCache:
+    """On-disk storage of built binaries addressed by the hash of everything that affects the build.
+    Least recently used entries are evicted when the cache grows over max_size bytes"""
+
+    def __init__(self, cache_dir: Path, max_size: int):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        self.mutex = threading.Lock()
+        self.size: int | None = None
+
+    def entry(self, key: str) -> Path:
+        return self.cache_dir.joinpath(key[:2], key)
+
+    def get(self, key: str, destination_file: Path) -> bool:
+        entry = self.entry(key)
+        try:
+            destination_file.unlink(missing_ok=True)
+            # hits are copied, not linked: collectors set capabilities of binaries, which would tag the entry
+            shutil.copy(entry, destination_file)
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        self.logger.info(f"Build cache hit for {destination_file.name} ({key})")
+        return True
+
+    def put(self, key: str, built_file: Path) -> None:
+        entry = self.entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_entry = entry.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        # entry is copied, so that it does not share the inode (and its mtime) with the build output
+        shutil.copy(built_file, tmp_entry)
+        os.replace(tmp_entry, entry)
+
+        with self.mutex:
+            if self.size is None:
+                self.size = self._entries_size()
+            else:
+                self.size += entry.stat().st_size
+            if self.size > self.max_size:
+                self._evict()
+
+    def _entries(self) -> List[Tuple[Path, os.stat_result]]:
+        return [(pth, pth.stat()) for pth in self.cache_dir.glob("*/*") if not pth.name.endswith(".tmp")]
+
+    def _entries_size(self) -> int:
+        return sum(st.st_size for _, st in self._entries())
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda ent: ent[1].st_mtime)
+        self.size = sum(st.st_size for _, st in entries)
+        for pth, st in entries:
+            if self.size <= self.max_size:
+                break
+            pth.unlink(missing_ok=True)
+            self.size -= st.st_size
+            self.logger.info(f"Build cache evicted {pth.name}")
 
 
 class Builder:
@@ -11,38 +89,221 @@ class Builder:
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(self.settings["log_level"])
         self.default_additional_flags: list[str] = []
+        self.default_link_objects: list[Path] = []
+
+        self.jobs: int = settings.get("build_jobs") or os.cpu_count() or 1
+
+        self.cache: BuildCache | None = None
+        cache_dir = settings.get("build_cache_dir", DEFAULT_CACHE_DIR)
+        if cache_dir:
+            cache_size = int(settings.get("build_cache_size", DEFAULT_CACHE_SIZE_MB)) * 1024 * 1024
+            self.cache = BuildCache(Path(cache_dir).expanduser(), cache_size)
+        self.compiler_id: str | None = None
+        # digests of libraries linked by flags, they are resolved once per run
+        self.libraries_digests: Dict[Tuple[str, ...], bytes] = {}
+
+        # objcopy of the same toolchain, e.g. aarch64-linux-gnu-gcc-9 -> aarch64-linux-gnu-objcopy
+        default_objcopy = re.sub(r"(gcc|cc|clang)(-[\d.]+)?$", "objcopy", str(settings["compiler"]))
+        self.objcopy: str = settings.get("objcopy", default_objcopy)
 
     def set_default_additional_flags(self, additional_flags: list[str]) -> None:
         self.default_additional_flags = additional_flags
 
+    def set_default_link_objects(self, link_objects: list[Path]) -> None:
+        self.default_link_objects = link_objects
+
+    def get_compiler_id(self) -> str:
+        if self.compiler_id is None:
+            compiler = self.settings["compiler"]
+            proc = subprocess.run([compiler, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            self.compiler_id = f"{shutil.which(compiler) or compiler}\n{proc.stdout.decode()}"
+        return self.compiler_id
+
+    def get_linked_libraries(self, flags: List[Any]) -> List[Path]:
+        """Resolve libraries linked by -l flags, including ones passed by -Wl, in -L directories
+        and in the search path of the compiler
+
+        :return: Paths of found libraries
+        """
+        args: List[str] = []
+        for flag in map(str, flags):
+            args += flag.removeprefix("-Wl,").split(",") if flag.startswith("-Wl,") else [flag]
+        lib_dirs: List[Path] = []
+        names: List[str] = []
+        for i, arg in enumerate(args):
+            # both '-lname' and '-l name' forms are accepted
+            value = args[i + 1] if arg in ["-L", "-l"] and i + 1 < len(args) else arg[2:]
+            if arg.startswith("-L"):
+                lib_dirs.append(Path(value))
+            elif arg.startswith("-l"):
+                names.append(value)
+
+        is_static = "-static" in args or "--static" in args
+        libraries: List[Path] = []
+        for name in names:
+            if name.startswith(":"):
+                candidates = [name[1:]]
+            else:
+                candidates = [f"lib{name}.a"] if is_static else [f"lib{name}.so", f"lib{name}.a"]
+            for candidate in candidates:
+                found = [lib_dir.joinpath(candidate) for lib_dir in lib_dirs if lib_dir.joinpath(candidate).is_file()]
+                if len(found) == 0:
+                    # the compiler prints the name back if the library isn't in its search path
+                    proc = subprocess.run(
+                        [self.settings["compiler"], f"-print-file-name={candidate}"],
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                    )
+                    path = Path(proc.stdout.decode().strip())
+                    found = [path] if path.is_absolute() and path.is_file() else []
+                if len(found) > 0:
+                    libraries.append(found[0])
+                    break
+        return libraries
+
+    def get_libraries_digest(self, flags: List[Any]) -> bytes:
+        key = tuple(map(str, flags))
+        if key not in self.libraries_digests:
+            hasher = hashlib.sha256()
+            for library in self.get_linked_libraries(flags):
+                hasher.update(hashlib.sha256(library.read_bytes()).digest())
+            self.libraries_digests[key] = hasher.digest()
+        return self.libraries_digests[key]
+
+    def get_cache_key(self, src_file: Path, flags: List[Any], link_objects: List[Path] | None = None) -> str | None:
+        """Hash the preprocessed source, the compiler identity, the flags and the objects and libraries
+        used to build src_file
+
+        :return: The hash or None if the source can't be preprocessed
+        """
+        preprocess_line = [self.settings["compiler"], "-E", "-P", src_file] + flags
+        proc = subprocess.run(preprocess_line, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if proc.returncode != 0:
+            return None
+
+        hasher = hashlib.sha256()
+        hasher.update(self.get_compiler_id().encode())
+        hasher.update("\0".join(map(str, flags)).encode())
+        hasher.update(proc.stdout)
+        for link_object in link_objects or []:
+            with open(link_object, "rb") as obj:
+                hasher.update(hashlib.sha256(obj.read()).digest())
+        hasher.update(self.get_libraries_digest(flags))
+        return hasher.hexdigest()
+
     def build(
         self,
         src_file: Path,
         destination_file: Path,
         additional_flags: list[str] | None = None,
+        link_objects: list[Path] | None = None,
     ) -> None:
         if additional_flags is None:
             additional_flags = self.default_additional_flags
+        if link_objects is None:
+            link_objects = self.default_link_objects
 
         destination_file.parent.mkdir(parents=True, exist_ok=True)
+        flags = self.settings["compiler_args"] + additional_flags
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.get_cache_key(src_file, flags, link_objects)
+            if cache_key is not None and self.cache.get(cache_key, destination_file):
+                return
+
         execute_line = (
             [self.settings["compiler"], src_file]
+            + link_objects
             + self.settings["compiler_args"]
             + ["-o", destination_file]
             + additional_flags
         )
         self.logger.info(f"Builder(Analyze) is running. Executed command:{execute_line}")
 
-        subprocess.run(execute_line, check=True)
+        subprocess.run(execute_line, check=True, stderr=subprocess.PIPE)
+        if self.cache is not None and cache_key is not None:
+            self.cache.put(cache_key, destination_file)
+
+    def build_object(
+        self,
+        src_file: Path,
+        destination_file: Path,
+        additional_flags: list[str] | None = None,
+    ) -> None:
+        """Compile src_file without linking, e.g. to link it later with every test"""
+        if additional_flags is None:
+            additional_flags = self.default_additional_flags
+        self.build(src_file, destination_file, additional_flags + ["-c"], [])
+
+    def build_batch(
+        self,
+        src_dir: Path,
+        destination_file: Path,
+        additional_flags: list[str] | None = None,
+        link_objects: list[Path] | None = None,
+    ) -> None:
+        """Build all sources from src_dir into one binary. Tests are compiled separately and only chapy_* symbols
+        are left global, so that functions with the same names from different tests do not clash
+        """
+        if additional_flags is None:
+            additional_flags = self.default_additional_flags
+        if link_objects is None:
+            link_objects = self.default_link_objects
+
+        with TemporaryDirectory() as obj_dir:
+            objects: list[Path] = []
+            for src_file in sorted(src_dir.glob("*.c")):
+                obj_file = Path(obj_dir).joinpath(f"{src_file.name}.o")
+                local_obj_file = Path(obj_dir).joinpath(f"{src_file.name}.local.o")
+                self.build(src_file, obj_file, additional_flags + ["-c"], [])
+                localize_line = [self.objcopy, "--wildcard", "--keep-global-symbol=chapy_*", obj_file, local_obj_file]
+                subprocess.run(localize_line, check=True, stderr=subprocess.PIPE)
+                objects.append(local_obj_file)
+
+            destination_file.parent.mkdir(parents=True, exist_ok=True)
+            execute_line = (
+                [self.settings["compiler"]]
+                + objects
+                + link_objects
+                + self.settings["compiler_args"]
+                + ["-o", destination_file]
+                + additional_flags
+            )
+            self.logger.info(f"Builder(Analyze) is running. Executed command:{execute_line}")
+            subprocess.run(execute_line, check=True, stderr=subprocess.PIPE)
+
+    def try_build(
+        self,
+        src_file: Path,
+        destination_file: Path,
+        additional_flags: list[str] | None = None,
+    ) -> BuildResult:
+        try:
+            if src_file.is_dir():
+                self.build_batch(src_file, destination_file, additional_flags)
+            else:
+                self.build(src_file, destination_file, additional_flags)
+        except (subprocess.CalledProcessError, OSError) as err:
+            destination_file.unlink(missing_ok=True)
+            error = err.stderr.decode() if isinstance(err, subprocess.CalledProcessError) and err.stderr else str(err)
+            self.logger.warning(f"Can't build {src_file}:\n{error}")
+            return BuildResult(src_file, destination_file, False, error)
+        return BuildResult(src_file, destination_file, True)
 
     def build_dir(
         self,
         src_dir: Path,
         destination_dir: Path,
         additional_flags: list[str] | None = None,
-    ):
+    ) -> List[BuildResult]:
         list_of_src_files = os.listdir(src_dir)
         destination_dir.mkdir(parents=True, exist_ok=True)
 
-        for test_file in list_of_src_files:
-            self.build(src_dir.joinpath(test_file), destination_dir.joinpath(f"{test_file}.out"), additional_flags)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            report = pool.map(
+                lambda test_file: self.try_build(
+                    src_dir.joinpath(test_file), destination_dir.joinpath(f"{test_file}.out"), additional_flags
+                ),
+                list_of_src_files,
+            )
+            return list(report)
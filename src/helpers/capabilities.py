@@ -0,0 +1,88 @@
+import logging
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+CAPABILITIES = "cap_sys_admin,cap_sys_nice=ep"
+# setcap and getcap take a lot of files at once, but the command line is limited
+FILES_PER_CALL = 512
+
+# hosts mapped to whether setcap needs sudo there, it is probed once per session
+SUDO_NEEDED: Dict[str, bool] = {}
+
+# runs a command line and returns its exit code, stdout and stderr
+CommandRunner = Callable[[List[str]], Tuple[int, bytes, bytes]]
+
+
+def has_capabilities(caps: str, required: str = CAPABILITIES) -> bool:
+    """Check getcap capabilities, e.g. 'cap_sys_admin,cap_sys_nice=ep' or old 'cap_sys_nice+ep', cover required"""
+    required_names, _, required_flags = required.partition("=")
+    covered: set[str] = set()
+    for clause in caps.replace("+", "=").split():
+        names, _, flags = clause.partition("=")
+        if set(required_flags) <= set(flags):
+            covered.update(names.split(","))
+    return set(required_names.split(",")) <= covered
+
+
+def tab_lines(lines: str) -> str:
+    return "\t" + lines.replace("\n", "\n\t")[:-1]
+
+
+class CapabilitySetter:
+    """Sets capabilities needed by perf to test binaries with one setcap call per chunk of files.
+    Binaries which already have them are skipped
+    """
+
+    def __init__(
+        self, settings: Dict[str, Any], run: CommandRunner, host: str = "localhost", sudo: List[str] | None = None
+    ):
+        """
+        :param run: Runs commands on the host of binaries
+        :param sudo: Prefix of commands run with sudo, by default 'sudo'
+        """
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.run = run
+        self.host = host
+        self.sudo = sudo or ["sudo"]
+
+    def missing(self, files: List[str]) -> List[str]:
+        """Select files without the capabilities by one getcap call per chunk"""
+        with_caps: set[str] = set()
+        for begin in range(0, len(files), FILES_PER_CALL):
+            end = begin + FILES_PER_CALL
+            returncode, stdout, _ = self.run(["getcap"] + files[begin:end])
+            if returncode != 0:
+                return files
+            for line in stdout.decode().splitlines():
+                # 'file caps' in new versions of getcap and 'file = caps' in old ones
+                path, _, caps = line.replace(" = ", " ").rpartition(" ")
+                if has_capabilities(caps):
+                    with_caps.add(path)
+        return [file for file in files if file not in with_caps]
+
+    def setcap(self, files: List[str]) -> None:
+        files = self.missing(files)
+        self.logger.info(f"Setting capabilities for {len(files)} binaries at {self.host}")
+        for begin in range(0, len(files), FILES_PER_CALL):
+            end = begin + FILES_PER_CALL
+            execute_line = ["setcap"]
+            for file in files[begin:end]:
+                execute_line += [CAPABILITIES, file]
+
+            if not SUDO_NEEDED.get(self.host, False):
+                returncode, _, stderr = self.run(execute_line)
+                if returncode == 0:
+                    SUDO_NEEDED[self.host] = False
+                    continue
+                if self.host in SUDO_NEEDED:
+                    print(f"[-]: Error during seting capability:\n {tab_lines(stderr.decode())}", file=sys.stderr)
+                    continue
+                print("[+]: Try using sudo to set capabilities for tests executables")
+                SUDO_NEEDED[self.host] = True
+
+            returncode, _, stderr = self.run(self.sudo + execute_line)
+            if returncode != 0:
+                print(f"[-]: Error during seting capability:\n {tab_lines(stderr.decode())}", file=sys.stderr)
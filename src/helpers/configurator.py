@@ -16,6 +16,11 @@ class ProfilerType(str, Enum):
     GEM5 = "gem5"
 
 
+class Statistic(str, Enum):
+    MEDIAN = "median"
+    TRIMMED_MEAN = "trimmed_mean"
+
+
 class Configurator:
     """Class for handling configuration files and argument parsing"""
 
@@ -13,7 +13,7 @@ from src.cli.aggregate import (
 from src.cli.analyze import Analyze
 from src.cli.generate import Generate
 from src.cli.summarize import Summarize
-from src.helpers.configurator import Configurator, LogLevel, ProfilerType
+from src.helpers.configurator import Configurator, LogLevel, ProfilerType, Statistic
 from src.protocols.utility import Utility
 
 app = typer.Typer(help="This script generate and test code on some platforms", chain=True)
@@ -117,6 +117,10 @@ def init_summarizer(
         bool,
         typer.Option("--no-save-graph", help="Saves a graph of BP incorrect %% in graph.png", show_default=False),
     ] = DEFAULT_SUMMARIZE_SETTINGS["no_save_graph"],
+    statistic: Annotated[
+        Optional[Statistic],
+        typer.Option(help="Recompute results from raw samples of analyze with this statistic", show_default=False),
+    ] = DEFAULT_SUMMARIZE_SETTINGS["statistic"],
     log_level: Annotated[LogLevel, typer.Option(help="Log level of program")] = DEFAULT_SUMMARIZE_SETTINGS["log_level"],
 ):
     command_args["utility"] = DEFAULT_SUMMARIZE_SETTINGS["utility"]
@@ -124,6 +128,7 @@ def init_summarizer(
     command_args["out_dir"] = out_dir
     command_args["no_show_graph"] = no_show_graph
     command_args["no_save_graph"] = no_save_graph
+    command_args["statistic"] = None if statistic is None else statistic.value
     command_args["log_level"] = log_level.value
     run_utility()
 
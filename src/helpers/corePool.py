@@ -0,0 +1,50 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+CPU_SYSFS_DIR = Path("/sys/devices/system/cpu")
+
+
+def parse_cpu_list(cpus: Any) -> List[int]:
+    """Parse cpus given as a number, a list of numbers or a string in the kernel cpulist format, e.g. '0-3,8'"""
+    if isinstance(cpus, int):
+        return [cpus]
+    if isinstance(cpus, list):
+        return [int(cpu) for cpu in cpus]
+
+    parsed: List[int] = []
+    for part in str(cpus).split(","):
+        if part.strip() == "":
+            continue
+        first, _, last = part.partition("-")
+        parsed.extend(range(int(first), int(last or first) + 1))
+    return parsed
+
+
+class CorePool:
+    """Set of cores to run measurements on, collectors run one launch per core at a time"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.cores = parse_cpu_list(settings.get("cpus", settings.get("cpu", 0)))
+        if settings.get("smt_aware", False):
+            self.cores = self.without_siblings(self.cores)
+        self.logger.info(f"Measurements run on cores {self.cores}")
+
+    def without_siblings(self, cores: List[int]) -> List[int]:
+        """Leave one hardware thread of each physical core, so that concurrent launches do not share predictors"""
+        busy: set[int] = set()
+        result: List[int] = []
+        for core in cores:
+            if core in busy:
+                continue
+            result.append(core)
+            siblings_path = CPU_SYSFS_DIR.joinpath(f"cpu{core}", "topology", "thread_siblings_list")
+            try:
+                busy.update(parse_cpu_list(siblings_path.read_text().strip()))
+            except OSError:
+                self.logger.warning(f"Can't read SMT siblings of cpu {core}")
+        return result
@@ -0,0 +1,154 @@
+import logging
+import os
+import struct
+import subprocess
+from collections import deque
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List
+
+from src.helpers.supervisor import ProcessResult
+
+LAUNCHER_SRC = Path(__file__).parent.joinpath("attachments", "launcher.c")
+# requests and responses of attachments/launcher.c without padding and the byte order
+REQUEST = "IIiqII"
+RESPONSE = "iIQQQqII"
+STATUS_NOT_LAUNCHED = -1
+STATUS_END = -2
+
+
+def build_launcher(settings: Dict[str, Any], dst_dir: Path) -> Path:
+    """Compile the launcher by the compiler and the arguments of tests, so it runs on the same machine"""
+    dst_file = dst_dir.joinpath("chapy-launcher")
+    compiler = settings.get("compiler", "gcc")
+    compiler_args = settings.get("compiler_args", [])
+    subprocess.run([compiler, "-O2", LAUNCHER_SRC, *compiler_args, "-o", dst_file], check=True, stderr=subprocess.PIPE)
+    return dst_file
+
+
+def spawn_launcher(settings: Dict[str, Any], launcher_path: Path, cpu: int) -> "Launcher":
+    """Start a launcher on this machine"""
+    proc = subprocess.Popen([launcher_path, str(cpu)], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    if proc.stdin is None or proc.stdout is None:
+        raise Exception("Launcher has no stdin or stdout")
+    launcher = Launcher(settings, proc.stdin, proc.stdout, f"{proc.pid}", proc=proc)
+    launcher.logger.info(f"Launcher {proc.pid} is started on cpu {cpu}")
+    return launcher
+
+
+class Launcher:
+    """Persistent process pinned to a core, which launches tests by requests. Capabilities of the launcher
+    are passed to tests, so tests don't need their own ones. It replaces Supervisor for launches on its core.
+    Requests and responses are passed by streams, so the launcher may run on another host, e.g. over ssh
+    """
+
+    def __init__(
+        self,
+        settings: Dict[str, Any],
+        stdin: BinaryIO,
+        stdout: BinaryIO,
+        name: str,
+        byte_order: str = "=",
+        proc: subprocess.Popen | None = None,
+    ):
+        """
+        :param stdin: Input of the launcher
+        :param stdout: Output of the launcher
+        :param name: Name of the launcher in messages
+        :param byte_order: The struct byte order character of the launcher host, by default the native one
+        :param proc: Local process of the launcher, it is waited by close
+        """
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.grace_period: float = settings.get("grace_period", 5)
+        self.stdin = stdin
+        self.stdout = stdout
+        self.name = name
+        self.proc = proc
+        self.request = byte_order + REQUEST
+        self.response = byte_order + RESPONSE
+        # tests of requests which aren't received yet
+        self.pending: deque[str] = deque()
+
+    def read(self, size: int) -> bytes:
+        data = self.stdout.read(size)
+        if len(data) != size:
+            exit_code = "unknown" if self.proc is None else self.proc.poll()
+            raise Exception(f"Launcher {self.name} exited with code {exit_code}")
+        return data
+
+    def send(
+        self,
+        execute_line: List[Any],
+        timeout: float | None = None,
+        groups_env: List[Dict[str, str]] | None = None,
+        launches: int = 1,
+    ) -> None:
+        """Request launches of a test without waiting for them, results are read by receive in the order of requests.
+        Every step launches the test once per group. Steps stop once the timeout of all of them expires,
+        launches of a started step get the rest of it
+
+        :param groups_env: Variables added to the environment of launches of each group, by default one group
+        :param launches: Number of steps, -1 to launch till the timeout
+        """
+        args = [str(arg) for arg in execute_line]
+        groups_env = groups_env or [{}]
+        strings = b"".join(string.encode() + b"\0" for string in args)
+        for env in groups_env:
+            strings += b"".join(f"{key}={value}".encode() + b"\0" for key, value in env.items()) + b"\0"
+        timeout_ms = -1 if timeout is None else max(int(timeout * 1000), 0)
+        header = struct.pack(
+            self.request, len(args), len(groups_env), launches, timeout_ms, int(self.grace_period * 1000), len(strings)
+        )
+        self.stdin.write(header + strings)
+        self.stdin.flush()
+        self.pending.append(args[0])
+
+    def receive(self) -> List[ProcessResult]:
+        """Read results of launches of the earliest request which isn't received yet"""
+        test = self.pending.popleft()
+        results: List[ProcessResult] = []
+        is_launched = True
+        while True:
+            status, is_full, wall_ns, utime_us, stime_us, max_rss, stdout_len, stderr_len = struct.unpack(
+                self.response, self.read(struct.calcsize(self.response))
+            )
+            stdout, stderr = self.read(stdout_len), self.read(stderr_len)
+            if status == STATUS_END:
+                break
+            if status == STATUS_NOT_LAUNCHED:
+                # responses of the request are read anyway, so that responses of the next ones aren't mixed up
+                is_launched = False
+                continue
+            res = ProcessResult(
+                stdout=stdout,
+                stderr=stderr,
+                returncode=os.waitstatus_to_exitcode(status),
+                is_full=bool(is_full),
+                wall_time=wall_ns / 1e9,
+                cpu_time=(utime_us + stime_us) / 1e6,
+                max_rss=max_rss,
+            )
+            self.logger.info(f"{test}: {res.wall_time:.3f}s wall, {res.cpu_time:.3f}s cpu, {res.max_rss}KB max rss")
+            results.append(res)
+        if not is_launched:
+            raise Exception(f"Launcher {self.name} can't launch {test}")
+        return results
+
+    def run(
+        self, execute_line: List[Any], timeout: float | None = None, env: Dict[str, str] | None = None
+    ) -> ProcessResult:
+        """The same as Supervisor.run, but the process is launched by the launcher"""
+        self.send(execute_line, timeout, [env or {}])
+        results = self.receive()
+        if len(results) == 0:
+            # the timeout has expired before the launch
+            return ProcessResult(bytes(), bytes(), 0, False, 0, 0, -1)
+        return results[0]
+
+    def close(self) -> None:
+        self.stdin.close()
+        if self.proc is not None:
+            self.proc.wait()
+        self.stdout.close()
@@ -2,12 +2,20 @@ import json
 from pathlib import Path
 from typing import Dict, Protocol
 
-from src.protocols.collector import DictSI
+import numpy as np
+
+from src.protocols.collector import DictSI, RawSamples
+
+# raw samples of all tests of an analyze run, names of the tests are stored separately
+SAMPLES_FILE = "samples.npy"
+SAMPLES_TESTS_FILE = "samples.tests.json"
 
 
 class IPacker(Protocol):
     def pack(self, out_dir: Path, analyzed_data: Dict[str, DictSI]) -> None: ...
 
+    def pack_samples(self, out_dir: Path, raw_samples: RawSamples) -> None: ...
+
 
 class Packer:
     def pack(self, out_dir: Path, analyzed_data: Dict[str, DictSI]) -> None:
@@ -15,3 +23,25 @@ class Packer:
         for key in analyzed_data:
             with open(out_dir.joinpath(key + ".data"), "wt") as writter:
                 writter.write(json.dumps(analyzed_data[key]))
+
+    def pack_samples(self, out_dir: Path, raw_samples: RawSamples) -> None:
+        """Save samples as a structured .npy array, one row per measured run of a test"""
+        names, samples = raw_samples
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir.joinpath(SAMPLES_FILE), samples)
+        with open(out_dir.joinpath(SAMPLES_TESTS_FILE), "wt") as writter:
+            writter.write(json.dumps(names))
+
+    @staticmethod
+    def load_samples(src_dir: Path) -> RawSamples | None:
+        """Load samples saved by pack_samples, the array is memory-mapped read-only
+
+        :return: Names of tests and their samples or None if there are no samples in src_dir
+        """
+        samples_path = src_dir.joinpath(SAMPLES_FILE)
+        tests_path = src_dir.joinpath(SAMPLES_TESTS_FILE)
+        if not samples_path.exists() or not tests_path.exists():
+            return None
+        with open(tests_path, "r") as f:
+            names = json.loads(f.read())
+        return names, np.load(samples_path, mmap_mode="r")
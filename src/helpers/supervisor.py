@@ -0,0 +1,119 @@
+import logging
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List
+
+ESCALATION_SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGKILL]
+
+
+@dataclass
+class ProcessResult:
+    stdout: bytes
+    stderr: bytes
+    returncode: int
+    is_full: bool
+    wall_time: float
+    cpu_time: float
+    max_rss: int
+
+
+class Supervisor:
+    """Launches processes with a timeout. On timeout a process gets SIGINT, then SIGTERM and SIGKILL,
+    each after grace_period seconds. Output is drained while the process runs, so it never blocks on a full pipe
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.settings["log_level"])
+
+        self.grace_period: float = settings.get("grace_period", 5)
+        self.rlimits: Dict[int, int] = {}
+        if settings.get("rlimit_as") is not None:
+            self.rlimits[resource.RLIMIT_AS] = int(settings["rlimit_as"]) * 1024 * 1024
+        if settings.get("rlimit_cpu") is not None:
+            self.rlimits[resource.RLIMIT_CPU] = int(settings["rlimit_cpu"])
+
+    def set_limits(self, pid: int) -> None:
+        # prlimit instead of preexec_fn, because preexec_fn isn't safe when launching from several threads
+        try:
+            for limit, value in self.rlimits.items():
+                resource.prlimit(pid, limit, (value, value))
+        except ProcessLookupError:
+            pass
+
+    def run(
+        self, execute_line: List[Any], timeout: float | None = None, env: Dict[str, str] | None = None
+    ) -> ProcessResult:
+        """Run the process till it exits or the timeout expires
+
+        :param env: Variables added to the environment of the process
+        """
+        start = time.monotonic()
+        proc_env = None if env is None else {**os.environ, **env}
+        proc = subprocess.Popen(execute_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=proc_env)
+        if proc.stdout is None or proc.stderr is None:
+            raise Exception(f"Can't open pipes of {execute_line}")
+        self.set_limits(proc.pid)
+
+        outputs: Dict[int, List[bytes]] = {proc.stdout.fileno(): [], proc.stderr.fileno(): []}
+        sel = selectors.DefaultSelector()
+        for fd in outputs:
+            os.set_blocking(fd, False)
+            sel.register(fd, selectors.EVENT_READ)
+        pidfd = os.pidfd_open(proc.pid)
+        sel.register(pidfd, selectors.EVENT_READ)
+
+        escalation = ESCALATION_SIGNALS.copy()
+        deadline = None if timeout is None else start + timeout
+        is_full = True
+        is_exited = False
+        while len(sel.get_map()) > 0:
+            wait_time = None if deadline is None else max(deadline - time.monotonic(), 0)
+            events = sel.select(wait_time)
+            for key, _ in events:
+                if key.fd == pidfd:
+                    is_exited = True
+                    sel.unregister(pidfd)
+                    # descendants may hold the pipes, so they are drained only for a grace period
+                    deadline = time.monotonic() + self.grace_period
+                elif data := os.read(key.fd, 1 << 16):
+                    outputs[key.fd].append(data)
+                else:
+                    sel.unregister(key.fd)
+
+            if len(events) == 0 and deadline is not None and time.monotonic() >= deadline:
+                if is_exited or len(escalation) == 0:
+                    break
+                sig = escalation.pop(0)
+                self.logger.info(f"Process {proc.pid} is timed out, sending {sig.name}")
+                proc.send_signal(sig)
+                is_full = False
+                deadline = time.monotonic() + self.grace_period
+        sel.close()
+        os.close(pidfd)
+
+        # rusage of the process is lost if it is reaped by Popen, so it is waited here
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        res = ProcessResult(
+            stdout=b"".join(outputs[proc.stdout.fileno()]),
+            stderr=b"".join(outputs[proc.stderr.fileno()]),
+            returncode=proc.returncode,
+            is_full=is_full,
+            wall_time=time.monotonic() - start,
+            cpu_time=rusage.ru_utime + rusage.ru_stime,
+            max_rss=rusage.ru_maxrss,
+        )
+        proc.stdout.close()
+        proc.stderr.close()
+
+        self.logger.info(
+            f"{execute_line[0]}: {res.wall_time:.3f}s wall, {res.cpu_time:.3f}s cpu, {res.max_rss}KB max rss"
+        )
+        return res
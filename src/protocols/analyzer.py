@@ -1,10 +1,14 @@
 from pathlib import Path
 from typing import Dict, Protocol
 
-from src.protocols.collector import DictSI
+from src.protocols.collector import DictSI, RawSamples
 
 
 class Analyzer(Protocol):
     def analyze(self, test_dir: Path) -> Dict[str, DictSI]: ...
 
+    async def analyze_async(self, test_dir: Path) -> Dict[str, DictSI]: ...
+
+    def raw_samples(self) -> RawSamples | None: ...
+
     def fin(self) -> None: ...
@@ -1,8 +1,17 @@
 from pathlib import Path
-from typing import Dict, Protocol
+from typing import Dict, List, Protocol, Tuple
+
+import numpy as np
 
 DictSI = Dict[str, int]
+# names of tests and all their samples, the 'test' field of a sample is an index in the names
+RawSamples = Tuple[List[str], np.ndarray]
 
 
 class Collector(Protocol):
+    # samples from which the last collected results were estimated, if the collector keeps them
+    raw_samples: RawSamples | None
+
     def collect(self, bin_dir: Path) -> Dict[str, DictSI]: ...
+
+    async def collect_async(self, bin_dir: Path) -> Dict[str, DictSI]: ...
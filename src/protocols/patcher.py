@@ -4,3 +4,5 @@ from typing import Protocol
 
 class Patcher(Protocol):
     def patch(self, test_dir: Path, dst_dir: Path) -> None: ...
+
+    def patch_harness(self, dst_file: Path) -> None: ...
@@ -2,7 +2,10 @@ from queue import Queue
 from typing import Dict, Protocol
 
 from src.helpers.backGroundBuilder import ChanSignal
+from src.protocols.collector import RawSamples
 
 
 class QueueCollector(Protocol):
+    raw_samples: RawSamples | None
+
     def collect(self, build_channel: Queue[ChanSignal]) -> Dict[str, Dict]: ...
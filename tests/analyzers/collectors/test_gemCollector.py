@@ -0,0 +1,60 @@
+import logging
+
+from src.analyzers.collectors.gemCollector import GemCollector
+
+
+def test_split_stats_file_by_tests(tmp_path):
+    collector = GemCollector({"target_isa": "X86", "log_level": logging.INFO})
+    dumps = [f"{GemCollector.STATS_BEGIN}\nsystem.cpu.branchPred.lookups    {i}    # comment\n" for i in range(3)]
+    stat_path = tmp_path / "batch_0.txt"
+    stat_path.write_text("".join(dumps))
+    dest_dir = tmp_path / "stats"
+    dest_dir.mkdir()
+
+    collector.split_stats_file(stat_path, ["test_0", "test_1"], dest_dir)
+
+    stats = collector.get_stats_from_dir(dest_dir)
+    assert stats == {"test_0": {"branchPred.lookups": 0}, "test_1": {"branchPred.lookups": 1}}
+
+
+FAKE_GEM5 = """#!/bin/sh
+for arg; do
+    case "$arg" in
+        --stats-file=*) stats="${arg#--stats-file=}" ;;
+        *.out) name="$(basename "$arg" .out)" ;;
+    esac
+done
+echo "chapy-test: $name"
+# every simulation waits for the others to start, so they meet only if they run at once
+touch "$STARTED/$name"
+for _ in $(seq 50); do
+    if [ "$(ls "$STARTED" | wc -l)" -ge 3 ]; then
+        touch "$MET/$name"
+        break
+    fi
+    sleep 0.1
+done
+printf -- "%s\\nsystem.cpu.branchPred.lookups    7    # comment\\n" "$BEGIN" > "$stats"
+"""
+
+
+def test_run_bins_in_dir_simulates_in_parallel(tmp_path, monkeypatch):
+    gem5 = tmp_path / "gem5.opt"
+    gem5.write_text(FAKE_GEM5)
+    gem5.chmod(0o755)
+    monkeypatch.setenv("BEGIN", GemCollector.STATS_BEGIN)
+    for name in ["STARTED", "MET"]:
+        tmp_path.joinpath(name).mkdir()
+        monkeypatch.setenv(name, str(tmp_path / name))
+    bin_dir = tmp_path / "bins"
+    bin_dir.mkdir()
+    for name in ["empty", "test_0", "test_1"]:
+        (bin_dir / f"{name}.out").touch()
+    settings = {"target_isa": "X86", "gem5_bin_path": gem5, "sim_jobs": 3, "timeout": 10, "log_level": logging.INFO}
+
+    full_runned = GemCollector(settings).run_bins_in_dir(bin_dir, tmp_path / "stats")
+
+    assert sorted(pth.name for pth in (tmp_path / "MET").iterdir()) == ["empty", "test_0", "test_1"]
+    assert full_runned == {"empty", "test_0", "test_1"}
+    assert sorted(pth.name for pth in (bin_dir / "m5out").iterdir()) == ["empty", "test_0", "test_1"]
+    assert sorted(pth.name for pth in (tmp_path / "stats").iterdir()) == ["empty.txt", "test_0.txt", "test_1.txt"]
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from pathlib import Path
+from unittest.mock import patch
+
+from src.analyzers.collectors.perfCollector import PerfCollector
+from src.analyzers.collectors.perfParser import TestRes
+
+
+def make_collector(**settings):
+    return PerfCollector({"log_level": logging.INFO, "timeout": 10, **settings})
+
+
+def test_get_stat_stops_when_converged():
+    collector = make_collector(ci_tolerance=0.5, min_test_launches=5)
+    stable = TestRes(b"branches: 100\nmissed_branches: 10\n", True)
+
+    with patch.object(collector, "execute_test", return_value=stable) as execute_test:
+        stats = collector.get_stat(Path("test_0.c.out"), 50, 0)
+
+    assert execute_test.call_count == 5
+    assert all(res.cpu == 0 for res in stats)
+
+
+def test_get_stat_runs_all_launches_without_tolerance():
+    collector = make_collector()
+    stable = TestRes(b"branches: 100\nmissed_branches: 10\n", True)
+
+    with patch.object(collector, "execute_test", return_value=stable) as execute_test:
+        collector.get_stat(Path("test_0.c.out"), 8, 0)
+
+    assert execute_test.call_count == 8
+
+
+def test_baseline_is_measured_on_every_core(tmp_path):
+    for name in ["empty", "test_0", "test_1", "test_2"]:
+        tmp_path.joinpath(f"{name}.c.out").touch()
+    collector = make_collector(cpus=[2, 5], max_test_launches=2)
+    launched = []
+
+    async def execute_test(execute_line, timeout, env=None, cpu_core=-1):
+        launched.append((Path(execute_line[0]).name.split(".")[0], cpu_core))
+        return TestRes(b"branches: 100\nmissed_branches: 10\n", True)
+
+    with patch.object(collector, "execute_test", side_effect=execute_test):
+        stats = asyncio.run(collector.get_stats_dir(tmp_path))
+
+    assert sorted(core for name, core in launched if name == "empty") == [2, 2, 5, 5]
+    assert sorted(res.cpu for res in stats["empty"]) == [2, 2, 5, 5]
+    assert all(len(stats[f"test_{i}"]) == 2 for i in range(3))
+
+
+def test_interleaved_launches_remeasure_baseline(tmp_path):
+    for name in ["empty", "test_0", "test_1", "test_2", "test_3", "test_4"]:
+        tmp_path.joinpath(f"{name}.c.out").touch()
+    collector = make_collector(launch_order="interleaved", baseline_period=2, max_test_launches=3, launch_seed=1)
+    launched = []
+
+    async def execute_test(execute_line, timeout, env=None, cpu_core=-1):
+        launched.append(Path(execute_line[0]).name.split(".")[0])
+        return TestRes(b"branches: 100\nmissed_branches: 10\n", True)
+
+    with patch.object(collector, "execute_test", side_effect=execute_test):
+        stats = asyncio.run(collector.get_stats_dir(tmp_path))
+
+    assert all(len(stats[f"test_{i}"]) == 3 for i in range(5))
+    # 3 rounds of 5 tests with the baseline before every 2 of them and once after all rounds
+    assert len(stats["empty"]) == 3 * 3 + 1
+    assert launched[0] == launched[-1] == "empty"
+    tests_order = [name for name in launched if name != "empty"]
+    for begin in range(0, 15, 5):
+        end = begin + 5
+        assert sorted(tests_order[begin:end]) == [f"test_{i}" for i in range(5)]
+
+
+def test_interleaved_launches_of_batches_remeasure_baseline(tmp_path):
+    for name in ["empty.c.out", "batch_0.out", "batch_1.out"]:
+        tmp_path.joinpath(name).touch()
+    collector = make_collector(launch_order="interleaved", max_test_launches=3, launch_seed=1)
+    launched = []
+
+    async def execute_test(execute_line, timeout, env=None, cpu_core=-1):
+        name = Path(execute_line[0]).name.split(".")[0]
+        launched.append(name)
+        if name == "empty":
+            return TestRes(b"branches: 10\nmissed_branches: 1\n", True)
+        batch = int(name.split("_")[1])
+        tests = [f"test_{2 * batch + i}" for i in range(2)]
+        return TestRes(b"".join(f"test: {test}\nbranches: 100\nmissed_branches: 10\n".encode() for test in tests), True)
+
+    with patch.object(collector, "execute_test", side_effect=execute_test):
+        stats = asyncio.run(collector.get_stats_dir(tmp_path))
+
+    assert launched[0] == launched[-1] == "empty"
+    # the baseline is launched before each of 3 rounds and after the last one
+    assert len(stats["empty"]) == 4
+    assert all(len(stats[f"test_{i}"]) == 3 for i in range(4))
+
+
+def test_core_is_used_by_one_launch(tmp_path):
+    for i in range(8):
+        tmp_path.joinpath(f"test_{i}.c.out").touch()
+    collector = make_collector(cpus=[4, 5], max_test_launches=2)
+    busy = set()
+    overlapped = []
+
+    async def execute_test(execute_line, timeout, env=None, cpu_core=-1):
+        assert cpu_core not in busy
+        busy.add(cpu_core)
+        overlapped.append(len(busy))
+        await asyncio.sleep(0.01)
+        busy.remove(cpu_core)
+        return TestRes(b"branches: 100\nmissed_branches: 10\n", True)
+
+    with patch.object(collector, "execute_test", side_effect=execute_test):
+        stats = asyncio.run(collector.get_stats_dir(tmp_path))
+
+    assert all(len(stats[f"test_{i}"]) == 2 for i in range(8))
+    # both cores are measuring at once
+    assert max(overlapped) == 2
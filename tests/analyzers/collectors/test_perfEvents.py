@@ -0,0 +1,103 @@
+import os
+import struct
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from src.analyzers.collectors.perfEvents import (
+    EVENT_ENTRY,
+    EVENTS_FILE_ENV,
+    EVENTS_HEADER,
+    EVENTS_MAGIC,
+    PerfEvent,
+    encode_events,
+    parse_events,
+)
+from src.analyzers.collectors import perfParser
+from src.analyzers.collectors.perfParser import TEXT_OUTPUT_ENV, PerfParser
+
+
+def test_parse_symbolic_and_numeric_events():
+    events = parse_events(
+        [
+            {"name": "missed_branches", "type": "hardware", "config": "branch_misses"},
+            {"name": "cache_BPU", "type": "hw_cache", "config": "bpu:read:miss", "exclude_kernel": False},
+            {"name": "predicted_branches", "type": "raw", "config": "0x12"},
+            {"name": "cpu_clock", "type": 1, "config": 0, "exclude_hv": False},
+        ]
+    )
+
+    assert events == [
+        PerfEvent("missed_branches", 0, 5),
+        PerfEvent("cache_BPU", 3, 5 | (1 << 16), exclude_kernel=False),
+        PerfEvent("predicted_branches", 4, 0x12),
+        PerfEvent("cpu_clock", 1, 0, exclude_hv=False),
+    ]
+
+
+def test_encode_events():
+    descriptor = encode_events([PerfEvent("branches", 0, 4, exclude_hv=False)], "big")
+
+    header_len = struct.calcsize(">" + EVENTS_HEADER)
+    name_begin = header_len + struct.calcsize(">" + EVENT_ENTRY)
+    assert struct.unpack_from(">" + EVENTS_HEADER, descriptor) == (EVENTS_MAGIC, 1, 0, 0x0102, 1)
+    assert struct.unpack_from(">" + EVENT_ENTRY, descriptor, header_len) == (0, 4, 1, 0, len("branches"))
+    assert descriptor[name_begin:] == b"branches"
+
+
+ATTACH_DIR = Path(__file__).parents[3].joinpath("src/analyzers/patchers/attachments")
+
+
+@pytest.fixture(scope="module")
+def harness(tmp_path_factory):
+    build_dir = tmp_path_factory.mktemp("harness")
+    tests_src = build_dir / "tests.c"
+    tests_src.write_text(
+        f'#include "{ATTACH_DIR}/dispatch.h"\n'
+        "void test_0() {}\n"
+        'chapy_test_t chapy_tests[] = {{"test_0", test_0}};\n'
+        "size_t chapy_tests_len = 1;\n"
+    )
+    harness_src = build_dir / "harness.c"
+    harness_src.write_text(f'#include "{ATTACH_DIR}/perf_events/classic.c"\n#include "{ATTACH_DIR}/perfTemplate.c"\n')
+    binary = build_dir / "harness.out"
+    subprocess.run(["gcc", harness_src, tests_src, "-o", binary], check=True)
+    return binary
+
+
+def test_harness_measures_runtime_events(harness, tmp_path):
+    events_file = tmp_path / "chapy.events"
+    events_file.write_bytes(encode_events(parse_events([{"name": "task", "type": "software", "config": "task_clock"}])))
+
+    env = {**os.environ, TEXT_OUTPUT_ENV: "1", EVENTS_FILE_ENV: str(events_file)}
+    proc = subprocess.run([harness, "0", "1"], stdout=subprocess.PIPE, env=env, check=True)
+
+    names = [line.split(b":")[0] for line in proc.stdout.splitlines()]
+    assert names == [b"test", b"iteration", b"time_enabled", b"time_running", b"task"]
+
+
+def test_unreported_events_are_warned_once(harness, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(perfParser, "UNREPORTED_EVENTS", set())
+    events_file = tmp_path / "chapy.events"
+    events = [{"name": "task", "type": "software", "config": "task_clock"}]
+    events_file.write_bytes(encode_events(parse_events(events)))
+
+    env = {**os.environ, EVENTS_FILE_ENV: str(events_file)}
+    for _ in range(2):
+        output = subprocess.run([harness, "0", "1"], stdout=subprocess.PIPE, env=env, check=True).stdout
+        PerfParser.decode_samples(output)
+
+    assert capsys.readouterr().err.count("Events ['task'] are measured, but dropped from results") == 1
+
+
+def test_harness_rejects_broken_descriptor(harness, tmp_path):
+    events_file = tmp_path / "chapy.events"
+    events_file.write_bytes(b"CHPE")
+
+    proc = subprocess.run(
+        [harness, "0", "1"], capture_output=True, env={**os.environ, EVENTS_FILE_ENV: str(events_file)}
+    )
+
+    assert proc.returncode != 0
+    assert b"events file" in proc.stderr.lower()
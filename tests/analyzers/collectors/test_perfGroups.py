@@ -0,0 +1,93 @@
+import logging
+
+import numpy as np
+import pytest
+
+from src.analyzers.collectors import perfStats
+from src.analyzers.collectors.perfEvents import PerfEvent, encode_events
+from src.analyzers.collectors.perfGroups import CounterBudget, probe_counters, split_groups
+
+EVENTS = [
+    PerfEvent("branches", 0, 4),
+    PerfEvent("missed_branches", 0, 5),
+    PerfEvent("instructions", 0, 1),
+    PerfEvent("cpu_clock", 1, 0),
+    PerfEvent("cache_BPU", 3, 5),
+]
+
+
+def names(groups):
+    return [[event.name for event in group] for group in groups]
+
+
+def test_events_fitting_budget_are_not_split():
+    assert names(split_groups(EVENTS, 4, "instructions")) == [[event.name for event in EVENTS]]
+    assert len(split_groups(EVENTS, 0, "instructions")) == 1
+
+
+def test_reference_event_leads_every_group():
+    groups = split_groups(EVENTS, 2, "instructions")
+
+    assert names(groups) == [
+        ["instructions", "branches", "cpu_clock"],
+        ["instructions", "missed_branches"],
+        ["instructions", "cache_BPU"],
+    ]
+
+
+def test_probe_counters(monkeypatch):
+    descriptors = []
+
+    def run(descriptor):
+        descriptors.append(descriptor)
+        return b""
+
+    def decode_samples(output):
+        # a group of more than 3 events never runs
+        samples = np.zeros(1, dtype=perfStats.SAMPLE_DTYPE)
+        samples["time_enabled"] = 100
+        samples["time_running"] = 100 if len(descriptors) <= 3 else 0
+        return ["test_0"], samples
+
+    monkeypatch.setattr("src.analyzers.collectors.perfParser.PerfParser.decode_samples", decode_samples)
+    assert probe_counters(run) == 3
+    assert descriptors[-1] == encode_events([PerfEvent("branches", 0, 4)] * 4)
+
+
+def test_budget_is_probed_once_per_host(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.analyzers.collectors.perfGroups.probe_counters", lambda run: run(b""))
+    budget = CounterBudget({"log_level": logging.INFO, "counters_cache": tmp_path / "counters.json"})
+    probes = []
+
+    def run(descriptor):
+        probes.append(descriptor)
+        return 4
+
+    assert budget.get("host", run) == 4
+    assert budget.get("host", run) == 4
+    assert len(probes) == 1
+    assert CounterBudget({"log_level": logging.INFO, "counters_budget": 6}).get("host", run) == 6
+
+
+def test_failed_probe_is_not_cached(tmp_path, capsys):
+    budget = CounterBudget({"log_level": logging.INFO, "counters_cache": tmp_path / "counters.json"})
+    probes = []
+
+    def run(descriptor):
+        probes.append(descriptor)
+        return b""
+
+    assert budget.get("host", run) == 0
+    assert budget.get("host", run) == 0
+    assert len(probes) == 2
+    assert not (tmp_path / "counters.json").exists()
+    assert "Can't count events on host" in capsys.readouterr().err
+
+
+def test_split_requires_reported_reference_event():
+    with pytest.raises(Exception, match="reference event 'cycles' isn't measured"):
+        split_groups(EVENTS, 2, "cycles")
+    with pytest.raises(Exception, match="reference event 'cycles' isn't reported"):
+        split_groups(EVENTS + [PerfEvent("cycles", 0, 0)], 2, "cycles")
+    # events fitting into counters aren't merged, so they don't need the reference event
+    assert len(split_groups(EVENTS, 4, "cycles")) == 1
@@ -0,0 +1,224 @@
+import os
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.analyzers.collectors.perfParser import RESULT_FILE_ENV, TEXT_OUTPUT_ENV, PerfParser, TestRes
+
+
+def test_split_by_tests_without_records():
+    stats = [TestRes(b"branches: 10\n", True), TestRes(b"", False)]
+
+    assert PerfParser.split_by_tests(stats, "test_0") == {"test_0": stats}
+
+
+def test_split_by_tests_of_batch():
+    output = b"test: test_0\nbranches: 10\ntest: test_1\nbranches: 20\n"
+
+    tests_stats = PerfParser.split_by_tests([TestRes(output, True, 2), TestRes(output, False, 3)], "batch_0")
+
+    assert tests_stats["test_0"] == [TestRes(b"branches: 10\n", True, 2), TestRes(b"branches: 10\n", True, 3)]
+    assert tests_stats["test_1"] == [TestRes(b"branches: 20\n", True, 2), TestRes(b"branches: 20\n", False, 3)]
+
+
+def test_split_by_tests_of_iterations():
+    output = b"".join(f"test: test_0\niteration: {i}\nbranches: {i}\n".encode() for i in range(3))
+
+    tests_stats = PerfParser.split_by_tests([TestRes(output, False)], "test_0")
+
+    assert PerfParser.to_samples(tests_stats)[1]["branches"].tolist() == [0, 1, 2]
+    assert [res.is_full for res in tests_stats["test_0"]] == [True, True, False]
+
+
+def test_correct_keeps_cpu():
+    out_res = {
+        "empty": [TestRes(b"branches: 1\nmissed_branches: 0\n", True, 1)],
+        "test_0": [TestRes(b"branches: 11\nmissed_branches: 5\n", True, 3)],
+    }
+
+    corrected = PerfParser.correct(out_res)
+
+    assert corrected["test_0"]["branchPred.lookups"] == 10
+    assert corrected["test_0"]["cpu"] == 3
+
+
+def test_correct_subtracts_nearest_baseline():
+    out_res = {
+        "empty": [
+            TestRes(b"branches: 10\nmissed_branches: 1\n", True, 1, started=0),
+            TestRes(b"branches: 20\nmissed_branches: 2\n", True, 1, started=100),
+        ],
+        "test_0": [
+            TestRes(b"branches: 110\nmissed_branches: 11\n", True, 1, started=1),
+            TestRes(b"branches: 120\nmissed_branches: 12\n", True, 1, started=99),
+            TestRes(b"branches: 110\nmissed_branches: 11\n", True, 1, started=2),
+        ],
+    }
+
+    corrected = PerfParser.correct(out_res)
+
+    assert corrected["test_0"]["branchPred.lookups"] == 100
+    assert corrected["test_0"]["branchPred.condIncorrect"] == 10
+
+
+def test_correct_subtracts_baseline_of_the_same_host():
+    out_res = {
+        "empty": [
+            TestRes(b"branches: 10\nmissed_branches: 1\n", True, 0, started=0, host=0),
+            TestRes(b"branches: 50\nmissed_branches: 5\n", True, 0, started=10, host=1),
+        ],
+        "test_0": [TestRes(b"branches: 150\nmissed_branches: 15\n", True, 0, started=1, host=1)],
+    }
+
+    corrected = PerfParser.correct(out_res)
+
+    # the baseline of host 0 is nearer in time, but it is measured on another board
+    assert corrected["test_0"]["branchPred.lookups"] == 100
+    assert corrected["test_0"]["host"] == 1
+
+
+def test_correct_subtracts_baseline_of_the_same_core():
+    out_res = {
+        "empty": [
+            TestRes(b"branches: 10\nmissed_branches: 1\n", True, 0, started=2),
+            TestRes(b"branches: 50\nmissed_branches: 5\n", True, 1, started=0),
+        ],
+        "test_0": [TestRes(b"branches: 150\nmissed_branches: 15\n", True, 1, started=1)],
+    }
+
+    corrected = PerfParser.correct(out_res)
+
+    # the baseline of core 0 is nearer in time, but the core has its own bias
+    assert corrected["test_0"]["branchPred.lookups"] == 100
+    assert corrected["test_0"]["cpu"] == 1
+
+
+def test_back_to_back_baseline_launches_are_one_remeasurement():
+    empty = TestRes(b"branches: 10\nmissed_branches: 1\n", True)
+    test = TestRes(b"branches: 110\nmissed_branches: 11\n", True)
+    out_res = {
+        "empty": [empty._replace(cpu=0, started=t) for t in [0, 1, 2, 9]] + [empty._replace(cpu=1, started=3)],
+        "test_0": [test._replace(cpu=0, started=5), test._replace(cpu=1, started=4)],
+    }
+    names, samples = PerfParser.to_samples(out_res)
+
+    epochs, times = PerfParser.baseline_epochs(samples, names.index("empty"), np.ones(len(samples), dtype=bool))
+
+    assert epochs.tolist() == [0, 0, 0, 1, 2, -1, -1]
+    assert times.tolist() == [1, 9, 3]
+
+
+def test_launches_of_a_batch_with_baseline_are_one_remeasurement():
+    empty = TestRes(b"branches: 10\nmissed_branches: 1\n", True, 0)
+    test = TestRes(b"branches: 110\nmissed_branches: 11\n", True, 0)
+    # a batch of the empty test and test_0 launched back to back, each launch gives a sample of both
+    out_res = {
+        "empty": [empty._replace(started=t) for t in range(4)],
+        "test_0": [test._replace(started=t) for t in range(4)],
+    }
+    names, samples = PerfParser.to_samples(out_res)
+
+    epochs, times = PerfParser.baseline_epochs(samples, names.index("empty"), np.ones(len(samples), dtype=bool))
+
+    assert epochs.tolist() == [0, 0, 0, 0, -1, -1, -1, -1]
+    assert times.tolist() == [1.5]
+    assert PerfParser.correct(out_res)["test_0"]["branchPred.lookups"] == 100
+
+
+def test_multiplexed_counters_are_scaled():
+    output = b"time_enabled: 100\ntime_running: 25\nbranches: 10\nmissed_branches: 2\ninstructions: -1\n"
+
+    _, samples = PerfParser.to_samples({"test_0": [TestRes(output, True)]})
+
+    assert samples[["branches", "missed_branches", "instructions"]].tolist() == [(40, 8, -1)]
+    assert samples["predicted_branches"].tolist() == [32]
+
+
+def test_never_scheduled_counters_are_unknown():
+    output = b"time_enabled: 100\ntime_running: 0\nbranches: 0\nmissed_branches: 0\n"
+
+    _, samples = PerfParser.to_samples({"test_0": [TestRes(output, True)]})
+
+    assert samples[["branches", "missed_branches"]].tolist() == [(-1, -1)]
+
+
+def test_merge_groups_normalizes_by_reference():
+    groups_res = [
+        {"test_0": [TestRes(b"instructions: 1000\nbranches: 100\nmissed_branches: 10\n", True, 1)]},
+        {"test_0": [TestRes(b"instructions: 500\ncache_BPU: 30\n", False, 1)]},
+    ]
+
+    merged = PerfParser.merge_groups(groups_res, "instructions")
+
+    [res] = merged["test_0"]
+    assert not res.is_full and res.cpu == 1
+    assert res.samples[["instructions", "branches", "missed_branches", "cache_bpu"]].tolist() == [(1000, 100, 10, 60)]
+
+
+ATTACH_DIR = Path(__file__).parents[3].joinpath("src/analyzers/patchers/attachments")
+
+
+@pytest.fixture(scope="module")
+def harness(tmp_path_factory):
+    build_dir = tmp_path_factory.mktemp("harness")
+    tests_src = build_dir / "tests.c"
+    tests_src.write_text(
+        f'#include "{ATTACH_DIR}/dispatch.h"\n'
+        "void test_0() {}\n"
+        "void test_1() {}\n"
+        'chapy_test_t chapy_tests[] = {{"test_0", test_0}, {"test_1", test_1}};\n'
+        "size_t chapy_tests_len = 2;\n"
+    )
+    harness_src = build_dir / "harness.c"
+    harness_src.write_text(f'#include "{ATTACH_DIR}/perf_events/classic.c"\n#include "{ATTACH_DIR}/perfTemplate.c"\n')
+    binary = build_dir / "harness.out"
+    subprocess.run(["gcc", harness_src, tests_src, "-o", binary], check=True)
+    return binary
+
+
+def launch(binary, env):
+    proc = subprocess.run([binary, "0", "2"], stdout=subprocess.PIPE, env={**os.environ, **env})
+    return TestRes(proc.stdout, proc.returncode == 0)
+
+
+def test_decode_binary_records(harness):
+    tests_stats = PerfParser.split_by_tests([launch(harness, {})._replace(cpu=1)], "harness")
+
+    assert sorted(tests_stats) == ["test_0", "test_1"]
+    [res] = tests_stats["test_0"]
+    assert res.is_full and res.cpu == 1
+    assert res.samples["is_full"].tolist() == [True, True]
+    assert res.samples["cpu"].tolist() == [1, 1]
+
+
+def test_result_file_matches_stdout(harness, tmp_path):
+    result_file = tmp_path / "result.bin"
+    launch(harness, {RESULT_FILE_ENV: str(result_file)})
+
+    # records have a fixed size, so the file is as long as stdout, even if values differ
+    assert len(result_file.read_bytes()) == len(launch(harness, {}).output)
+    assert PerfParser.split_by_tests([TestRes(result_file.read_bytes(), True)], "harness").keys() == {
+        "test_0",
+        "test_1",
+    }
+
+
+def test_text_output_has_same_records(harness):
+    binary_names, binary_samples = PerfParser.to_samples(PerfParser.split_by_tests([launch(harness, {})], "harness"))
+    text_stats = PerfParser.split_by_tests([launch(harness, {TEXT_OUTPUT_ENV: "1"})], "harness")
+    text_names, text_samples = PerfParser.to_samples(text_stats)
+
+    assert binary_names == text_names == ["test_0", "test_1"]
+    assert binary_samples["test"].tolist() == text_samples["test"].tolist() == [0, 0, 1, 1]
+    assert binary_samples["is_full"].tolist() == text_samples["is_full"].tolist()
+
+
+def test_is_converged():
+    stable = [TestRes(b"branches: 100\nmissed_branches: 10\n", True) for _ in range(5)]
+    noisy = [TestRes(f"branches: 100\nmissed_branches: {10 * i}\n".encode(), True) for i in range(5)]
+
+    assert PerfParser.is_converged(stable, "test_0", tolerance=0.5)
+    assert not PerfParser.is_converged(noisy, "test_0", tolerance=0.5)
+    assert not PerfParser.is_converged(stable[:2], "test_0", tolerance=0.5)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.analyzers.collectors import perfStats
+from src.analyzers.collectors.perfParser import PerfParser, TestRes
+
+
+def test_group_quantile():
+    groups = np.array([0, 1, 0, 1, 0])
+    values = np.array([3.0, 10.0, 1.0, 20.0, 2.0])
+
+    assert perfStats.group_quantile(groups, values, 3, 0.5)[:2].tolist() == [2.0, 15.0]
+    assert np.isnan(perfStats.group_quantile(groups, values, 3, 0.5)[2])
+
+
+def test_group_trimmed_mean_and_mad():
+    groups = np.zeros(10, dtype=int)
+    values = np.array([1.0] * 9 + [100.0])
+
+    assert perfStats.group_trimmed_mean(groups, values, 1, 0.1).tolist() == [1.0]
+    assert perfStats.group_mad(groups, values, 1).tolist() == [0.0]
+
+
+def test_group_median_ci_width():
+    groups = np.array([0] * 3 + [1] * 5)
+    values = np.array([1.0, 2.0, 3.0, 5.0, 1.0, 2.0, 4.0, 3.0])
+
+    width = perfStats.group_median_ci_width(groups, values, 2, 0.95)
+
+    assert np.isnan(width[0])
+    assert width[1] == 4.0
+
+
+def results(*ratios, branches=100):
+    return [TestRes(f"branches: {branches}\nmissed_branches: {missed}\n".encode(), True) for missed in ratios]
+
+
+def test_correct_selects_median_sample():
+    out_res = {"empty": results(0, branches=10), "test_0": results(30, 10, 20, 50, 40)}
+
+    assert PerfParser.correct(out_res)["test_0"]["branchPred.condIncorrect"] == 30
+    assert PerfParser.correct(out_res)["test_0"]["branchPred.lookups"] == 90
+
+
+def test_correct_with_trimmed_mean_and_outliers():
+    out_res = {"empty": results(0, branches=0), "test_0": results(10, 10, 11, 9, 10, 90)}
+
+    trimmed = PerfParser.correct(out_res, statistic="trimmed_mean", trim=0.2)
+    rejected = PerfParser.correct(out_res, statistic="trimmed_mean", trim=0, outlier_threshold=3)
+
+    assert trimmed["test_0"]["branchPred.condIncorrect"] == 10
+    assert rejected["test_0"]["branchPred.condIncorrect"] == 10
+
+
+def test_correct_prefers_full_samples():
+    out_res = {
+        "empty": results(0, branches=0),
+        "test_0": results(10) + [TestRes(b"branches: 100\nmissed_branches: 90\n", False)] * 3,
+    }
+
+    assert PerfParser.correct(out_res)["test_0"]["branchPred.condIncorrect"] == 10
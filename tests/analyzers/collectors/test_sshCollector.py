@@ -0,0 +1,227 @@
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from queue import Queue
+from unittest.mock import patch
+
+from src.analyzers.collectors.sshCollector import SshCollector
+from src.helpers.backGroundBuilder import CSignal
+from src.helpers.supervisor import ProcessResult
+
+
+class FakeAgent:
+    """Answers every step of a request with one launch per group"""
+
+    def __init__(self):
+        self.requests = []
+        self.pending = []
+
+    def send(self, execute_line, timeout, groups_env, launches):
+        self.requests.append((Path(execute_line[0]).name, launches))
+        self.pending.append(max(launches, 1) * len(groups_env))
+
+    def receive(self):
+        output = b"branches: 100\nmissed_branches: 10\n"
+        return [ProcessResult(output, bytes(), 0, True, 0.01, 0.01, 0)] * self.pending.pop(0)
+
+
+def make_collector(**settings):
+    with patch.object(SshCollector, "open"):
+        collector = SshCollector({"log_level": logging.INFO, "timeout": 10, **settings}, Path("/tmp/chapy"))
+    collector.agent = FakeAgent()
+    return collector
+
+
+def test_collector_is_constructed():
+    collector = make_collector(host="board", port=2222)
+
+    assert (collector.host, collector.port) == ("board", 2222)
+    # capabilities are set on the host of the session
+    assert collector.capability_setter.host == "board"
+
+
+def test_agent_launches_are_requested_at_once():
+    collector = make_collector(max_test_launches=4)
+    binaries = [Path("test_0.out"), Path("test_1.out")]
+
+    stats = collector.get_groups_stats_by_agent(binaries, [{}, {"CHAPY_EVENTS_FILE": "group_1.events"}])
+
+    assert collector.agent.requests == [("test_0.out", 4), ("test_1.out", 4)]
+    assert [[len(group_stats) for group_stats in binary_stats] for binary_stats in stats] == [[4, 4], [4, 4]]
+    assert all(res.cpu == 0 and res.is_full for res in stats[0][0])
+
+
+def test_agent_launches_are_requested_till_convergence():
+    collector = make_collector(max_test_launches=10, ci_tolerance=0.5, min_test_launches=5)
+    binaries = [Path("test_0.out"), Path("test_1.out")]
+
+    stats = collector.get_groups_stats_by_agent(binaries, [{}])
+
+    # stable results converge after the first launches, so the binaries aren't requested again
+    assert collector.agent.requests == [("test_0.out", 5), ("test_1.out", 5)]
+    assert [len(binary_stats[0]) for binary_stats in stats] == [5, 5]
+
+
+def test_next_binaries_are_uploaded_while_launching():
+    collector = make_collector(upload_ahead=1)
+    events = []
+
+    def prepare(built):
+        events.append(("upload", built[0].name))
+        time.sleep(0.05)
+        return built
+
+    def launch(built, host_binaries):
+        events.append(("launch", built[0].name))
+        time.sleep(0.2)
+        events.append(("launched", built[0].name))
+        return [{}]
+
+    collector.prepare, collector.launch = prepare, launch
+    build_channel = Queue()
+    for i in range(3):
+        build_channel.put(CSignal.BuiltFile(Path(f"test_{i}.out")))
+    build_channel.put(CSignal.End())
+
+    collector.collect_built(build_channel)
+
+    assert events.index(("upload", "test_1.out")) < events.index(("launched", "test_0.out"))
+    assert events.index(("upload", "test_2.out")) < events.index(("launched", "test_1.out"))
+    # a batch is launched after its upload, and launches don't overlap
+    assert [event for event in events if event[0] != "upload"] == [
+        (kind, f"test_{i}.out") for i in range(3) for kind in ["launch", "launched"]
+    ]
+    assert events.index(("upload", "test_2.out")) < events.index(("launch", "test_2.out"))
+
+
+class LocalSftp:
+    """Writes files of the sftp session to this machine"""
+
+    def open(self, path, mode, bufsize=-1):
+        file = open(path, mode, bufsize)
+        file.set_pipelined = lambda _: None
+        return file
+
+
+def run_locally(execute_line):
+    proc = subprocess.run(execute_line, capture_output=True)
+    return proc.returncode, proc.stdout, proc.stderr
+
+
+def test_binaries_are_sent_by_archive_once(tmp_path):
+    bin_dir = tmp_path.joinpath("bin")
+    bin_dir.mkdir()
+    collector = make_collector(remote_cache=str(tmp_path.joinpath("cache")))
+    collector.bin_dir, collector.upload_sftp, collector.run_command = bin_dir, LocalSftp(), run_locally
+    sent = []
+
+    def cached(hashes):
+        present = SshCollector.cached(collector, hashes)
+        sent.append(len(set(hashes) - present))
+        return present
+
+    collector.cached = cached
+    built = []
+    for i, content in enumerate([b"harness", b"harness", b"test"]):
+        built.append(tmp_path.joinpath(f"test_{i}.out"))
+        built[-1].write_bytes(content)
+
+    collector.send_binaries(built[:2], [bin_dir.joinpath(binary.name) for binary in built[:2]])
+    collector.send_binaries(built, [bin_dir.joinpath(binary.name) for binary in built])
+
+    # copies of a binary and binaries in the cache are sent once
+    assert sent == [1, 1]
+    assert [bin_dir.joinpath(binary.name).read_bytes() for binary in built] == [b"harness", b"harness", b"test"]
+    assert bin_dir.joinpath("test_0.out").stat().st_mode & 0o111
+    assert sorted(path.name for path in bin_dir.iterdir()) == ["test_0.out", "test_1.out", "test_2.out"]
+
+
+def test_uploads_are_run_on_free_cores():
+    collector = make_collector(cpu=1, cpus="0-1")
+    commands = []
+
+    def run_command(execute_line):
+        commands.append(execute_line)
+        return 0, b"0-3\n" if execute_line[0] == "cat" else b"", b""
+
+    collector.run_command = run_command
+    collector.run_upload_command(["tar", "-xzf", "upload.tar.gz"])
+    collector.update_capabilities([Path("/tmp/chapy/test_0.out")])
+
+    assert commands[-2:] == [
+        ["taskset", "-c", "2,3", "getcap", "/tmp/chapy/test_0.out"],
+        ["taskset", "-c", "2,3", "setcap", "cap_sys_admin,cap_sys_nice=ep", "/tmp/chapy/test_0.out"],
+    ]
+    assert commands[2] == ["taskset", "-c", "2,3", "tar", "-xzf", "upload.tar.gz"]
+    # the free cores are found once
+    assert [command[0] for command in commands].count("cat") == 1
+
+
+def test_uploads_are_run_anywhere_without_free_cores(capsys):
+    collector = make_collector(cpus="0-1")
+    collector.run_command = lambda execute_line: (0, b"0-1\n", b"")
+
+    assert collector.get_upload_affinity() == []
+    assert "There are no free cores at 127.0.0.1" in capsys.readouterr().err
+
+
+def test_corrupted_binaries_of_cache_at_home_are_sent_again(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    bin_dir = tmp_path.joinpath("bin")
+    bin_dir.mkdir()
+    collector = make_collector()
+    collector.bin_dir, collector.upload_sftp, collector.run_command = bin_dir, LocalSftp(), run_locally
+    binary = tmp_path.joinpath("test_0.out")
+    binary.write_bytes(b"harness")
+
+    collector.send_binaries([binary], [bin_dir.joinpath("test_0.out")])
+    cache = tmp_path.joinpath(".cache", "chapy", "remote")
+    assert cache.stat().st_mode & 0o777 == 0o700
+    entry = next(cache.iterdir())
+    bin_dir.joinpath("test_0.out").unlink()
+    entry.write_bytes(b"corrupted")
+    collector.send_binaries([binary], [bin_dir.joinpath("test_0.out")])
+
+    assert entry.read_bytes() == bin_dir.joinpath("test_0.out").read_bytes() == b"harness"
+
+
+def test_shared_cache_is_refused(tmp_path, capsys):
+    bin_dir, cache = tmp_path.joinpath("bin"), tmp_path.joinpath("cache")
+    bin_dir.mkdir()
+    cache.mkdir(mode=0o777)
+    cache.chmod(0o777)
+    collector = make_collector(remote_cache=str(cache))
+    collector.bin_dir, collector.upload_sftp, collector.run_command = bin_dir, LocalSftp(), run_locally
+    binary = tmp_path.joinpath("test_0.out")
+    binary.write_bytes(b"harness")
+
+    collector.send_binaries([binary], [bin_dir.joinpath("test_0.out")])
+
+    assert "isn't a directory owned by the user with mode 700, it is disabled" in capsys.readouterr().err
+    assert collector.remote_cache is None
+    assert list(cache.iterdir()) == []
+    assert bin_dir.joinpath("test_0.out").read_bytes() == b"harness"
+
+
+def test_least_recently_used_binaries_are_evicted_from_cache(tmp_path):
+    bin_dir, cache = tmp_path.joinpath("bin"), tmp_path.joinpath("cache")
+    bin_dir.mkdir()
+    collector = make_collector(remote_cache=str(cache))
+    collector.bin_dir, collector.upload_sftp, collector.run_command = bin_dir, LocalSftp(), run_locally
+    # the limit fits one of the binaries
+    collector.remote_cache_size = 10
+    built = []
+    for i, content in enumerate([b"harness", b"test"]):
+        built.append(tmp_path.joinpath(f"test_{i}.out"))
+        built[-1].write_bytes(content)
+
+    collector.send_binaries(built[:1], [bin_dir.joinpath("test_0.out")])
+    old = time.time() - 60
+    for entry in cache.iterdir():
+        os.utime(entry, (old, old))
+    collector.send_binaries(built[1:], [bin_dir.joinpath("test_1.out")])
+
+    assert [entry.read_bytes() for entry in cache.iterdir()] == [b"test"]
+    assert [bin_dir.joinpath(binary.name).read_bytes() for binary in built] == [b"harness", b"test"]
@@ -0,0 +1,125 @@
+import logging
+from pathlib import Path
+from queue import Queue
+from unittest.mock import patch
+
+from src.analyzers.collectors.perfParser import TestRes
+from src.analyzers.collectors.sshCollector import SshCollector
+from src.analyzers.collectors.sshFleetCollector import SshFleetCollector
+from src.helpers.backGroundBuilder import CSignal
+
+
+class FakeWorker:
+    """Measures every binary by one launch, the host drops on the given number of first batches"""
+
+    def __init__(self, settings):
+        self.host = settings.get("host")
+        self.cpu = settings["cpu"]
+        self.host_id = settings["host_id"]
+        self.drops = settings.get("drops", 0)
+        # the transport may notice the drop after a write to it has failed
+        self.notices_drop = settings.get("notices_drop", True)
+        self.use_agent = False
+        self.upload_ahead = settings.get("upload_ahead", 8)
+        self.active = True
+        self.measured = []
+        self.raw_samples = None
+
+    measure = SshCollector.measure
+    measure_pipelined = SshCollector.measure_pipelined
+    is_dropped = SshCollector.is_dropped
+
+    def prepare(self, built):
+        return built
+
+    def launch(self, built, host_binaries):
+        if self.drops != 0:
+            self.drops -= 1
+            self.active = not self.notices_drop
+            raise EOFError("Connection is closed")
+        self.measured.extend(binary.name.split(".")[0] for binary in built)
+        output = b"branches: 10\nmissed_branches: 1\n"
+        return [{binary.name.split(".")[0]: [TestRes(output, True, self.cpu, host=self.host_id)] for binary in built}]
+
+    def is_active(self):
+        return self.active
+
+    def reconnect(self):
+        self.active = True
+
+    def stop_agent(self, is_dropped=False):
+        pass
+
+    def correct(self, analyzed):
+        return analyzed
+
+
+def make_fleet(**settings):
+    with patch.object(SshFleetCollector, "create_worker", new=lambda _, worker_settings: FakeWorker(worker_settings)):
+        return SshFleetCollector({"log_level": logging.INFO, "reconnect_delay": 0, **settings})
+
+
+def build_channel(tests_count):
+    channel = Queue()
+    channel.put(CSignal.BuiltFile(Path("empty.c.out")))
+    for i in range(tests_count):
+        channel.put(CSignal.BuiltFile(Path(f"test_{i}.c.out")))
+    channel.put(CSignal.End())
+    return channel
+
+
+def test_binaries_are_dispatched_to_cores_of_all_hosts():
+    fleet = make_fleet(hosts=[{"host": "board-0", "cpus": "0-1"}, {"host": "board-1", "cpus": [3]}])
+
+    analyzed = fleet.collect(build_channel(12))
+
+    assert [(worker.host, worker.cpu) for worker in fleet.workers] == [("board-0", 0), ("board-0", 1), ("board-1", 3)]
+    measured = [test for worker in fleet.workers for test in worker.measured if test != "empty"]
+    assert sorted(measured) == sorted(f"test_{i}" for i in range(12))
+    for worker in fleet.workers:
+        if len(worker.measured) > 0:
+            # the baseline is measured with the first batch and at the end of the session
+            assert worker.measured[0] == worker.measured[-1] == "empty"
+    assert {res.host for res in analyzed["test_0"]} <= {0, 1}
+
+
+def test_binaries_of_dropped_host_are_requeued():
+    fleet = make_fleet(hosts=[{"host": "board-0"}], drops=1)
+
+    analyzed = fleet.collect(build_channel(3))
+
+    assert sorted(test for test in analyzed if test != "empty") == ["test_0", "test_1", "test_2"]
+
+
+def test_host_is_dropped_before_its_transport_notices():
+    fleet = make_fleet(hosts=[{"host": "board-0"}], drops=1, notices_drop=False)
+
+    analyzed = fleet.collect(build_channel(3))
+
+    assert sorted(test for test in analyzed if test != "empty") == ["test_0", "test_1", "test_2"]
+
+
+def test_binaries_are_dropped_without_hosts(capsys):
+    fleet = make_fleet(drops=-1, reconnect_attempts=0)
+
+    analyzed = fleet.collect(build_channel(2))
+
+    assert analyzed == {}
+    assert "Can't measure 'test_1.c.out', all hosts are dropped" in capsys.readouterr().err
+
+
+def test_baseline_is_measured_by_every_worker_in_batch_mode():
+    fleet = make_fleet(hosts=[{"host": "board-0", "cpus": "0-1"}], batch_size=2)
+    channel = Queue()
+    for name in ["batch_0.out", "empty.c.out", "batch_1.out", "batch_2.out"]:
+        channel.put(CSignal.BuiltFile(Path(name)))
+    channel.put(CSignal.End())
+
+    fleet.collect(channel)
+
+    assert fleet.empty == Path("empty.c.out")
+    measured = [test for worker in fleet.workers for test in worker.measured if test != "empty"]
+    assert sorted(measured) == ["batch_0", "batch_1", "batch_2"]
+    for worker in fleet.workers:
+        if len(worker.measured) > 0:
+            assert worker.measured[-1] == "empty"
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import pytest
+
+from src.analyzers.asyncRunner import AsyncRunner, gather_limited
+
+
+@pytest.fixture
+def runner():
+    return AsyncRunner({"grace_period": 0.5, "log_level": logging.INFO})
+
+
+def test_run_collects_output(runner):
+    script = "import os, sys; print(os.environ['CHAPY_TEST']); print('err', file=sys.stderr); sys.exit(3)"
+    res = asyncio.run(runner.run([sys.executable, "-c", script], 10, {"CHAPY_TEST": "out"}))
+
+    assert res.stdout == b"out\n"
+    assert res.stderr == b"err\n"
+    assert res.returncode == 3
+    assert res.is_full
+
+
+def test_run_interrupts_on_timeout(runner):
+    script = "import time\ntry:\n    time.sleep(10)\nexcept KeyboardInterrupt:\n    print('interrupted')"
+    res = asyncio.run(runner.run([sys.executable, "-c", script], 0.5))
+
+    assert not res.is_full
+    assert res.stdout == b"interrupted\n"
+    assert res.wall_time < 1
+
+
+def test_cancelled_run_kills_process(runner, tmp_path):
+    pid_file = tmp_path / "pid"
+    script = f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(10)"
+
+    async def cancel():
+        task = asyncio.create_task(runner.run([sys.executable, "-c", script]))
+        while not pid_file.exists() or pid_file.read_text() == "":
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.time()
+    asyncio.run(cancel())
+    assert time.time() - start < 5
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_gather_limited_bounds_concurrency():
+    running = []
+    peak = []
+
+    async def job(i):
+        running.append(i)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(i)
+        return i
+
+    assert asyncio.run(gather_limited((job(i) for i in range(10)), 3)) == list(range(10))
+    assert max(peak) == 3
+
+
+def test_run_reports_rusage(runner):
+    script = (
+        "import time\n"
+        "data = bytearray(64 << 20)\n"
+        "start = time.process_time()\n"
+        "while time.process_time() - start < 0.2:\n"
+        "    pass"
+    )
+    res = asyncio.run(runner.run([sys.executable, "-c", script], 10))
+
+    assert res.returncode == 0
+    assert res.cpu_time >= 0.2
+    assert res.max_rss >= 64 * 1024
@@ -0,0 +1,92 @@
+import logging
+import shutil
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from src.analyzers.collectors.sshCollector import SshCollector
+from src.analyzers.sshAnalyzer import SshAnalyzer
+from src.helpers.backGroundBuilder import BGBuilder
+from src.helpers.builder import Builder
+
+REPO_DIR = Path(__file__).parents[2]
+EXAMPLE_DIR = REPO_DIR.joinpath("tests-benchmark-example")
+
+
+def make_test_dir(tmp_path, tests_count):
+    test_dir = tmp_path.joinpath("tests")
+    test_dir.mkdir()
+    for i in range(tests_count):
+        shutil.copy(EXAMPLE_DIR.joinpath(f"test_{i}.c"), test_dir)
+    return test_dir
+
+
+def analyze(stand_in, test_dir, **settings):
+    settings = {
+        "log_level": logging.INFO,
+        "timeout": 2,
+        "max_test_launches": 2,
+        "compiler": "gcc",
+        "compiler_args": [],
+        "build_cache_dir": None,
+        "counters_cache": None,
+        "remote_cache": str(test_dir.parent.joinpath("remote-cache")),
+        "reconnect_delay": 0,
+        **stand_in.settings(),
+        **settings,
+    }
+    # attachments of patchers are found next to the launched script
+    with patch.object(sys, "argv", [str(REPO_DIR.joinpath("cha.py"))]):
+        analyzer = SshAnalyzer(BGBuilder(settings, Builder(settings)), settings)
+        try:
+            return analyzer.analyze(test_dir)
+        finally:
+            analyzer.fin()
+
+
+def test_every_test_is_measured(ssh_stand_in, tmp_path):
+    results = analyze(ssh_stand_in, make_test_dir(tmp_path, 3))
+
+    assert sorted(results) == ["test_0", "test_1", "test_2"]
+    assert all(res["isFull"] for res in results.values())
+    # the session directory is removed at the end
+    assert any(command.startswith("rm -r /tmp/chapy-") for command in ssh_stand_in.commands)
+
+
+def test_dropped_host_is_reconnected(ssh_stand_in, tmp_path):
+    launch = SshCollector.launch
+    drops = [ssh_stand_in.drop]
+
+    def drop_once(collector, built, host_binaries):
+        if drops:
+            drops.pop()()
+        return launch(collector, built, host_binaries)
+
+    with patch.object(SshCollector, "launch", drop_once):
+        results = analyze(ssh_stand_in, make_test_dir(tmp_path, 3))
+
+    assert sorted(results) == ["test_0", "test_1", "test_2"]
+
+
+def test_agent_and_bulk_upload_save_round_trips(ssh_stand_in, tmp_path):
+    test_dir = make_test_dir(tmp_path, 4)
+    analyze(ssh_stand_in, test_dir, max_test_launches=4, agent=False, bulk_upload=False)
+    plain_round_trips, plain_commands = ssh_stand_in.round_trips, ssh_stand_in.exec_requests
+    ssh_stand_in.reset()
+
+    analyze(ssh_stand_in, test_dir, max_test_launches=4)
+
+    assert ssh_stand_in.round_trips < plain_round_trips
+    assert ssh_stand_in.exec_requests < plain_commands
+
+
+def test_cached_binaries_are_not_uploaded_again(ssh_stand_in, tmp_path):
+    test_dir = make_test_dir(tmp_path, 2)
+    analyze(ssh_stand_in, test_dir)
+    uploaded = ssh_stand_in.bytes_received
+    ssh_stand_in.reset()
+
+    analyze(ssh_stand_in, test_dir)
+
+    assert not any("tar -x" in command for command in ssh_stand_in.commands)
+    assert ssh_stand_in.bytes_received < uploaded
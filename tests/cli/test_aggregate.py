@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+from src.cli.aggregate import Aggregate
+from src.cli.analyze import Analyze
+
+
+def make_analyze(name, running, overlaps, **settings):
+    analyze = Analyze()
+    analyze.settings = {"out_dir": name, "log_level": logging.INFO, **settings}
+
+    async def run_async():
+        running.add(name)
+        overlaps.append(set(running))
+        await asyncio.sleep(0.05)
+        running.discard(name)
+
+    analyze.run_async = run_async
+    return analyze
+
+
+def test_analyzers_sharing_cores_are_run_one_by_one():
+    running, overlaps = set(), []
+    aggregate = Aggregate()
+    aggregate.configurate({"log_level": logging.INFO, "async_analyze": True, "configs": []})
+    aggregate.analyzes = [
+        make_analyze("perf_0", running, overlaps, profiler="perf", cpus="0-1"),
+        make_analyze("gem5", running, overlaps, profiler="gem5"),
+        make_analyze("perf_1", running, overlaps, profiler="perf", cpus=[1, 2]),
+        make_analyze("perf_2", running, overlaps, profiler="perf", cpu=3),
+    ]
+
+    assert aggregate.run_analyzers() == ["perf_0", "gem5", "perf_1", "perf_2"]
+    assert [
+        [analyze.settings["out_dir"] for analyze in chain] for chain in Aggregate.partition_analyzes(aggregate.analyzes)
+    ] == [["perf_0", "perf_1"], ["gem5"], ["perf_2"]]
+    assert not any({"perf_0", "perf_1"} <= names for names in overlaps)
+    assert any({"perf_0", "gem5", "perf_2"} <= names for names in overlaps)
@@ -1,7 +1,9 @@
 import pytest
 from hypothesis import settings, HealthCheck, given, strategies as st
 import logging
+from src.analyzers.collectors import perfStats
 from src.cli.summarize import Summarize
+from src.helpers.packer import Packer
 
 import numpy as np
 import pandas as pd
@@ -322,3 +324,52 @@ def test_save_mean_data(tmp_path):
         assert "Summarized data:" in content
         assert "dir: /dir1" in content
         assert "dir: /dir2" in content
+
+
+def test_calculate_mean_of_cpu():
+    summarizer_instance = Summarize()
+    data = create_prepared_data(1, 4, bp_lookups=100, bp_incorrect=10)
+    for i, test in enumerate(data["/path/to/dir0"].values()):
+        test["CPU"] = i % 2
+        test["BP incorrect"] = 10 * (i % 2 + 1)
+    df = summarizer_instance.convert_to_pandas(data)
+
+    mean_of_cpu = summarizer_instance.calculate_mean_of_cpu(df)
+
+    assert mean_of_cpu["/path/to/dir0"].to_dict() == {0: 10.0, 1: 20.0}
+
+
+def test_calculate_mean_of_cpu_without_cpu():
+    summarizer_instance = Summarize()
+    df = summarizer_instance.convert_to_pandas(create_prepared_data(1, 2))
+
+    assert summarizer_instance.calculate_mean_of_cpu(df).empty
+
+
+def test_calculate_mean_of_host():
+    summarizer_instance = Summarize()
+    data = create_prepared_data(1, 4, bp_lookups=100, bp_incorrect=10)
+    for i, test in enumerate(data["/path/to/dir0"].values()):
+        test["Host"] = i % 2
+        test["BP incorrect"] = 10 * (i % 2 + 1)
+    df = summarizer_instance.convert_to_pandas(data)
+
+    mean_of_host = summarizer_instance.calculate_mean_of_host(df)
+
+    assert mean_of_host["/path/to/dir0"].to_dict() == {0: 10.0, 1: 20.0}
+
+
+def test_recompute_from_samples(tmp_path):
+    samples = np.zeros(4, dtype=perfStats.SAMPLE_DTYPE)
+    samples["test"] = [0, 1, 1, 1]
+    samples["branches"] = [0, 100, 100, 100]
+    samples["missed_branches"] = [0, 10, 20, 60]
+    samples["is_full"] = True
+    Packer().pack_samples(tmp_path, (["empty", "test_0"], samples))
+    summarizer_instance = Summarize()
+    data = {tmp_path.as_posix(): {"test_0": {"branchPred.condIncorrect": 0}}}
+
+    summarizer_instance.recompute_from_samples(data, "trimmed_mean")
+
+    assert data[tmp_path.as_posix()]["test_0"]["branchPred.condIncorrect"] == 30
+    assert data[tmp_path.as_posix()]["test_0"]["branchPred.lookups"] == 100
@@ -0,0 +1,12 @@
+import pytest
+
+from tests.sshStandIn import SshStandIn
+
+
+@pytest.fixture
+def ssh_stand_in():
+    """Local SSH and SFTP server executing commands on this machine"""
+    stand_in = SshStandIn()
+    stand_in.start()
+    yield stand_in
+    stand_in.stop()
@@ -0,0 +1,86 @@
+import logging
+
+from src.helpers.backGroundBuilder import BGBuilder, CSignal
+from src.helpers.builder import BuildResult
+
+
+def test_build_dir_reports_built_and_failed_files(tmp_path):
+    settings = {
+        "compiler": "gcc",
+        "compiler_args": [],
+        "build_jobs": 3,
+        "build_queue_size": 1,
+        "build_cache_dir": None,
+        "log_level": logging.INFO,
+    }
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for i in range(5):
+        (src_dir / f"test_{i}.c").write_text("int main() { return 0; }\n")
+    (src_dir / "bad.c").write_text("int main() { return }\n")
+
+    chan = BGBuilder(settings).build_dir(src_dir, tmp_path / "bins")
+    signals = []
+    while not isinstance(sign := chan.get(), CSignal.End):
+        signals.append(sign)
+
+    built = sorted(sign.f.name for sign in signals if isinstance(sign, CSignal.BuiltFile))
+    failed = [sign for sign in signals if isinstance(sign, CSignal.BuildFailed)]
+    assert built == [f"test_{i}.c.out" for i in range(5)]
+    assert len(failed) == 1 and failed[0].f.name == "bad.c"
+    assert chan.maxsize == 1
+
+
+def test_build_dir_stops_once_cancelled(tmp_path):
+    settings = {
+        "compiler": "gcc",
+        "compiler_args": [],
+        "build_jobs": 2,
+        "build_queue_size": 1,
+        "build_cache_dir": None,
+        "log_level": logging.INFO,
+    }
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for i in range(8):
+        (src_dir / f"test_{i}.c").write_text("int main() { return 0; }\n")
+    builder = BGBuilder(settings)
+
+    chan = builder.build_dir(src_dir, tmp_path / "bins")
+    chan.get()
+    # the consumer stops reading, e.g. the collector fails
+    builder.cancel()
+
+    assert builder.build_thread is not None
+    builder.build_thread.join(timeout=10)
+    assert not builder.build_thread.is_alive()
+    assert len(list((tmp_path / "bins").iterdir())) < 8
+
+
+class FailingBuilder:
+    """Builds every file, but raises an unexpected error on the broken one"""
+
+    jobs = 2
+
+    def try_build(self, src_file, destination_file, additional_flags=None):
+        if src_file.name == "broken.c":
+            raise ValueError("unexpected error")
+        return BuildResult(src_file, destination_file, True)
+
+
+def test_build_dir_ends_after_unexpected_error(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for name in ["test_0.c", "broken.c", "test_1.c"]:
+        (src_dir / name).touch()
+
+    chan = BGBuilder({"log_level": logging.INFO}, FailingBuilder()).build_dir(src_dir, tmp_path / "bins")
+    signals = []
+    while not isinstance(sign := chan.get(timeout=10), CSignal.End):
+        signals.append(sign)
+
+    built = sorted(sign.f.name for sign in signals if isinstance(sign, CSignal.BuiltFile))
+    failed = [sign for sign in signals if isinstance(sign, CSignal.BuildFailed)]
+    assert built == ["test_0.c.out", "test_1.c.out"]
+    assert len(failed) == 1 and failed[0].f.name == "broken.c"
+    assert "unexpected error" in failed[0].error
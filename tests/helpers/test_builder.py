@@ -0,0 +1,139 @@
+import logging
+import subprocess
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.helpers.builder import BuildCache, Builder
+
+
+@pytest.fixture
+def builder():
+    settings = {
+        "compiler": "gcc",
+        "compiler_args": [],
+        "build_jobs": 2,
+        "build_cache_dir": None,
+        "log_level": logging.INFO,
+    }
+    return Builder(settings)
+
+
+def test_jobs_default_to_cpu_count():
+    settings = {"compiler": "gcc", "compiler_args": [], "log_level": logging.INFO}
+    assert Builder(settings).jobs >= 1
+
+
+def test_build_dir_reports_every_file(builder, tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for i in range(4):
+        (src_dir / f"test_{i}.c").write_text("int main() { return 0; }\n")
+
+    report = builder.build_dir(src_dir, tmp_path / "bins")
+
+    assert sorted(res.src_file.name for res in report) == [f"test_{i}.c" for i in range(4)]
+    assert all(res.is_built for res in report)
+    assert all(res.destination_file.exists() for res in report)
+
+
+def test_build_dir_keeps_going_past_failures(builder, tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "good.c").write_text("int main() { return 0; }\n")
+    (src_dir / "bad.c").write_text("int main() { return }\n")
+
+    report = {res.src_file.name: res for res in builder.build_dir(src_dir, tmp_path / "bins")}
+
+    assert report["good.c"].is_built
+    assert not report["bad.c"].is_built
+    assert "error" in report["bad.c"].error
+    assert not report["bad.c"].destination_file.exists()
+
+
+def test_build_reuses_cached_binary(tmp_path):
+    settings = {
+        "compiler": "gcc",
+        "compiler_args": ["-O1"],
+        "build_cache_dir": tmp_path / "cache",
+        "log_level": logging.INFO,
+    }
+    src_file = tmp_path / "test.c"
+    src_file.write_text("int main() { return 0; }\n")
+
+    Builder(settings).build(src_file, tmp_path / "first.out")
+    cached_builder = Builder(settings)
+    with patch("src.helpers.builder.subprocess.run", wraps=subprocess.run) as run:
+        cached_builder.build(src_file, tmp_path / "second.out")
+
+    assert (tmp_path / "second.out").read_bytes() == (tmp_path / "first.out").read_bytes()
+    assert all("-o" not in call.args[0] for call in run.call_args_list)
+
+
+def test_build_cache_key_depends_on_flags(tmp_path):
+    settings = {"compiler": "gcc", "compiler_args": [], "build_cache_dir": tmp_path, "log_level": logging.INFO}
+    src_file = tmp_path / "test.c"
+    src_file.write_text("int main() { return 0; }\n")
+    builder = Builder(settings)
+
+    assert builder.get_cache_key(src_file, ["-O1"]) == builder.get_cache_key(src_file, ["-O1"])
+    assert builder.get_cache_key(src_file, ["-O1"]) != builder.get_cache_key(src_file, ["-O2"])
+
+
+def test_build_cache_key_depends_on_linked_libraries(tmp_path):
+    settings = {"compiler": "gcc", "compiler_args": [], "build_cache_dir": tmp_path, "log_level": logging.INFO}
+    src_file = tmp_path / "test.c"
+    src_file.write_text("int main() { return 0; }\n")
+    lib_dir = tmp_path / "lib"
+    lib_dir.mkdir()
+    (lib_dir / "libm5.a").write_bytes(b"old")
+    flags = [f"-Wl,-L{lib_dir}", "-Wl,-lm5", "--static"]
+
+    old_key = Builder(settings).get_cache_key(src_file, flags)
+    (lib_dir / "libm5.a").write_bytes(b"rebuilt")
+
+    assert Builder(settings).get_linked_libraries(flags) == [lib_dir / "libm5.a"]
+    assert Builder(settings).get_cache_key(src_file, flags) != old_key
+
+
+def test_build_cache_hit_does_not_share_entry(tmp_path):
+    built_file = tmp_path / "built.out"
+    built_file.write_bytes(b"binary")
+    cache = BuildCache(tmp_path / "cache", max_size=1024)
+    cache.put("aa0", built_file)
+
+    assert cache.get("aa0", tmp_path / "hit.out")
+
+    # capabilities set to the hit mustn't reach the cache entry
+    assert (tmp_path / "hit.out").stat().st_ino != cache.entry("aa0").stat().st_ino
+    assert (tmp_path / "hit.out").read_bytes() == b"binary"
+
+
+def test_build_cache_evicts_least_recently_used(tmp_path):
+    built_file = tmp_path / "built.out"
+    built_file.write_bytes(b"x" * 100)
+    cache = BuildCache(tmp_path / "cache", max_size=300)
+
+    for key in ["aa0", "bb1", "cc2"]:
+        cache.put(key, built_file)
+        time.sleep(0.01)
+    assert cache.get("aa0", tmp_path / "hit.out")
+    cache.put("dd3", built_file)
+
+    assert cache.entry("aa0").exists()
+    assert not cache.entry("bb1").exists()
+    assert cache.entry("dd3").exists()
+
+
+def test_build_links_default_objects(builder, tmp_path):
+    harness_src = tmp_path / "harness.c"
+    harness_src.write_text("void test_fun();\nint main() { test_fun(); return 0; }\n")
+    test_src = tmp_path / "test.c"
+    test_src.write_text("void test_fun() {}\n")
+
+    builder.build_object(harness_src, tmp_path / "harness.o")
+    builder.set_default_link_objects([tmp_path / "harness.o"])
+    builder.build(test_src, tmp_path / "test.out")
+
+    assert subprocess.run([tmp_path / "test.out"]).returncode == 0
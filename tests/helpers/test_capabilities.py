@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+
+from src.helpers import capabilities
+from src.helpers.capabilities import CAPABILITIES, CapabilitySetter, has_capabilities
+
+
+@pytest.fixture(autouse=True)
+def sudo_cache(monkeypatch):
+    monkeypatch.setattr(capabilities, "SUDO_NEEDED", {})
+
+
+class FakeHost:
+    def __init__(self, getcap_output=b"", needs_sudo=False):
+        self.getcap_output = getcap_output
+        self.needs_sudo = needs_sudo
+        self.calls = []
+
+    def run(self, execute_line):
+        self.calls.append(execute_line)
+        if execute_line[0] == "getcap":
+            return 0, self.getcap_output, b""
+        if self.needs_sudo and execute_line[0] != "sudo":
+            return 1, b"", b"Operation not permitted\n"
+        return 0, b"", b""
+
+
+def test_has_capabilities():
+    assert has_capabilities("cap_sys_admin,cap_sys_nice=ep")
+    assert has_capabilities("cap_sys_nice,cap_sys_admin+eip")
+    assert not has_capabilities("cap_sys_admin=ep")
+    assert not has_capabilities("cap_sys_admin,cap_sys_nice=p")
+
+
+def test_setcap_is_batched_and_skips_binaries_with_capabilities():
+    host = FakeHost(b"/bins/a.out cap_sys_admin,cap_sys_nice=ep\n/bins/b.out = cap_sys_nice+ep\n")
+
+    CapabilitySetter({"log_level": logging.INFO}, host.run).setcap(["/bins/a.out", "/bins/b.out", "/bins/c.out"])
+
+    assert host.calls == [
+        ["getcap", "/bins/a.out", "/bins/b.out", "/bins/c.out"],
+        ["setcap", CAPABILITIES, "/bins/b.out", CAPABILITIES, "/bins/c.out"],
+    ]
+
+
+def test_sudo_probe_is_cached():
+    host = FakeHost(needs_sudo=True)
+    setter = CapabilitySetter({"log_level": logging.INFO}, host.run)
+
+    setter.setcap(["/bins/a.out"])
+    setter.setcap(["/bins/b.out"])
+
+    setcap_calls = [call for call in host.calls if call[0] != "getcap"]
+    assert setcap_calls == [
+        ["setcap", CAPABILITIES, "/bins/a.out"],
+        ["sudo", "setcap", CAPABILITIES, "/bins/a.out"],
+        ["sudo", "setcap", CAPABILITIES, "/bins/b.out"],
+    ]
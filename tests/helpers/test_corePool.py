@@ -0,0 +1,22 @@
+import logging
+
+from src.helpers import corePool
+from src.helpers.corePool import CorePool, parse_cpu_list
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list(3) == [3]
+    assert parse_cpu_list([1, "2"]) == [1, 2]
+    assert parse_cpu_list("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+
+
+def test_smt_aware(tmp_path, monkeypatch):
+    for core, siblings in enumerate(["0,2", "1,3", "0,2", "1,3"]):
+        topology = tmp_path.joinpath(f"cpu{core}", "topology")
+        topology.mkdir(parents=True)
+        topology.joinpath("thread_siblings_list").write_text(siblings + "\n")
+    monkeypatch.setattr(corePool, "CPU_SYSFS_DIR", tmp_path)
+
+    pool = CorePool({"log_level": logging.INFO, "cpus": "0-3", "smt_aware": True})
+
+    assert pool.cores == [0, 1]
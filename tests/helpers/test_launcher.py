@@ -0,0 +1,66 @@
+import logging
+import sys
+
+import pytest
+
+from src.helpers.launcher import build_launcher, spawn_launcher
+
+
+@pytest.fixture(scope="module")
+def launcher(tmp_path_factory):
+    launcher_path = build_launcher({"compiler": "gcc"}, tmp_path_factory.mktemp("launcher"))
+    launcher = spawn_launcher({"grace_period": 0.5, "log_level": logging.INFO}, launcher_path, 0)
+    yield launcher
+    launcher.close()
+
+
+def test_run_collects_output_and_usage(launcher):
+    script = "import os, sys; print(os.environ['CHAPY_TEST']); print('err', file=sys.stderr); sys.exit(3)"
+    res = launcher.run([sys.executable, "-c", script], 10, {"CHAPY_TEST": "out"})
+
+    assert res.stdout == b"out\n"
+    assert res.stderr == b"err\n"
+    assert res.returncode == 3
+    assert res.is_full
+    assert res.wall_time > 0 and res.cpu_time > 0 and res.max_rss > 0
+
+
+def test_run_drains_large_output(launcher):
+    res = launcher.run([sys.executable, "-c", "import sys; sys.stdout.write('x' * 10_000_000)"], 10)
+
+    assert len(res.stdout) == 10_000_000
+    assert res.is_full
+
+
+def test_run_interrupts_on_timeout(launcher):
+    script = "import time\ntry:\n    time.sleep(10)\nexcept KeyboardInterrupt:\n    print('interrupted')"
+    # the interpreter should start before the timeout, so that it handles SIGINT
+    res = launcher.run([sys.executable, "-c", script], 2)
+
+    assert not res.is_full
+    assert res.stdout == b"interrupted\n"
+    assert res.wall_time < 3
+
+
+def test_run_reports_missing_binary(launcher):
+    res = launcher.run(["/nonexistent/test.out"], 10)
+
+    assert res.returncode == 127
+    assert b"Can't execute" in res.stderr
+
+
+def test_requests_are_pipelined(launcher):
+    script = "import os; print(os.environ.get('CHAPY_GROUP', 'none'))"
+    launcher.send([sys.executable, "-c", script], 10, [{"CHAPY_GROUP": "0"}, {"CHAPY_GROUP": "1"}], launches=3)
+    launcher.send([sys.executable, "-c", script], 10)
+
+    assert [res.stdout for res in launcher.receive()] == [b"0\n", b"1\n"] * 3
+    assert [res.stdout for res in launcher.receive()] == [b"none\n"]
+
+
+def test_launches_stop_when_timeout_expires(launcher):
+    launcher.send([sys.executable, "-c", "import time; time.sleep(0.2)"], 1, launches=-1)
+    results = launcher.receive()
+
+    assert 2 <= len(results) <= 5
+    assert all(res.is_full for res in results[:-1])
@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.analyzers.collectors import perfStats
+from src.helpers.packer import Packer
+
+
+def make_samples():
+    samples = np.zeros(3, dtype=perfStats.SAMPLE_DTYPE)
+    samples["test"] = [0, 1, 1]
+    samples["branches"] = [10, 100, 100]
+    samples["missed_branches"] = [0, 10, 30]
+    samples["is_full"] = True
+    return ["empty", "test_0"], samples
+
+
+def test_pack_and_load_samples(tmp_path):
+    names, samples = make_samples()
+
+    Packer().pack_samples(tmp_path, (names, samples))
+    loaded_names, loaded_samples = Packer.load_samples(tmp_path)
+
+    assert loaded_names == names
+    assert isinstance(loaded_samples, np.memmap)
+    assert loaded_samples.tolist() == samples.tolist()
+
+
+def test_load_samples_without_store(tmp_path):
+    assert Packer.load_samples(tmp_path) is None
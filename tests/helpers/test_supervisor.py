@@ -0,0 +1,54 @@
+import logging
+import sys
+
+import pytest
+
+from src.helpers.supervisor import Supervisor
+
+
+@pytest.fixture
+def supervisor():
+    return Supervisor({"grace_period": 0.5, "log_level": logging.INFO})
+
+
+def test_run_collects_output_and_usage(supervisor):
+    res = supervisor.run([sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"], 10)
+
+    assert res.stdout == b"out\n"
+    assert res.stderr == b"err\n"
+    assert res.returncode == 0
+    assert res.is_full
+    assert res.wall_time > 0 and res.cpu_time > 0 and res.max_rss > 0
+
+
+def test_run_drains_large_output(supervisor):
+    res = supervisor.run([sys.executable, "-c", "import sys; sys.stdout.write('x' * 10_000_000)"], 10)
+
+    assert len(res.stdout) == 10_000_000
+    assert res.is_full
+
+
+def test_run_interrupts_on_timeout(supervisor):
+    script = "import time\ntry:\n    time.sleep(10)\nexcept KeyboardInterrupt:\n    print('interrupted')"
+    res = supervisor.run([sys.executable, "-c", script], 0.5)
+
+    assert not res.is_full
+    assert res.stdout == b"interrupted\n"
+    assert res.wall_time < 1
+
+
+def test_run_escalates_to_kill(supervisor):
+    script = "import signal, time\nfor sig in [signal.SIGINT, signal.SIGTERM]: signal.signal(sig, signal.SIG_IGN)\n"
+    res = supervisor.run([sys.executable, "-c", script + "time.sleep(10)"], 0.2)
+
+    assert not res.is_full
+    assert res.returncode == -9
+    assert res.wall_time < 2
+
+
+def test_run_applies_cpu_limit():
+    supervisor = Supervisor({"rlimit_cpu": 1, "log_level": logging.INFO})
+    res = supervisor.run([sys.executable, "-c", "while True: pass"], 10)
+
+    assert res.returncode < 0
+    assert res.cpu_time < 3
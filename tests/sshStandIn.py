@@ -0,0 +1,211 @@
+import os
+import socket
+import subprocess
+import threading
+from typing import Any, List
+
+import paramiko
+
+# generating a host key takes a while, so it is shared by all servers
+HOST_KEY = paramiko.RSAKey.generate(1024)
+
+
+class CountingSocket:
+    """Socket of a client connection, which counts bytes passed by it"""
+
+    def __init__(self, sock: socket.socket, stand_in: "SshStandIn"):
+        self.sock = sock
+        self.stand_in = stand_in
+
+    def recv(self, size: int) -> bytes:
+        data = self.sock.recv(size)
+        self.stand_in.count("bytes_received", len(data))
+        return data
+
+    def send(self, data: bytes) -> int:
+        sent = self.sock.send(data)
+        self.stand_in.count("bytes_sent", sent)
+        return sent
+
+    def sendall(self, data: bytes) -> None:
+        self.sock.sendall(data)
+        self.stand_in.count("bytes_sent", len(data))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sock, name)
+
+
+class Server(paramiko.ServerInterface):
+    def __init__(self, stand_in: "SshStandIn"):
+        self.stand_in = stand_in
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username: str, key: paramiko.PKey) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password,publickey"
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel: paramiko.Channel, command: bytes) -> bool:
+        self.stand_in.count("exec_requests")
+        self.stand_in.commands.append(command.decode())
+        threading.Thread(target=execute, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+def execute(chan: paramiko.Channel, command: str) -> None:
+    """Run the command by the shell, its streams are passed over the channel"""
+    proc = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert proc.stdin is not None and proc.stdout is not None and proc.stderr is not None
+    stdin, stdout, stderr = proc.stdin, proc.stdout, proc.stderr
+
+    def pass_stdin() -> None:
+        try:
+            for data in iter(lambda: chan.recv(65536), b""):
+                stdin.write(data)
+                stdin.flush()
+        except (OSError, EOFError):
+            pass
+        stdin.close()
+
+    def pass_stderr() -> None:
+        for data in iter(lambda: stderr.read1(65536), b""):
+            chan.sendall_stderr(data)
+
+    threading.Thread(target=pass_stdin, daemon=True).start()
+    stderr_thread = threading.Thread(target=pass_stderr, daemon=True)
+    stderr_thread.start()
+    try:
+        for data in iter(lambda: stdout.read1(65536), b""):
+            chan.sendall(data)
+        stderr_thread.join()
+        chan.send_exit_status(proc.wait())
+    except (OSError, EOFError):
+        proc.kill()
+    chan.close()
+
+
+class Handle(paramiko.SFTPHandle):
+    def stat(self) -> paramiko.SFTPAttributes:
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr: paramiko.SFTPAttributes) -> int:
+        return paramiko.SFTP_OK
+
+
+class SftpServer(paramiko.SFTPServerInterface):
+    def open(self, path: str, flags: int, attr: paramiko.SFTPAttributes) -> Handle | int:
+        mode = "wb" if flags & (os.O_WRONLY | os.O_RDWR) else "rb"
+        try:
+            file = open(path, mode)
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+        handle = Handle(flags)
+        handle.readfile = file
+        handle.writefile = file
+        return handle
+
+    def stat(self, path: str) -> paramiko.SFTPAttributes | int:
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+
+    lstat = stat
+
+    def chattr(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        if attr.st_mode is not None:
+            os.chmod(path, attr.st_mode)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        try:
+            os.mkdir(path)
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+        return paramiko.SFTP_OK
+
+    def remove(self, path: str) -> int:
+        os.remove(path)
+        return paramiko.SFTP_OK
+
+
+class CountingSftpServer(paramiko.SFTPServer):
+    def __init__(self, channel: paramiko.Channel, name: str, server: Server, *args: Any, **kwargs: Any):
+        super().__init__(channel, name, server, *args, **kwargs)
+        self.stand_in = server.stand_in
+
+    def _process(self, t: int, request_number: int, msg: paramiko.Message) -> None:
+        self.stand_in.count("sftp_requests")
+        super()._process(t, request_number, msg)
+
+
+class SshStandIn:
+    """Local SSH and SFTP server standing in for a board, commands are executed on this machine.
+    It accepts any credentials and counts traffic and requests of clients, so the ssh profiler
+    is tested and benchmarked without a board
+    """
+
+    def __init__(self) -> None:
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port: int = self.sock.getsockname()[1]
+        self.lock = threading.Lock()
+        self.transports: List[paramiko.Transport] = []
+        self.commands: List[str] = []
+        self.reset()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    def settings(self) -> dict:
+        """Settings of the ssh profiler connecting to the server"""
+        return {"host": "127.0.0.1", "port": self.port, "username": "chapy", "password": "chapy", "path_to_key": None}
+
+    def reset(self) -> None:
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.exec_requests = 0
+        self.sftp_requests = 0
+        self.commands.clear()
+
+    def count(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    @property
+    def round_trips(self) -> int:
+        """Requests which are answered by the server: commands and sftp operations"""
+        return self.exec_requests + self.sftp_requests
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(CountingSocket(conn, self))  # type: ignore[arg-type]
+            transport.add_server_key(HOST_KEY)
+            transport.set_subsystem_handler("sftp", CountingSftpServer, SftpServer)
+            transport.start_server(server=Server(self))
+            self.transports.append(transport)
+
+    def drop(self) -> None:
+        """Close connections of clients, as if the board were rebooted"""
+        for transport in self.transports:
+            transport.close()
+        self.transports.clear()
+
+    def stop(self) -> None:
+        # closing doesn't wake up accept in another thread, but shutdown does
+        self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+        self.drop()
+        self.thread.join()